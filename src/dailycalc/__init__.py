@@ -1,6 +1,32 @@
 ### __init__.py
 
-__all__ = ["calculate", "icalculate", "check_calc"]
+__all__ = [
+    "calculate",
+    "icalculate",
+    "check_calc",
+    "check",
+    "check_many",
+    "lint",
+    "lint_message",
+    "compile",
+    "Expression",
+    "parse_cache",
+    "result_cache",
+    "function_cache",
+    "invalidate",
+]
 
-from .calculator import calculate, check_calc
+from .calculator import (
+    calculate,
+    check_calc,
+    check,
+    check_many,
+    compile,
+    Expression,
+    parse_cache,
+    result_cache,
+    function_cache,
+    invalidate,
+)
+from .calculator import lint, lint_message
 from .icalculator import icalculate
@@ -4,9 +4,11 @@ import argparse
 
 if not __package__:
     from calculator import calculate, error_message
+    from calculator.calculator import ROUND_PLACE
     from icalculator import icalculate, VERSION, _red, _green, _blue
 else:
     from .calculator import calculate, error_message
+    from .calculator.calculator import ROUND_PLACE
     from .icalculator import icalculate, VERSION, _red, _green, _blue
 
 
@@ -36,6 +38,23 @@ parser.add_argument(
     help="STAY mode. not work with non-interactive mode",
 )
 
+parser.add_argument(
+    "-p",
+    "--prec",
+    required=False,
+    type=int,
+    default=None,
+    help="digits of the calculation, 20 more than places by default. not work with interactive mode",
+)
+
+parser.add_argument(
+    "--places",
+    required=False,
+    type=int,
+    default=None,
+    help="decimal places of an inexact result, 10 by default. not work with interactive mode",
+)
+
 parser.add_argument(
     "input",
     type=str,
@@ -44,6 +63,10 @@ parser.add_argument(
 )
 
 args = parser.parse_args()
+if args.prec is not None:
+    l_places = ROUND_PLACE if args.places is None else args.places
+    if l_places >= args.prec:
+        parser.error(f"--places ({l_places}) must be below --prec")
 # print(args)
 
 if args.interactive:
@@ -60,10 +83,15 @@ else:
         sys.exit()
 
     try:
-        result = calculate(string_input)
-    except:
-        print(_red(error_message(string_input)), file=sys.stderr)
+        result = calculate(
+            string_input, prec=args.prec, places=args.places
+        )
+    except Exception as e:
+        l_message = error_message(string_input)
+        print(_red(l_message or str(e)), file=sys.stderr)
         sys.stderr.flush()
+        if not l_message:
+            sys.exit(1)
     else:
         print(_blue(f"input:  { string_input }"))
         print(_green(f"result: { result }"))
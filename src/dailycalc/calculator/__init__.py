@@ -8,6 +8,18 @@ __all__ = [
     "Number",
     "Anything",
     "check_calc",
+    "check",
+    "check_many",
+    "lint",
+    "lint_message",
+    "compile",
+    "Expression",
+    "parse_cache",
+    "result_cache",
+    "function_cache",
+    "invalidate",
+    "LRUCache",
+    "CacheInfo",
 ]
 
 from .define import Number, Anything
@@ -19,6 +31,18 @@ from .calculator import (
     Register,
     RItem,
     check_calc,
+    check,
+    check_many,
+    compile,
+    Expression,
+    parse_cache,
+    result_cache,
+    function_cache,
+    invalidate,
 )
 
+from .lrucache import LRUCache, CacheInfo
+
+from .words import lint, lint_message
+
 from .parserlogger import ParserLogger
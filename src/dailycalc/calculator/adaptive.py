@@ -0,0 +1,406 @@
+"""evaluation at a lower working precision, checked against the result in
+the context
+
+ln and log cost more the more digits they compute, and calculate_num keeps
+10 places of an inexact result. `evaluate` runs the one pass of `pratt`
+with these at a working precision of a few digits more than the 10 places
+need, and with every operation on their results, exp and ^ included. A
+value is (Decimal, bound): how far it may be from the value the context
+computes, the rounding of both counted, 0 when it is that value. Operations
+on exact values run in the context, as Chain runs them: exp and ^ are
+cheap enough there that working on them does not pay. Neither do `*`, `/`,
+`^` and exp on worked values, their bookkeeping costs what a cheaper ln
+saves: `pays` tells the caller whether the input calls ln or log more
+often than it does those.
+
+The result is kept when its Inexact flag is settled and no rounding
+boundary of the 10th place is within the bound, and the same goes for
+round(), max() and min() on the way. When a boundary is in reach the pass
+runs again at the next working precision, and the caller evaluates in the
+context after the last one. Anything else raises.
+"""
+
+import math
+from decimal import (
+    MAX_EMAX,
+    MAX_PREC,
+    MIN_EMIN,
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    Context,
+    Decimal,
+    DivisionByZero,
+    Inexact,
+    InvalidOperation,
+    Overflow,
+    Subnormal,
+    getcontext,
+)
+
+if not __package__:
+    from define import Operator, Pt, Register, Variables, Number, Word
+    from pratt import _Pass
+else:
+    from .define import Operator, Pt, Register, Variables, Number, Word
+    from .pratt import _Pass
+
+__all__ = ["evaluate", "pays", "PRECISIONS"]
+
+
+PRECISIONS = (16, 22)
+"""working precisions, tried in turn below the precision of the context"""
+
+WORKED = ("ln", "log")
+"""functions computed at the working precision on exact values too, the
+ones that cost the most in the context"""
+
+
+Value = tuple[Decimal, float]
+"""(Decimal, bound of its distance to the value in the context)"""
+
+REL = 1e-6
+"""largest relative bound taken through ^"""
+U = 2.0**-52
+"""relative rounding of float()"""
+
+_TINY = 1e-290
+_HUGE = 1e290
+
+_PLACE = Decimal("1.0000000000")
+"""10 places, as calculate_num quantizes"""
+
+_EXACT = Context(prec=MAX_PREC, Emax=MAX_EMAX, Emin=MIN_EMIN)
+"""context that never rounds"""
+
+
+_contexts: dict[tuple[int, int, int], Context] = {}
+"""working contexts by (prec, Emax, Emin), their flags are never read"""
+
+
+def _working(prec: int, emax: int, emin: int) -> Context:
+    """context of the working precision `prec`"""
+
+    l_key = (prec, emax, emin)
+    context = _contexts.get(l_key)
+    if context is None:
+        context = Context(
+            prec=prec,
+            rounding=ROUND_HALF_EVEN,
+            Emax=emax,
+            Emin=emin,
+            traps=[InvalidOperation, DivisionByZero, Overflow, Subnormal],
+        )
+        _contexts[l_key] = context
+    return context
+
+
+def _power_of_ten(value: Decimal) -> bool:
+    l_sign, l_digits, _ = value.as_tuple()
+    return not l_sign and l_digits[0] == 1 and not any(l_digits[1:])
+
+
+class Ambiguous(ValueError):
+    """a rounding boundary is within the bound: more digits may settle it"""
+
+
+class _WorkingPass(_Pass):
+    """one pass, transcendental functions at the working precision"""
+
+    __slots__ = ("_prec", "_work", "_unit", "_delta")
+
+    def __init__(
+        self,
+        input: str,
+        register: Register | None,
+        variables: Variables | None,
+        prec: int,
+    ):
+        super().__init__(input, register, variables)
+        l_context = getcontext()
+        self._prec = l_context.prec
+        self._work = _working(prec, l_context.Emax, l_context.Emin)
+        self._unit = 10.0 ** (1 - prec)
+        """relative rounding of the working precision"""
+        self._delta = 10.0 ** (1 - l_context.prec)
+        """relative rounding of the context"""
+
+    def result(self, value: Value, inexact: bool) -> Decimal:
+        """a Decimal calculate_num rounds to its result"""
+
+        d, e = value
+        if e == 0.0:
+            return d
+        if not inexact:
+            raise ValueError("not known exactly")
+        if float(d.copy_abs()) + e >= 10.0 ** (self._prec - 11):
+            raise ValueError("too many digits")
+        return self._settled(d, e, _PLACE)
+
+    def _settled(self, d: Decimal, e: float, place: Decimal) -> Decimal:
+        """d rounded half up to `place`, the same all over the bound"""
+
+        l_bound = Decimal(e)
+        l_low = _EXACT.subtract(d, l_bound).quantize(
+            place, rounding=ROUND_HALF_UP, context=_EXACT
+        )
+        l_high = _EXACT.add(d, l_bound).quantize(
+            place, rounding=ROUND_HALF_UP, context=_EXACT
+        )
+        if l_low.compare_total(l_high) != 0:
+            raise Ambiguous("rounding not known")
+        return l_low
+
+    def _checked(self, d: Decimal, e: float) -> Value:
+        """a value computed at the working precision, in float range"""
+
+        l_abs = float(d.copy_abs())
+        if not (_TINY < l_abs < _HUGE or d == 0) or not math.isfinite(e):
+            raise ValueError("out of range")
+        return (d, e)
+
+    # values
+
+    def _number(self, word: Word) -> Value:  # type: ignore[override]
+        return (super()._number(word), 0.0)
+
+    def _read(self, word: Word) -> Value:  # type: ignore[override]
+        return (super()._read(word), 0.0)
+
+    def _variable(self, word: Word) -> Value:  # type: ignore[override]
+        return (super()._variable(word), 0.0)
+
+    def _list(self, word: Word) -> list[Value]:  # type: ignore[override]
+        return [(v, 0.0) for v in super()._list(word)]
+
+    def _apply(  # type: ignore[override]
+        self, op: Operator, w: int, at: int, left: Value, right: Value
+    ) -> Value:
+        a, ea = left
+        b, eb = right
+        name = op.operator
+        work = self._work
+
+        if ea == 0.0 and eb == 0.0:
+            return (super()._apply(op, w, at, a, b), 0.0)  # type: ignore
+
+        if name == "+" or name == "-":
+            d = work.add(a, b) if name == "+" else work.subtract(a, b)
+            l_abs = float(d.copy_abs())
+            e = ea + eb + l_abs * self._unit
+            e += (l_abs + e) * self._delta
+            self._event(None, w, at)
+            return self._checked(d, e)
+
+        fa, fb = float(a), float(b)
+        if name == "*":
+            d = work.multiply(a, b)
+            e = abs(fa) * eb + abs(fb) * ea + ea * eb
+        elif name == "/":
+            if not abs(fb) > 2 * eb:
+                raise Ambiguous("divisor not known to be nonzero")
+            d = work.divide(a, b)
+            e = 2 * (ea + abs(float(d)) * eb) / abs(fb)
+        else:  # "^"
+            if not fa > 2 * ea:
+                if fa < -2 * ea:
+                    raise ValueError("power of a negative number")
+                raise Ambiguous("power not known")
+            d = work.power(a, b)
+            l_rel = abs(fb) * ea / (fa - ea) + abs(math.log(fa)) * eb
+            if l_rel > REL:
+                raise Ambiguous("power not known")
+            # power() is only almost always correctly rounded: twice
+            e = abs(float(d)) * (2 * l_rel + self._unit + self._delta)
+
+        l_abs = float(d.copy_abs())
+        e += l_abs * self._unit
+        e += (l_abs + e) * self._delta
+        self._event(None, w, at)
+        return self._checked(d, e)
+
+    def _function(  # type: ignore[override]
+        self, op: Operator, w: int, at: int, l_args: list[Value]
+    ) -> tuple[Value, str]:
+        name = op.operator
+
+        if name in WORKED or (
+            name == "exp" and any(v[1] != 0.0 for v in l_args)
+        ):
+            if len(l_args) != 1:
+                raise ValueError(f"func {name}: parameters")
+            return self._worked(name, w, at, l_args[0]), ""
+
+        if all(v[1] == 0.0 for v in l_args):
+            res, fmt = super()._function(
+                op, w, at, [v[0] for v in l_args]  # type: ignore
+            )
+            return (res, 0.0), fmt  # type: ignore
+
+        if op.afunc is not None:  # variadic
+            if name == "sum":
+                return self._total(w, at, l_args), ""
+            return self._pick(name, l_args), ""
+
+        if len(l_args) != len(op.sig):
+            raise ValueError(f"func {name}: parameters")
+        if name == "round":
+            return self._round(w, at, l_args[0], l_args[1]), ""
+        if op.sig[0] == Pt.Int:  # hex, oct
+            raise ValueError(f"func {name}: not known exactly")
+
+        a, ea = l_args[0]
+        if name == "abs":
+            # of working digits, fewer than the context keeps
+            self._event(True, w, at)
+            return (a.copy_abs(), ea), ""
+
+        # sqrt
+        fa = float(a)
+        if not fa - ea > 0:
+            raise Ambiguous("sqrt not known")
+        d = self._work.sqrt(a)
+        e = ea / math.sqrt(fa - ea)
+        l_abs = float(d.copy_abs())
+        e += l_abs * self._unit
+        e += (l_abs + e) * self._delta
+        self._event(None, w, at)  # sqrt of a square
+        return self._checked(d, e), ""
+
+    def _worked(self, name: str, w: int, at: int, value: Value) -> Value:
+        """ln, log, or exp of a worked value, at the working precision"""
+
+        a, ea = value
+        work = self._work
+
+        if ea == 0.0:
+            # exact only of 1 and a power of ten, where the working one is
+            if name == "ln":
+                d, exact = work.ln(a), a == 1
+            else:
+                d, exact = work.log10(a), _power_of_ten(a)
+            if exact:
+                return (d, 0.0)
+            self._sets(self._place(w, at))
+            l_abs = float(d.copy_abs())
+            return self._checked(d, l_abs * (self._unit + self._delta))
+
+        fa = float(a)
+        exact: bool | None = None
+        if name == "exp":
+            d = work.exp(a)
+            if abs(fa) > ea * (1 + U):
+                exact = False  # not exp(0)
+            e = float(d) * ea * math.exp(ea)
+        else:
+            if not fa - ea > 0:
+                raise Ambiguous(f"{name} not known")
+            e = ea / (fa - ea)
+            if name == "ln":
+                d = work.ln(a)
+                if abs(fa - 1) > ea + 4 * U * abs(fa):
+                    exact = False  # not ln(1)
+            else:
+                d = work.log10(a)
+                e /= math.log(10)
+
+        l_abs = float(d.copy_abs())
+        e += l_abs * self._unit
+        e += (l_abs + e) * self._delta
+        self._event(exact, w, at)
+        return self._checked(d, e)
+
+    def _total(self, w: int, at: int, l_args: list[Value]) -> Value:
+        """sum(), added one by one in the context"""
+
+        d = Decimal(0)
+        for v in l_args:
+            d = self._work.add(d, v[0])
+        l_size = sum(float(v[0].copy_abs()) + v[1] for v in l_args)
+        e = sum(v[1] for v in l_args)
+        e += len(l_args) * l_size * (self._unit + self._delta)
+        self._event(None, w, at)
+        return self._checked(d, e)
+
+    def _pick(self, name: str, l_args: list[Value]) -> Value:
+        """max() or min(), the pick must not depend on the bounds"""
+
+        if name == "max":
+            res = max(l_args, key=lambda v: v[0])
+        else:
+            res = min(l_args, key=lambda v: v[0])
+
+        for v in l_args:
+            l_apart = abs(float(_EXACT.subtract(v[0], res[0])))
+            if v is res or l_apart > (v[1] + res[1]) * (1 + U):
+                continue
+            raise Ambiguous(f"{name} not known")
+        return res
+
+    def _round(self, w: int, at: int, value: Value, places: Value) -> Value:
+        """round(value, n), half up, clears Inexact"""
+
+        n, en = places
+        if en != 0.0:
+            raise ValueError("round: places not known exactly")
+        if n != round(n):
+            raise ValueError("this param must be Integer")
+
+        if abs(n) > 1000:
+            raise ValueError("round: too many places")
+
+        d, e = value
+        res = self._settled(d, e, Decimal(1).scaleb(-int(n), _EXACT))
+        if len(res.as_tuple().digits) > self._prec:
+            raise ValueError("round: too many digits")  # as quantize
+
+        self._clears(self._place(w, at))
+        self._flags[Inexact] = False
+        return (res, 0.0)
+
+
+def pays(input: str) -> bool:
+    """`input` calls ln or log more often than it multiplies, divides,
+    raises to a power or calls exp, where a working precision is faster"""
+
+    # counted on the text, names that hold them too: it only decides
+    # whether to try, and is cheaper than a pattern
+    l_calls = input.count("ln") + input.count("log")
+    l_costs = (
+        input.count("*")
+        + input.count("/")
+        + input.count("^")
+        + input.count("exp")
+    )
+    return l_calls > l_costs
+
+
+def evaluate(
+    input: str,
+    *,
+    register: Register | None = None,
+    variables: Variables | None = None,
+) -> Number:
+    """evaluate `input` at the working precisions, in the current decimal
+    context
+
+    The value is the one calculate_num rounds to the same result as in the
+    context, and the Inexact flag is set the same. Raises when that is not
+    certain at any working precision, or on any error.
+    """
+
+    l_prec = getcontext().prec
+    l_error: ValueError = Ambiguous("no working precision")
+    for prec in PRECISIONS:
+        if prec >= l_prec:
+            break
+        p = _WorkingPass(input, register, variables, prec)
+        try:
+            value, fmt, l_span = p.run()
+            l_inexact = p.inexact()
+            res = Number(p.result(value, l_inexact), l_span, fmt, input=input)
+        except Ambiguous as e:
+            l_error = e
+            continue
+        p._flags[Inexact] = l_inexact
+        return res
+    raise l_error
@@ -0,0 +1,842 @@
+"""benchmarks
+
+run all:   python -m dailycalc.calculator.benchmark
+run some:  python -m dailycalc.calculator.benchmark reduce
+"""
+
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Context, Decimal, localcontext
+from typing import Callable
+
+if not __package__:
+    from define import Word, WordType, WordList
+    from parserlogger import ParserLogger
+    from calculator import Chain, calculate, compile, parse_cache
+    from calculator import result_cache, check_calc, check_many
+    from calculator import function_cache, _context
+    from floats import evaluate as on_floats
+    from adaptive import evaluate as adaptive, pays as adaptive_pays
+    from vm import lower, run
+    from words import parse, tokenize, lint
+else:
+    from .define import Word, WordType, WordList
+    from .parserlogger import ParserLogger
+    from .calculator import Chain, calculate, compile, parse_cache
+    from .calculator import result_cache, check_calc, check_many
+    from .calculator import function_cache, _context
+    from .floats import evaluate as on_floats
+    from .adaptive import evaluate as adaptive, pays as adaptive_pays
+    from .vm import lower, run
+    from .words import parse, tokenize, lint
+
+
+def _timeit(fn: Callable[[], object]) -> float:
+    """seconds taken by one call of `fn`"""
+
+    l_start = time.perf_counter()
+    fn()
+    return time.perf_counter() - l_start
+
+
+def _products(size: int) -> WordList:
+    """words of "sum(1*2, 3*4, ...)" with about `size` tokens
+
+    The words are built directly, the parser is not part of the measurement.
+    """
+
+    l_words: WordList = []
+    l_offset = 0
+
+    def _add(s: str, type: WordType):
+        nonlocal l_offset
+        l_words.append(Word(s, s, type, l_offset))
+        l_offset += len(s)
+
+    _add("sum", WordType.FUNCNAME)
+    _add("(", WordType.LEFTPAREN)
+    for i in range(max(size // 4, 1)):
+        if i > 0:
+            _add(",", WordType.COMMA)
+        _add(str(i % 9 + 1), WordType.NUM)
+        _add("*", WordType.OPERATOR)
+        _add(str(i % 7 + 1), WordType.NUM)
+    _add(")", WordType.RIGHTPAREN)
+
+    return l_words
+
+
+def _variadic(count: int, name: str = "sum") -> WordList:
+    """words of "sum(1, 2, ...)" with `count` arguments"""
+
+    l_words: WordList = []
+    l_offset = 0
+
+    def _add(s: str, type: WordType):
+        nonlocal l_offset
+        l_words.append(Word(s, s, type, l_offset))
+        l_offset += len(s)
+
+    _add(name, WordType.FUNCNAME)
+    _add("(", WordType.LEFTPAREN)
+    for i in range(count):
+        if i > 0:
+            _add(",", WordType.COMMA)
+        _add(f"{i % 97}.{i % 13}", WordType.NUM)
+    _add(")", WordType.RIGHTPAREN)
+
+    return l_words
+
+
+def _terms(count: int) -> WordList:
+    """words of "1+2+3+..." with `count` terms"""
+
+    l_words: WordList = []
+    l_offset = 0
+    for i in range(count):
+        if i > 0:
+            l_words.append(Word("+", "+", WordType.OPERATOR, l_offset))
+            l_offset += 1
+        s = str(i % 9 + 1)
+        l_words.append(Word(s, s, WordType.NUM, l_offset))
+        l_offset += len(s)
+
+    return l_words
+
+
+def _scan(chain: Chain):
+    """reduce `chain` by max-weight scan"""
+
+    while len(chain) != 0:
+        i = max(range(len(chain)), key=lambda a: chain[a].w)
+        chain.reduce_chain(i)
+
+
+def bench_reduce(
+    sizes=(10**3, 10**4, 10**5, 10**6), scan_limit: int = 10**4
+):
+    """Chain.reduce_all against the max-weight scan"""
+
+    print(f"{'tokens':>9} {'reduce_all':>12} {'per token':>12} {'scan':>12}")
+
+    for size in sizes:
+        l_words = _products(size)
+
+        chain = Chain(l_words, logger=ParserLogger())
+        l_linear = _timeit(chain.reduce_all)
+
+        l_scan = "-"
+        if size <= scan_limit:
+            chain = Chain(l_words, logger=ParserLogger())
+            l_scan = f"{_timeit(lambda: _scan(chain)):.4f}s"
+
+        print(
+            f"{len(l_words):>9} {l_linear:>11.4f}s"
+            f" {l_linear / len(l_words) * 1e6:>10.3f}us {l_scan:>12}"
+        )
+
+
+def bench_build(sizes=(10**3, 10**4, 10**5, 10**6)):
+    """Chain construction from words"""
+
+    print(f"{'tokens':>9} {'build':>12} {'per token':>12}")
+
+    for size in sizes:
+        l_words = _products(size)
+        l_build = _timeit(lambda: Chain(l_words, logger=ParserLogger()))
+        print(
+            f"{len(l_words):>9} {l_build:>11.4f}s"
+            f" {l_build / len(l_words) * 1e6:>10.3f}us"
+        )
+
+
+def bench_aggregate(sizes=(10, 10**2, 10**3, 10**4, 10**5, 10**6)):
+    """sum/max/min with many arguments: reduce_chain, reduce_all and VM"""
+
+    print(
+        f"{'args':>9} {'func':>5} {'reduce_chain':>13} {'reduce_all':>12}"
+        f" {'vm':>12} {'vm/arg':>10}"
+    )
+
+    for size in sizes:
+        for name in ("sum", "max", "min"):
+            l_words = _variadic(size, name)
+
+            chain = Chain(l_words, logger=ParserLogger())
+            l_chain = _timeit(lambda: chain.reduce_chain(0))
+
+            chain = Chain(l_words, logger=ParserLogger())
+            l_all = _timeit(chain.reduce_all)
+
+            program = lower(l_words)
+            l_vm = _timeit(lambda: run(program, logger=ParserLogger()))
+
+            print(
+                f"{size:>9} {name:>5} {l_chain:>12.4f}s {l_all:>11.4f}s"
+                f" {l_vm:>11.4f}s {l_vm / size * 1e6:>8.3f}us"
+            )
+
+
+def bench_provenance(sizes=(10**3, 10**4, 10**5, 10**6)):
+    """reduce_all on "1+2+3+...": every step merges the source spans"""
+
+    print(f"{'terms':>9} {'reduce_all':>12} {'per term':>12} {'source':>9}")
+
+    for size in sizes:
+        chain = Chain(_terms(size), logger=ParserLogger())
+        l_time = _timeit(chain.reduce_all)
+        l_source = chain.result()[0].source_str
+        print(
+            f"{size:>9} {l_time:>11.4f}s {l_time / size * 1e6:>10.3f}us"
+            f" {len(l_source):>9}"
+        )
+
+
+def bench_parse(sizes=(10**3, 10**4, 10**5)):
+    """tokenize and parse "sum(1.0, 2.1, ...)" of growing length"""
+
+    print(
+        f"{'args':>9} {'chars':>9} {'tokenize':>12} {'parse':>12}"
+        f" {'per char':>12}"
+    )
+
+    for size in sizes:
+        s = "sum(" + ", ".join(f"{i % 97}.{i % 13}" for i in range(size)) + ")"
+        l_tokenize = _timeit(lambda: tokenize(s))
+        l_time = _timeit(lambda: parse(s))
+        print(
+            f"{size:>9} {len(s):>9} {l_tokenize:>11.4f}s {l_time:>11.4f}s"
+            f" {l_time / len(s) * 1e6:>10.3f}us"
+        )
+
+
+def _nested(depth: int) -> str:
+    """ "sum(max(sum(... 1 ..., 2), 2), 2)" nested `depth` times"""
+
+    l_names = ("sum(", "max(") * depth
+    return "".join(l_names[:depth]) + "1" + ", 2)" * depth
+
+
+def bench_nesting(
+    depths=(10, 50, 100, 10**3, 10**4), terms=(10**2, 10**3, 10**4)
+):
+    """parse nested calls, and chains of parenthesized calls"""
+
+    print(f"{'input':<24} {'chars':>9} {'parse':>12} {'per char':>12}")
+
+    l_inputs = [(f"nested, depth {d}", _nested(d)) for d in depths]
+    l_inputs += [
+        (f"chain, {n} terms", " + ".join(f"(max({i}, 1))" for i in range(n)))
+        for n in terms
+    ]
+    for name, s in l_inputs:
+        l_time = _timeit(lambda: parse(s))
+        print(
+            f"{name:<24} {len(s):>9} {l_time:>11.4f}s"
+            f" {l_time / len(s) * 1e6:>10.3f}us"
+        )
+
+
+SHORT = [
+    "1 + 2 * 3",
+    "sum(1.5, 2, 3) * 0.07",
+    "round(1234.5678 * 1.13, 2)",
+    "max(1, 2, 3) - min(4, 5, 6) / 2",
+]
+"""short, high volume expressions"""
+
+
+def bench_cache(repeat: int = 20000):
+    """calculate on repeated short expressions, with and without parse_cache"""
+
+    l_maxsize = parse_cache.maxsize
+
+    def _run():
+        for i in range(repeat):
+            calculate(SHORT[i % len(SHORT)])
+
+    parse_cache.resize(0)
+    l_cold = _timeit(_run)
+
+    parse_cache.resize(l_maxsize)
+    parse_cache.clear()
+    l_hot = _timeit(_run)
+
+    print(f"{'calls':>9} {'no cache':>12} {'cache':>12} {'speedup':>9}")
+    print(
+        f"{repeat:>9} {l_cold:>11.4f}s {l_hot:>11.4f}s"
+        f" {l_cold / l_hot:>8.2f}x   {parse_cache.info()}"
+    )
+
+
+def bench_results(repeat: int = 20000):
+    """calculate on repeated expressions, with and without result_cache"""
+
+    l_exprs = [*SHORT, " 1E3 * 1.13 ", "1e3*1.13", "sqrt(2) * 1.2 / 3"]
+    l_maxsize = result_cache.maxsize
+
+    def _run():
+        for i in range(repeat):
+            calculate(l_exprs[i % len(l_exprs)])
+
+    result_cache.resize(0)
+    l_cold = _timeit(_run)
+
+    result_cache.resize(1024)
+    result_cache.clear()
+    l_hot = _timeit(_run)
+    l_info = result_cache.info()
+
+    result_cache.resize(l_maxsize)
+    result_cache.clear()
+
+    print(f"{'calls':>9} {'no cache':>12} {'cache':>12} {'speedup':>9}")
+    print(
+        f"{repeat:>9} {l_cold:>11.4f}s {l_hot:>11.4f}s"
+        f" {l_cold / l_hot:>8.2f}x   {l_info}"
+    )
+
+
+def bench_threads(calls: int = 20000, workers=(1, 2, 4, 8)):
+    """calculate from a thread pool: calls per second by pool size"""
+
+    l_inputs = [f"{s} + {i % 50}" for i, s in enumerate(SHORT * 50)]
+
+    def _run(i: int):
+        calculate(l_inputs[i % len(l_inputs)])
+
+    print(f"{'threads':>9} {'time':>12} {'calls/s':>12} {'speedup':>9}")
+
+    l_base = 0.0
+    for count in workers:
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            l_time = _timeit(lambda: list(pool.map(_run, range(calls))))
+        l_base = l_base or l_time
+        print(
+            f"{count:>9} {l_time:>11.4f}s {calls / l_time:>12.0f}"
+            f" {l_base / l_time:>8.2f}x"
+        )
+
+
+def bench_variables(rows: int = 20000):
+    """one formula over many rows: string formatting against variables"""
+
+    l_rows = [
+        (f"{i % 1000}.{i % 97:02}", f"0.{i % 13:02}") for i in range(rows)
+    ]
+
+    def _format():
+        for price, rate in l_rows:
+            calculate(f"round({price} * (1 + {rate}), 2)")
+
+    expression = compile("round(price * (1 + rate), 2)")
+
+    def _bind():
+        for price, rate in l_rows:
+            expression.evaluate(vars={"price": price, "rate": rate})
+
+    l_format = _timeit(_format)
+    l_bind = _timeit(_bind)
+
+    print(f"{'rows':>9} {'format':>12} {'vars':>12} {'speedup':>9}")
+    print(
+        f"{rows:>9} {l_format:>11.4f}s {l_bind:>11.4f}s"
+        f" {l_format / l_bind:>8.2f}x"
+    )
+
+
+LONG = "2 * (sqrt(2) + sum(1, 2, 3, (4 + 5) * 6)) / 3 - 1"
+
+
+def bench_vm(repeat: int = 20000):
+    """repeated evaluation: calculate_num, Chain and VM on compiled input"""
+
+    print(
+        f"{'expression':<50} {'calculate':>10} {'chain':>10} {'vm':>10}"
+        f" {'speedup':>9}"
+    )
+    for s in [*SHORT, LONG]:
+        expression = compile(s)
+        expression.program
+
+        l_calc = _timeit(lambda: [calculate(s) for _ in range(repeat)])
+        l_chain = _timeit(
+            lambda: [expression.evaluate() for _ in range(repeat)]
+        )
+        l_vm = _timeit(
+            lambda: [expression.evaluate(engine="vm") for _ in range(repeat)]
+        )
+        print(
+            f"{s:<50} {l_calc:>9.4f}s {l_chain:>9.4f}s {l_vm:>9.4f}s"
+            f" {l_chain / l_vm:>8.2f}x"
+        )
+
+
+WEIGHTED = " + ".join(f"x{i % 8} * {i}.25" for i in range(40))
+"""a long formula of variables, a weighted score"""
+
+ROW_FORMULAS = [
+    "x * 1.13 + y / 3",
+    "(x + 1) ^ 2 + (x + 1) * (y - 1) + (y - 1) ^ 2",
+    "round(x * (1 + 0.13) * (1 - 0.05), 2) + y * 0.07 - min(x, y)",
+    WEIGHTED,
+    f"({WEIGHTED}) / (x1 + x2) - round(x3 * 1.07, 2)",
+]
+"""formulas evaluated once per row of variables"""
+
+
+def bench_codegen(rows: int = 5000):
+    """one formula over many rows: Chain, VM and the generated function; the
+    cost of generating it and the evaluations that pay it back"""
+
+    l_rows = [
+        {
+            "x": f"{i % 1000}.{i % 97:02}",
+            "y": f"{1 + i % 13}.{i % 7}",
+            **{f"x{k}": f"{(i + k) % 100}.{k}" for k in range(8)},
+        }
+        for i in range(rows)
+    ]
+
+    print(
+        f"{'formula':<40} {'chain':>9} {'vm':>9} {'codegen':>9}"
+        f" {'vs vm':>7} {'generate':>9} {'pays at':>8}"
+    )
+    for s in ROW_FORMULAS:
+        expression = compile(s)
+        with localcontext(_context()):
+            expression.optimized  # the VM needs it too
+            l_generate = _timeit(lambda: expression.function)
+
+        def _run(engine: str) -> float:
+            return _timeit(
+                lambda: [
+                    expression.evaluate(vars=v, engine=engine) for v in l_rows
+                ]
+            )
+
+        l_chain, l_vm, l_codegen = _run("chain"), _run("vm"), _run("codegen")
+        l_saved = (l_vm - l_codegen) / rows
+        l_pays = f"{l_generate / l_saved:>8.0f}" if l_saved > 0 else "never"
+        l_name = s if len(s) <= 40 else s[:37] + "..."
+        print(
+            f"{l_name:<40} {l_chain:>8.4f}s {l_vm:>8.4f}s {l_codegen:>8.4f}s"
+            f" {l_vm / l_codegen:>6.2f}x {l_generate * 1e3:>7.3f}ms"
+            f" {l_pays:>8}"
+        )
+
+
+def bench_optimize(repeat: int = 20000):
+    """VM on the lowered program against the optimized one"""
+
+    l_exprs = [
+        "sqrt(2) * x + sqrt(2) * y",
+        "round(x * (1 + 0.13) * (1 - 0.05), 2) + sqrt(3) / 2",
+        "(x + 1) ^ 2 + (x + 1) * (y - 1) + (y - 1) ^ 2",
+        LONG,
+    ]
+    l_vars = {"x": "1.5", "y": "2.5"}
+
+    print(
+        f"{'expression':<50} {'removed':>8} {'lowered':>10} {'optimized':>10}"
+        f" {'speedup':>9}"
+    )
+    for s in l_exprs:
+        expression = compile(s)
+        expression.evaluate(vars=l_vars, engine="vm")
+        l_program = expression.program
+        l_optimized_program = expression.optimized
+
+        def _plain():
+            for _ in range(repeat):
+                run(l_program, variables=l_vars, logger=ParserLogger())
+
+        def _optimized():
+            for _ in range(repeat):
+                run(
+                    l_optimized_program,
+                    variables=l_vars,
+                    logger=ParserLogger(),
+                )
+
+        l_plain = _timeit(_plain)
+        l_optimized = _timeit(_optimized)
+        print(
+            f"{s:<50} {l_optimized_program.removed:>8}"
+            f" {l_plain:>9.4f}s {l_optimized:>9.4f}s"
+            f" {l_plain / l_optimized:>8.2f}x"
+        )
+
+
+def bench_check(size: int = 20000):
+    """check formulas by evaluating them, or only validating them"""
+
+    l_exprs = [
+        *SHORT,
+        "exp(ln(2) * 40) ^ 0.5 / sqrt(3)",
+        "log(exp(1.5) ^ 3, 2) + ln(7) * 2",
+    ]
+    l_inputs = [f"{s} + {i}" for i, s in enumerate(l_exprs * (size // 6))]
+
+    def _run(evaluate: bool):
+        parse_cache.clear()
+        for s in l_inputs:
+            check_calc(s, evaluate=evaluate)
+
+    l_calc = _timeit(lambda: _run(True))
+    l_check = _timeit(lambda: _run(False))
+    l_many = _timeit(lambda: check_many(l_inputs))
+
+    print(
+        f"{'inputs':>9} {'evaluate':>12} {'validate':>12} {'check_many':>12}"
+        f" {'speedup':>9}"
+    )
+    print(
+        f"{len(l_inputs):>9} {l_calc:>11.4f}s {l_check:>11.4f}s"
+        f" {l_many:>11.4f}s {l_calc / l_many:>8.2f}x"
+    )
+
+
+def bench_lint(size: int = 20000):
+    """lint formulas with several errors, against one diagnostic parse"""
+
+    l_inputs = [
+        f"{s} + * {i} + ({i} {i}) + sum(1,,2) + max("
+        for i, s in enumerate(SHORT * (size // len(SHORT)))
+    ]
+
+    def _parse():
+        for s in l_inputs:
+            try:
+                parse(s, log=ParserLogger())
+            except ValueError:
+                pass
+
+    l_parse = _timeit(_parse)
+    l_errors = 0
+
+    def _lint():
+        nonlocal l_errors
+        for s in l_inputs:
+            l_errors += len(lint(s))
+
+    l_lint = _timeit(_lint)
+
+    print(f"{'inputs':>9} {'parse':>12} {'lint':>12} {'errors':>9}")
+    print(
+        f"{len(l_inputs):>9} {l_parse:>11.4f}s {l_lint:>11.4f}s"
+        f" {l_errors:>9}"
+    )
+
+
+def _traced(fn: Callable[[], object]) -> tuple[object, int]:
+    """(result of `fn`, bytes it allocated and still holds, peak bytes)"""
+
+    tracemalloc.start()
+    try:
+        l_before = tracemalloc.get_traced_memory()[0]
+        res = fn()
+        l_after, l_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return res, l_after - l_before, l_peak - l_before
+
+
+def bench_memory(size: int = 10**6):
+    """memory of the words of `size` character inputs, by tracemalloc"""
+
+    l_inputs = {
+        "sum": "sum("
+        + ", ".join(f"{i % 97}.{i % 13}" for i in range(size // 6)),
+        "terms": "+".join(str(i % 9 + 1) for i in range(size // 2)),
+        "calls": " + ".join(
+            f"max(x, 0x{i % 255:x})" for i in range(size // 16)
+        ),
+    }
+
+    print(
+        f"{'input':<8} {'chars':>9} {'words':>9} {'tokenize':>10}"
+        f" {'per word':>9} {'parse':>10} {'peak':>10}"
+    )
+
+    for name, s in l_inputs.items():
+        s = s[:size].rsplit(",", 1)[0].rsplit("+", 1)[0]
+        if name == "sum":
+            s += ")"
+        l_words, l_tokenize, _ = _traced(lambda: tokenize(s))
+        _, l_parse, l_peak = _traced(lambda: parse(s))
+        l_count = len(l_words)  # type: ignore
+        print(
+            f"{name:<8} {len(s):>9} {l_count:>9}"
+            f" {l_tokenize / 2**20:>8.1f}MB {l_tokenize / l_count:>8.1f}B"
+            f" {l_parse / 2**20:>8.1f}MB {l_peak / 2**20:>8.1f}MB"
+        )
+
+
+def bench_pratt(size: int = 20000, length: int = 10**5):
+    """calculate on inputs seen once: parse and reduce the chain, or parse
+    and evaluate in one pass; time and peak memory"""
+
+    l_inputs = [f"{s} + {i}" for i, s in enumerate(SHORT * (size // 4))]
+    l_long = " + ".join(
+        f"{i % 97}.{i % 13} * (2 - {i % 7})" for i in range(length // 16)
+    )
+
+    print(
+        f"{'engine':<8} {'inputs':>9} {'time':>12} {'calls/s':>10}"
+        f" {'chars':>9} {'time':>10} {'peak':>10}"
+    )
+
+    for engine in ("chain", "pratt"):
+        parse_cache.clear()
+        l_time = _timeit(
+            lambda: [calculate(s, engine=engine) for s in l_inputs]
+        )
+
+        parse_cache.clear()
+        l_long_time = _timeit(lambda: calculate(l_long, engine=engine))
+        parse_cache.clear()
+        _, _, l_peak = _traced(lambda: calculate(l_long, engine=engine))
+
+        print(
+            f"{engine:<8} {len(l_inputs):>9} {l_time:>11.4f}s"
+            f" {len(l_inputs) / l_time:>10.0f} {len(l_long):>9}"
+            f" {l_long_time:>9.4f}s {l_peak / 2**10:>8.0f}KB"
+        )
+
+
+FORMULAS = [
+    "sqrt(x) * ln(y) + exp(x / 1000)",
+    "log(x * 1e3) + ln(y) - sqrt(2)",
+    "round(sqrt(x * y), 4) + round(y, 2)",
+    "max(x, y) - min(x, y) + 1",
+    "x * 1.13 + y / 3",
+]
+
+
+def bench_floats(rows: int = 5000):
+    """one formula over many rows: Decimal, or floats with Decimal when the
+    float result may differ; time and share of rows kept on floats"""
+
+    l_rows = [
+        {"x": f"{i % 1000}.{i % 97:02}", "y": f"{1 + i % 13}.{i % 7}"}
+        for i in range(rows)
+    ]
+
+    print(
+        f"{'formula':<36} {'decimal':>10} {'float':>10} {'speedup':>8}"
+        f" {'floats':>7}"
+    )
+
+    for formula in FORMULAS:
+        l_times = [
+            _timeit(
+                lambda: [
+                    calculate(formula, vars=v, engine="pratt", numeric=n)
+                    for v in l_rows
+                ]
+            )
+            for n in ("decimal", "float")
+        ]
+
+        l_kept = 0
+        with localcontext(Context(prec=30)):
+            for v in l_rows:
+                try:
+                    on_floats(formula, variables=v)
+                    l_kept += 1
+                except Exception:
+                    pass
+
+        print(
+            f"{formula:<36} {l_times[0]:>9.4f}s {l_times[1]:>9.4f}s"
+            f" {l_times[0] / l_times[1]:>7.2f}x {l_kept / rows:>7.0%}"
+        )
+
+
+TRANSCENDENTAL = [
+    "ln(exp(x / 10))",
+    "ln(exp(ln(exp(y))))",
+    "exp(ln(y)) * x",
+    "round(ln(x), 4) + exp(y / 10)",
+    "log(x * 1e3) + ln(y) - sqrt(2)",
+    "x ^ 0.5 * ln(y)",
+    "ln(x) + ln(y) + ln(x * y)",
+    "ln(x) - ln(y)",
+    "sum(ln(x), ln(y), log(y))",
+    "max(ln(x), log(y))",
+]
+
+
+def bench_adaptive(rows: int = 2000):
+    """ln, exp, log and ^ over many rows: in the context, or at a working
+    precision first where it pays; time, results that differ and share
+    settled below the context"""
+
+    l_rows = [
+        {"x": f"{1 + i % 1000}.{i % 97:02}", "y": f"{1 + i % 13}.{i % 7}"}
+        for i in range(rows)
+    ]
+
+    print(
+        f"{'formula':<32} {'pays':>5} {'decimal':>10} {'adaptive':>10}"
+        f" {'speedup':>8} {'differ':>7} {'settled':>8}"
+    )
+
+    for formula in TRANSCENDENTAL:
+        l_results = []
+        l_times = []
+        for numeric in ("decimal", "adaptive"):
+            l_time = _timeit(
+                lambda: l_results.append(
+                    [
+                        calculate(
+                            formula, vars=v, engine="pratt", numeric=numeric
+                        )
+                        for v in l_rows
+                    ]
+                )
+            )
+            l_times.append(l_time)
+        l_differ = sum(a != b for a, b in zip(*l_results))
+
+        l_settled = 0
+        with localcontext(Context(prec=30)):
+            for v in l_rows:
+                try:
+                    adaptive(formula, variables=v)
+                    l_settled += 1
+                except Exception:
+                    pass
+
+        print(
+            f"{formula:<32} {'yes' if adaptive_pays(formula) else 'no':>5}"
+            f" {l_times[0]:>9.4f}s {l_times[1]:>9.4f}s"
+            f" {l_times[0] / l_times[1]:>7.2f}x {l_differ:>7}"
+            f" {l_settled / rows:>8.0%}"
+        )
+
+
+PRECISE = {
+    "sqrt(2)": lambda c: c.sqrt(Decimal(2)),
+    "ln(2)": lambda c: c.ln(Decimal(2)),
+    "exp(1)": lambda c: c.exp(Decimal(1)),
+    "2 ^ 0.5": lambda c: c.power(Decimal(2), Decimal("0.5")),
+}
+"""formulas and the bare Decimal operation each one is"""
+
+
+def bench_precision(digits=(100, 1000, 10000)):
+    """sqrt, ln, exp and ^ at high precision: the Decimal operation alone,
+    `calculate` and Chain, and the share of time spent outside the
+    operation"""
+
+    print(
+        f"{'formula':<10} {'digits':>6} {'decimal':>10} {'calculate':>10}"
+        f" {'overhead':>8} {'chain':>10} {'overhead':>8}"
+    )
+
+    for p in digits:
+        l_repeat = max(1, 10**6 // p**2)
+        for formula, op in PRECISE.items():
+            l_bare = _timeit(
+                lambda: [op(Context(prec=p)) for _ in range(l_repeat)]
+            )
+            l_calc = _timeit(
+                lambda: [
+                    calculate(formula, prec=p, places=p - 10)
+                    for _ in range(l_repeat)
+                ]
+            )
+            l_line = (
+                f"{formula:<10} {p:>6} {l_bare / l_repeat:>9.5f}s"
+                f" {l_calc / l_repeat:>9.5f}s {1 - l_bare / l_calc:>8.1%}"
+            )
+
+            with localcontext(Context(prec=p)):
+                l_chain = _timeit(
+                    lambda: [
+                        compile(formula).evaluate_num()
+                        for _ in range(l_repeat)
+                    ]
+                )
+            l_line += (
+                f" {l_chain / l_repeat:>9.5f}s"
+                f" {1 - l_bare / l_chain:>8.1%}"
+            )
+            print(l_line)
+
+
+def bench_functions(rows: int = 5000):
+    """sqrt, ln, exp and log of recurring arguments over many rows: without
+    and with `function_cache`, and its hit rate"""
+
+    l_rows = [{"x": f"{1 + i % 100}.5"} for i in range(rows)]
+    l_formulas = [
+        "x * sqrt(2)",
+        "ln(x) / ln(10)",
+        "x * exp(1) + log(2)",
+        "ln(x) + ln(2)",
+    ]
+
+    print(
+        f"{'formula':<24} {'engine':<8} {'off':>10} {'on':>10}"
+        f" {'speedup':>8} {'hits':>6}"
+    )
+
+    for formula in l_formulas:
+        for engine in ("chain", "codegen"):
+            l_times = []
+            for size in (0, 1024):
+                function_cache.resize(size)
+                function_cache.clear()
+                l_times.append(
+                    _timeit(
+                        lambda: [
+                            calculate(formula, vars=v, engine=engine)
+                            for v in l_rows
+                        ]
+                    )
+                )
+            l_info = function_cache.info()
+            l_calls = max(1, l_info.hits + l_info.misses)  # folded
+            function_cache.resize(0)
+            function_cache.clear()
+            print(
+                f"{formula:<24} {engine:<8} {l_times[0]:>9.4f}s"
+                f" {l_times[1]:>9.4f}s {l_times[0] / l_times[1]:>7.2f}x"
+                f" {l_info.hits / l_calls:>6.0%}"
+            )
+
+
+BENCHMARKS: dict[str, Callable[[], None]] = {
+    "reduce": bench_reduce,
+    "build": bench_build,
+    "aggregate": bench_aggregate,
+    "provenance": bench_provenance,
+    "parse": bench_parse,
+    "nesting": bench_nesting,
+    "cache": bench_cache,
+    "results": bench_results,
+    "threads": bench_threads,
+    "variables": bench_variables,
+    "vm": bench_vm,
+    "codegen": bench_codegen,
+    "optimize": bench_optimize,
+    "check": bench_check,
+    "lint": bench_lint,
+    "memory": bench_memory,
+    "pratt": bench_pratt,
+    "floats": bench_floats,
+    "adaptive": bench_adaptive,
+    "precision": bench_precision,
+    "functions": bench_functions,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(f"== {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
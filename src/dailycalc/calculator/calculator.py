@@ -1,149 +1,92 @@
-import operator
-from copy import deepcopy
 import decimal
+import threading
 from decimal import (
     ROUND_05UP,
     ROUND_HALF_UP,
     Decimal,
     Context,
     getcontext,
-    setcontext,
     localcontext,
 )
 from dataclasses import dataclass
+from typing import Hashable, Iterable, Sequence
 
 if not __package__:
-    from define import FUNC_SET, Operator, Number, Pt, WordType, Register
+    from define import FUNC_SET, Operator, OperatorNode, Number, Pt
+    from define import Word, WordList, WordType, Register, Variables
+    from define import span, source
     from parserlogger import ParserLogger
+    from lrucache import LRUCache
+    from operators import MIN, OPER_DICT, ABYSS, ARG_SET, function_cache
+    from operators import valid_parameters, reduction_order
     from words import parse
+    from vm import Program, lower, run, validate
+    from codegen import Function, generate, call
+    from pratt import evaluate as fused
+    from floats import evaluate as on_floats, pays as floats_pay
+    from adaptive import evaluate as adaptive, pays as adaptive_pays
+    from optimizer import optimize, context_key
 else:
-    from .define import FUNC_SET, Operator, Number, Pt, WordType, Register
+    from .define import FUNC_SET, Operator, OperatorNode, Number, Pt
+    from .define import Word, WordList, WordType, Register, Variables
+    from .define import span, source
     from .parserlogger import ParserLogger
+    from .lrucache import LRUCache
+    from .operators import MIN, OPER_DICT, ABYSS, ARG_SET, function_cache
+    from .operators import valid_parameters, reduction_order
     from .words import parse
+    from .vm import Program, lower, run, validate
+    from .codegen import Function, generate, call
+    from .pratt import evaluate as fused
+    from .floats import evaluate as on_floats, pays as floats_pay
+    from .adaptive import evaluate as adaptive, pays as adaptive_pays
+    from .optimizer import optimize, context_key
+
+__all__ = [
+    "calculate",
+    "check",
+    "check_many",
+    "compile",
+    "error_message",
+    "Expression",
+    "parse_cache",
+    "result_cache",
+    "function_cache",
+    "invalidate",
+    "Register",
+    "RItem",
+]
 
-__all__ = ["calculate", "error_message", "Register", "RItem"]
-
-
-MIN = Decimal("1e-29")
 
 ROUND_PLACE: int = 10
 
-DEBUG_FLAG = False
-
-
-def _round(n1: Decimal, n2: Decimal):
-    with localcontext(rounding=ROUND_HALF_UP):
-        _res = round(n1, n2)  # type: ignore
-    getcontext().flags[decimal.Inexact] = False
-    return _res
-
-
-OPER_DICT = {
-    "+": Operator(10, "+", operator.add),
-    "-": Operator(10, "-", operator.sub),
-    "*": Operator(20, "*", getcontext().multiply),
-    "/": Operator(20, "/", getcontext().divide),  # operator.truediv),
-    "^": Operator(30, "^", getcontext().power),  # operator.pow),
-    "(": Operator(100, "(", lambda _, b: b),
-    ")": Operator(-100, ")", lambda a, _: a),
-    ",": Operator(0, ",", None),
-    # func's weight is same with '('
-    "sum": Operator(w=100, operator="sum", func=lambda *args: sum(list(args))),
-    "max": Operator(w=100, operator="max", func=lambda *args: max(list(args))),
-    "min": Operator(w=100, operator="min", func=lambda *args: min(list(args))),
-    "abs": Operator(w=100, operator="abs", func=abs, sig=[Pt.Num]),
-    "log": Operator(
-        w=100,
-        operator="log",
-        func=lambda x: getcontext().log10(x),
-        sig=[Pt.Num],
-    ),
-    "ln": Operator(
-        w=100, operator="ln", func=lambda x: getcontext().ln(x), sig=[Pt.Num]
-    ),
-    "exp": Operator(
-        w=100, operator="exp", func=lambda x: getcontext().exp(x), sig=[Pt.Num]
-    ),
-    "sqrt": Operator(
-        w=100,
-        operator="sqrt",
-        func=lambda x: getcontext().sqrt(x),
-        sig=[Pt.Num],
-    ),
-    "round": Operator(
-        w=100, operator="round", func=_round, sig=[Pt.Num, Pt.Int]
-    ),
-    "hex": Operator(
-        w=100,
-        operator="hex",
-        func=lambda a, *_: Decimal(a),
-        sig=[Pt.Int],
-        ffunc=hex,
-    ),
-    "oct": Operator(
-        w=100,
-        operator="oct",
-        func=lambda a, *_: Decimal(a),
-        sig=[Pt.Int],
-        ffunc=oct,
-    ),
-}
-
-ABYSS = Operator(-10000, "", None)
-
-
-parser_logger: ParserLogger
+PREC: int = 30
+"""significant digits of a calculation"""
 
-resultcontext = Context(rounding=ROUND_HALF_UP)
+DEBUG_FLAG = False
 
+PARSE_CACHE_SIZE: int = 1024
+"""default size of `parse_cache`"""
 
-def valid_parameters(
-    op: Operator, nums: list[Number], *, logger: ParserLogger
-) -> list[Decimal | int]:
-    """get valid parameters:
-    if parameters not match signature raise ValueError
-    """
+RESULT_CACHE_SIZE: int = 0
+"""default size of `result_cache`, 0 is off"""
 
-    # check count of parameters
-    l_len = len(op.sig)
+ENGINES = ("chain", "vm", "codegen", "pratt")
+"""evaluation engines: Chain reduction, lowered Program on the VM, lowered
+Program compiled to a Python function, input parsed and evaluated in one
+pass (errors from Chain)"""
 
-    if l_len == 0:
-        return [n.value for n in nums]
+NUMERICS = ("decimal", "float", "adaptive")
+"""numbers of calculate_num: Decimal, floats where the result is certain to
+be the same and Decimal elsewhere, or Decimal with ln and log, and what is
+computed from them, at fewer digits where the result is certain to be the
+same"""
 
-    if l_len > 0 and len(nums) != l_len:
-        _error = f"func {op.operator}: expecting { l_len } parameters got { len(nums) }"
 
-        if l_len > len(nums):
-            l_at = nums[-1].words[-1].end
-            l_to = 0
-        else:
-            l_at = nums[l_len].words[0].offset
-            l_to = nums[-1].words[-1].end
-
-        logger.add(_error, at=l_at, to=l_to, forced=True)
-        raise ValueError(_error)
-
-    # check and convert parameters type
-    res: list[Decimal | int] = []
-
-    for l_type, l_num in zip(op.sig, nums):
-        if l_type == Pt.Num:
-            res.append(l_num.value)
-
-        if l_type == Pt.Int:
-            l_int_value = round(l_num.value)
-            if l_num.value != l_int_value:
-                _error = f"this param must be Integer, got {l_num.value}"
-                logger.add(
-                    _error,
-                    at=l_num.words[0].offset,
-                    to=l_num.words[-1].end,
-                    forced=True,
-                )
-                raise ValueError(_error)
-            res.append(int(l_int_value))
+_last = threading.local()
+"""`logger` of the last calculation in this thread, for error_message"""
 
-    return res
+resultcontext = Context(rounding=ROUND_HALF_UP)
 
 
 @dataclass
@@ -155,21 +98,32 @@ class RItem:
 class Chain(object):
     def __init__(
         self,
-        raw: str,
+        words: Sequence[Word],
         *,
+        input: str | None = None,
         register: Register[RItem] | None = None,
+        variables: Variables | None = None,
         logger: ParserLogger,
+        tiny: Decimal = MIN,
     ):
-
-        self._operators: list[Operator] = []
+        """
+        Args:
+            words: parsed input
+            input: raw input the words come from, rebuilt from the words if
+                   None; Number.source_str slices it
+            tiny: numbers of this size or less are read as 0
+        """
+
+        self._operators: list[OperatorNode] = []
         self._nums: list[Number] = []
         self._register = register
+        self._variables = variables
+        self._input = input if input is not None else source(words)
         self.logger = logger
 
         base = 0
-        words = parse(raw, log=self.logger)
 
-        if words is None or words == []:
+        if not words:
             raise ValueError("not valid")
 
         self.logger.clear()
@@ -177,22 +131,20 @@ class Chain(object):
         for word in words:
             match word.type:
                 case WordType.LEFTPAREN:
-                    op = deepcopy(OPER_DICT[word.value_str])
-                    op.words = [word]
-                    op.w += base
-                    self._operators.append(op)
+                    op = OPER_DICT[word.value_str]
+                    self._operators.append(
+                        OperatorNode(op, op.w + base, [word])
+                    )
                     self._nums.append(Number.placeholder())
 
-                    base += OPER_DICT[word.value_str].w
+                    base += op.w
 
                 case WordType.RIGHTPAREN:
-                    op = deepcopy(OPER_DICT[word.value_str])
-                    op.words = [word]
-                    op.w = base
-                    self._operators.append(op)
+                    op = OPER_DICT[word.value_str]
+                    self._operators.append(OperatorNode(op, base, [word]))
                     self._nums.append(Number.placeholder())
 
-                    base += OPER_DICT[word.value_str].w
+                    base += op.w
 
                 case WordType.FUNCNAME:
                     if word.value_str not in FUNC_SET:
@@ -202,10 +154,10 @@ class Chain(object):
                         )
                         raise ValueError(_error)
 
-                    op = deepcopy(OPER_DICT[word.value_str])
-                    op.w += base
-                    op.words = [word]
-                    self._operators.append(op)
+                    op = OPER_DICT[word.value_str]
+                    self._operators.append(
+                        OperatorNode(op, op.w + base, [word])
+                    )
                     self._nums.append(Number.placeholder())
 
                 case WordType.OPERATOR | WordType.COMMA:
@@ -214,16 +166,16 @@ class Chain(object):
                         self.logger.add(_error, at=word.offset, forced=True)
                         raise ValueError(_error)
 
-                    op = deepcopy(OPER_DICT[word.value_str])
-                    op.w += base
-                    op.words = [word]
-                    self._operators.append(op)
+                    op = OPER_DICT[word.value_str]
+                    self._operators.append(
+                        OperatorNode(op, op.w + base, [word])
+                    )
 
                 case WordType.NUM:
                     num = Decimal(word.value_str)  # number(word)
-                    if abs(num) <= MIN:
+                    if abs(num) <= tiny:
                         num = Decimal("0")
-                    self._nums.append(Number(num, [word]))
+                    self._nums.append(self._number(num, word))
 
                 case WordType.REGISTER:
                     if self._register is None:
@@ -242,7 +194,11 @@ class Chain(object):
                         raise ValueError(_error)
 
                     num = res.value
-                    self._nums.append(Number(num.value, [word]))
+                    self._nums.append(self._number(num.value, word))
+
+                case WordType.VARIABLE:
+                    num = self._variable(word)
+                    self._nums.append(self._number(num, word))
 
                 case WordType.REGISTERLIST:
                     if self._register is None:
@@ -263,9 +219,13 @@ class Chain(object):
                         raise ValueError(_error)
 
                     for i, res in enumerate(res_list):
-                        self._nums.append(Number(res.value.value, [word]))
+                        self._nums.append(
+                            self._number(res.value.value, word)
+                        )
                         if i < len(res_list) - 1:
-                            self._operators.append(Operator(base, ",", None))
+                            self._operators.append(
+                                OperatorNode(OPER_DICT[","], base, [])
+                            )
 
                 case _:
                     _error = f"unknown: {word.word_str}"
@@ -275,10 +235,35 @@ class Chain(object):
         if base != 0:
             raise ValueError("not valid")
 
+    def _number(self, value: Decimal, word: Word) -> Number:
+        return Number(value, (word.offset, word.end), input=self._input)
+
+    def _variable(self, word: Word) -> Decimal:
+        """value bound to variable `word`"""
+
+        if self._variables is None or word.value_str not in self._variables:
+            _error = f"unknown variable: {word.value_str}"
+            self.logger.add(_error, at=word.offset, to=word.end, forced=True)
+            raise ValueError(_error)
+
+        value = self._variables[word.value_str]
+        num = Decimal(str(value)) if isinstance(value, float) else value
+        try:
+            num = Decimal(num)
+        except (TypeError, ValueError, decimal.InvalidOperation):
+            num = Decimal("NaN")
+
+        if not num.is_finite():
+            _error = f"invalid value of {word.value_str}: {value!r}"
+            self.logger.add(_error, at=word.offset, to=word.end, forced=True)
+            raise ValueError(_error)
+
+        return num
+
     def __len__(self) -> int:
         return len(self._operators)
 
-    def __getitem__(self, n) -> Operator:
+    def __getitem__(self, n) -> OperatorNode:
         if n < 0 or n >= len(self):
             return ABYSS
         return self._operators[n]
@@ -287,160 +272,744 @@ class Chain(object):
         del self._operators[n]
         del self._nums[n + 1]
 
+    def _call(
+        self,
+        node: OperatorNode,
+        nums: list[Number],
+        l_span: tuple[int, int] | None,
+    ) -> Number:
+        """call function `node` with arguments `nums`"""
+
+        op = node.op
+        if op.func is None:
+            _error = "operator function can't be None"
+            self.logger.add(_error, at=node.words[0].offset, forced=True)
+            raise ValueError(_error)
+
+        # variadic, arguments streamed
+        if op.afunc is not None:
+            res = op.afunc(n.value for n in nums if not n.isplaceholder)
+            return Number(res, l_span, input=self._input)
+
+        # get valid parameters
+        l_values = valid_parameters(
+            op=op,
+            nums=[n for n in nums if not n.isplaceholder],
+            logger=self.logger,
+        )
+
+        # calculate
+        res: Decimal = op.func(*l_values)
+        res_str: str = op.ffunc(*l_values) if op.ffunc else ""
+
+        # if abs(res) <= MIN:
+        #    res = Decimal(0)
+
+        return Number(res, l_span, res_str, input=self._input)
+
+    def _apply(
+        self, node: OperatorNode, l_left: Number, l_right: Number
+    ) -> Number:
+        """apply binary operator `node` to `l_left` and `l_right`"""
+
+        op = node.op
+        if op.func is None:
+            _error = "operator function can't be None"
+            self.logger.add(_error, at=node.words[0].offset, forced=True)
+            raise ValueError(_error)
+
+        try:
+            res = op.func(l_left.value, l_right.value)
+        except decimal.DivisionByZero:
+            _error = "cannot divide by Zero"
+            self.logger.add(
+                _error,
+                at=l_right.offset,
+                to=l_right.end,
+                forced=True,
+            )
+            raise ValueError(_error)
+
+        l_span = span(l_left.span, *node.words, l_right.span)
+
+        # if abs(res) <= MIN:
+        #     res = Decimal(0)
+
+        return Number(res, l_span, input=self._input)
+
     def reduce_chain(self, n: int):
-        op = self._operators[n]
+        node = self._operators[n]
 
-        if op.operator == ",":
+        if node.op.operator == ",":
             pass
 
-        elif op.operator in FUNC_SET:  # functions
-            l_nums = []
-            l_words = []
-            l_nums.append(self._nums[n + 1])
-            l_words.extend(op.words)
-            l_words.extend(self._nums[n + 1].words)
-
-            self._delete(n)
+        elif node.op.operator in FUNC_SET:  # functions
+            l_nums = [self._nums[n + 1]]
 
             # get parameters
+            m = n + 1
             while (
-                n < len(self._operators)
-                and self._operators[n].operator in {",", "(", ")"}
-                and self._operators[n].w == op.w
+                m < len(self._operators)
+                and self._operators[m].op.operator in ARG_SET
+                and self._operators[m].w == node.w
             ):
-                l_nums.append(self._nums[n + 1])
-                l_words.extend(self._operators[n].words)
-                l_words.extend(self._nums[n + 1].words)
-                self._delete(n)
-
-            if op.func is None:
-                _error = "operator function can't be None"
-                self.logger.add(_error, at=op.words[0].offset, forced=True)
-                raise ValueError(_error)
-
-            # get valid parameters
-            l_values = valid_parameters(
-                op=op,
-                nums=[n for n in l_nums if not n.isplaceholder],
-                logger=self.logger,
-            )
+                l_nums.append(self._nums[m + 1])
+                m += 1
 
-            # calculate
-            res: Decimal = op.func(*l_values)
-            res_str: str = op.ffunc(*l_values) if op.ffunc else ""
+            l_span = span(
+                *node.words,
+                *[w for op in self._operators[n + 1 : m] for w in op.words],
+                *[num.span for num in l_nums],
+            )
 
-            # if abs(res) <= MIN:
-            #    res = Decimal(0)
+            # delete the function and its arguments at once
+            del self._operators[n:m]
+            del self._nums[n + 1 : m + 1]
 
             # store the result
-            self._nums[n] = Number(res, l_words, res_str)
+            self._nums[n] = self._call(node, l_nums, l_span)
 
         else:  # binary operators
-            if op.func is None:
-                _error = "operator function can't be None"
-                self.logger.add(_error, at=op.words[0].offset, forced=True)
-                raise ValueError(_error)
+            self._nums[n] = self._apply(
+                node, self._nums[n], self._nums[n + 1]
+            )
 
-            l_left: Number = self._nums[n]
-            l_right: Number = self._nums[n + 1]
-            try:
-                res = op.func(l_left.value, l_right.value)
-            except decimal.DivisionByZero:
-                _error = "cannot divide by Zero"
-                self.logger.add(
-                    _error,
-                    at=l_right.words[0].offset,
-                    to=l_right.words[-1].end,
-                    forced=True,
-                )
-                raise ValueError(_error)
+            self._delete(n)
 
-            l_words = l_left.words + op.words + l_right.words
+    def reduce_all(self):
+        """reduce the whole chain in one pass, see `reduction_order`
 
-            # if abs(res) <= MIN:
-            #     res = Decimal(0)
+        Same results and errors as driving `reduce_chain` by max-weight scan,
+        but reduced operators are unlinked rather than deleted from the lists.
+        """
 
-            self._nums[n] = Number(res, l_words)
+        ops = self._operators
+        nums = self._nums
 
-            self._delete(n)
+        for i, l_at, l_args in reduction_order(ops):
+            node = ops[i]
+
+            if node.op.operator in FUNC_SET:  # functions
+                l_nums = [nums[k] for k in l_args]
+                l_span = span(
+                    *node.words,
+                    *[w for k in l_args[1:] for w in ops[k - 1].words],
+                    *[num.span for num in l_nums],
+                )
+
+                nums[l_at] = self._call(node, l_nums, l_span)
+
+            else:  # binary operators
+                nums[l_at] = self._apply(node, nums[l_at], nums[l_args[0]])
+
+        self._operators = []
+        self._nums = nums[:1]
 
     def result(self) -> list[Number]:
         return self._nums
 
 
+def _context(prec: int = PREC) -> Context:
+    """decimal context of a calculation"""
+
+    return Context(
+        prec=prec,
+        rounding=ROUND_05UP,
+        flags=[decimal.Inexact, decimal.Rounded],
+        traps=[decimal.DivisionByZero],
+    )
+
+
+def _rounded(result: Number, places: int = ROUND_PLACE) -> Number:
+    """`result` rounded to `places` when it is inexact, else normalized"""
+
+    _context = getcontext()
+    if _context.flags[decimal.Inexact]:
+        result.value = result.value.quantize(
+            Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP
+        )
+    else:
+        result.value = 0 + result.value.normalize()
+
+    return result
+
+
+class Expression(object):
+    """compiled expression: parsed once, evaluated any number of times"""
+
+    __slots__ = (
+        "_input",
+        "_words",
+        "_variables",
+        "_program",
+        "_optimized",
+        "_function",
+        "_runs",
+        "_canonical",
+        "_reads_register",
+    )
+
+    GENERATE_AFTER: int = 500
+    """evaluations with engine="codegen" run on the VM before the function
+    is generated: generating takes 0.6-3ms, paid back after 200-450
+    evaluations of formulas with variables"""
+
+    def __init__(self, input: str, words: WordList):
+        self._input = input
+        self._words = tuple(words)
+        self._variables = tuple(
+            dict.fromkeys(
+                w.value_str for w in words if w.type == WordType.VARIABLE
+            )
+        )
+        self._program: Program | None = None
+        self._optimized: Program | None = None
+        self._function: tuple[Program, Function] | None = None
+        self._runs = 0
+        self._canonical: str | None = None
+        self._reads_register = any(
+            w.type in (WordType.REGISTER, WordType.REGISTERLIST)
+            for w in words
+        )
+
+    @property
+    def input(self) -> str:
+        return self._input
+
+    @property
+    def span(self) -> tuple[int, int]:
+        """span of the whole expression in the input"""
+        return self._words[0].offset, self._words[-1].end
+
+    @property
+    def canonical(self) -> str:
+        """typed tokens without whitespace, numbers in lower case (1E3, 0X1F)
+
+        Names stay as they are, variables and functions are case sensitive.
+        """
+        if self._canonical is None:
+            self._canonical = " ".join(
+                f"{w.type.value}:{w.value_str.lower()}"
+                if w.type == WordType.NUM
+                else f"{w.type.value}:{w.value_str}"
+                for w in self._words
+            )
+        return self._canonical
+
+    @property
+    def reads_register(self) -> bool:
+        return self._reads_register
+
+    @property
+    def words(self) -> tuple[Word, ...]:
+        return self._words
+
+    @property
+    def variables(self) -> tuple[str, ...]:
+        """names of the variables, in order of appearance"""
+        return self._variables
+
+    @property
+    def program(self) -> Program:
+        """lowered for the VM, on first use"""
+        if self._program is None:
+            self._program = lower(self._words, self._input)
+        return self._program
+
+    @property
+    def optimized(self) -> Program:
+        """program after `optimize` in the current decimal context
+
+        Optimized again when the context settings change.
+        """
+        l_context = getcontext()
+        l_key = context_key(l_context)
+        l_optimized = self._optimized
+        if l_optimized is None or l_optimized.context != l_key:
+            l_optimized = optimize(self.program, l_context)
+            self._optimized = l_optimized
+        return l_optimized
+
+    @property
+    def function(self) -> Function:
+        """optimized program compiled to a Python function, on first use"""
+        return self._generated()[1]
+
+    def _generated(self) -> tuple[Program, Function]:
+        """(optimized program, its function)
+
+        Kept as one pair: threads in other contexts may replace them.
+        """
+        l_program = self.optimized
+        l_generated = self._function
+        if l_generated is None or l_generated[0] is not l_program:
+            l_generated = (l_program, generate(l_program))
+            self._function = l_generated
+        return l_generated
+
+    def _generates(self) -> bool:
+        """the function is generated, or is worth generating now"""
+        if self._function is not None:
+            return True
+        self._runs += 1
+        return self._runs > self.GENERATE_AFTER
+
+    def __repr__(self) -> str:
+        return f"Expression({self._input!r})"
+
+    def evaluate_num(
+        self,
+        *,
+        logger: ParserLogger | None = None,
+        register: Register | None = None,
+        vars: Variables | None = None,
+        engine: str = "chain",
+    ) -> Number:
+        """evaluate in the current decimal context"""
+
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine: {engine}")
+
+        getcontext().clear_flags()
+
+        parser_logger = logger if logger is not None else ParserLogger()
+        _last.logger = parser_logger
+
+        if engine == "vm" or (
+            engine == "codegen" and not self._generates()
+        ):
+            parser_logger.clear()
+            _result = run(
+                self.optimized,
+                register=register,
+                variables=vars,
+                logger=parser_logger,
+            )
+        elif engine == "codegen":
+            parser_logger.clear()
+            l_program, l_function = self._generated()
+            _result = call(
+                l_function,
+                l_program,
+                register=register,
+                variables=vars,
+                logger=parser_logger,
+            )
+        elif engine == "pratt":
+            parser_logger.clear()
+            _result = self._fused(register, vars, parser_logger)
+        else:
+            _result = self._reduce(register, vars, parser_logger)
+
+        return _rounded(_result)
+
+    def _reduce(
+        self,
+        register: Register | None,
+        vars: Variables | None,
+        logger: ParserLogger,
+        tiny: Decimal = MIN,
+    ) -> Number:
+        """evaluate with Chain"""
+
+        chain = Chain(
+            self._words,
+            input=self._input,
+            register=register,
+            variables=vars,
+            logger=logger,
+            tiny=tiny,
+        )
+        if DEBUG_FLAG:
+            while len(chain) != 0:
+                print(chain.result())
+
+                i = max(range(len(chain)), key=lambda a: chain[a].w)
+                chain.reduce_chain(i)
+        else:
+            chain.reduce_all()
+
+        return chain.result()[0]
+
+    def _fused(
+        self,
+        register: Register | None,
+        vars: Variables | None,
+        logger: ParserLogger,
+    ) -> Number:
+        """evaluate the input in one pass, with Chain if that fails"""
+
+        try:
+            return fused(self._input, register=register, variables=vars)
+        except Exception:
+            getcontext().clear_flags()
+            return self._reduce(register, vars, logger)
+
+    def validate(
+        self,
+        *,
+        logger: ParserLogger | None = None,
+        register: Register | None = None,
+        vars: Variables | None = None,
+    ) -> "Expression":
+        """raise the errors evaluating would, without computing anything
+
+        Functions get the number of arguments of their signature, registers
+        and variables are bound. Errors of values, such as dividing by zero,
+        are only found by evaluating.
+
+        return:
+            self
+        """
+
+        parser_logger = logger if logger is not None else ParserLogger()
+        _last.logger = parser_logger
+        parser_logger.clear()
+
+        validate(
+            self.program,
+            register=register,
+            variables=vars,
+            logger=parser_logger,
+        )
+        return self
+
+    def evaluate(
+        self,
+        *,
+        logger: ParserLogger | None = None,
+        register: Register | None = None,
+        vars: Variables | None = None,
+        engine: str = "chain",
+    ) -> Decimal:
+        """evaluate, same as `calculate` on the source string"""
+
+        with localcontext(_context()):
+            res = self.evaluate_num(
+                logger=logger, register=register, vars=vars, engine=engine
+            )
+        return res.value
+
+
+parse_cache = LRUCache[str, Expression](PARSE_CACHE_SIZE)
+"""compiled expressions by input string"""
+
+
+def compile(input: str, *, logger: ParserLogger | None = None) -> Expression:
+    """parse `input` into an Expression, reusing `parse_cache`"""
+
+    expression = parse_cache.get(input)
+    if expression is None:
+        parser_logger = logger if logger is not None else ParserLogger()
+        _last.logger = parser_logger
+        expression = Expression(input, parse(input, log=parser_logger))
+        parse_cache.put(input, expression)
+
+    return expression
+
+
+result_cache = LRUCache[Hashable, tuple[Decimal, str, bool]](
+    RESULT_CACHE_SIZE
+)
+"""results of calculate_num: (value, format string, Inexact) by
+`_result_key`; off until resized"""
+
+
+def _result_key(
+    expression: Expression, vars: Variables | None
+) -> Hashable | None:
+    """key of `expression` in `result_cache`, None to bypass the cache
+
+    Expressions reading registers are not cached, variables are part of the
+    key, as are the settings of the current decimal context.
+    """
+
+    if expression.reads_register:
+        return None
+
+    l_vars = ()
+    if expression.variables:
+        if vars is None or any(n not in vars for n in expression.variables):
+            return None
+        l_vars = tuple(str(vars[n]) for n in expression.variables)
+
+    l_context = getcontext()
+    return (
+        expression.canonical,
+        l_vars,
+        l_context.prec,
+        l_context.rounding,
+        l_context.Emin,
+        l_context.Emax,
+        l_context.clamp,
+        l_context.traps[decimal.DivisionByZero],
+        l_context.traps[decimal.InvalidOperation],
+        l_context.traps[decimal.Overflow],
+    )
+
+
+def invalidate(input: str | None = None) -> int:
+    """drop results from `result_cache`, all of them or those of `input`
+
+    return:
+        number of results dropped
+    """
+
+    if input is None:
+        return result_cache.prune(lambda _: True)
+
+    try:
+        canonical = compile(input).canonical
+    except ValueError:
+        return 0
+    return result_cache.prune(lambda key: key[0] == canonical)
+
+
 def calculate_num(
-    input: str,
+    input: str | Expression,
     *,
     logger: ParserLogger | None = None,
     register: Register | None = None,
+    vars: Variables | None = None,
+    engine: str = "chain",
+    numeric: str = "decimal",
 ) -> Number | None:
 
-    global parser_logger
-
-    getcontext().clear_flags()
+    if numeric not in NUMERICS:
+        raise ValueError(f"unknown numeric: {numeric}")
 
     parser_logger = logger if logger is not None else ParserLogger()
+    _last.logger = parser_logger
+
+    if numeric == "float" and isinstance(input, str) and floats_pay(input):
+        # Decimal below when the float result may differ
+        getcontext().clear_flags()
+        parser_logger.clear()
+        try:
+            return _rounded(
+                on_floats(input, register=register, variables=vars)
+            )
+        except Exception:
+            pass
 
-    chain = Chain(input, register=register, logger=parser_logger)
-    while len(chain) != 0:
-        if DEBUG_FLAG:
-            print(chain.result())
+    if (
+        numeric == "adaptive"
+        and isinstance(input, str)
+        and adaptive_pays(input)
+    ):
+        # in the context below when no working precision settles it
+        getcontext().clear_flags()
+        parser_logger.clear()
+        try:
+            return _rounded(
+                adaptive(input, register=register, variables=vars)
+            )
+        except Exception:
+            pass
 
-        i = max(range(len(chain)), key=lambda a: chain[a].w)
-        chain.reduce_chain(i)
+    if engine == "pratt" and isinstance(input, str):
+        # not parsed nor cached, Chain gives the error if it fails
+        getcontext().clear_flags()
+        parser_logger.clear()
+        try:
+            return _rounded(fused(input, register=register, variables=vars))
+        except Exception:
+            engine = "chain"
+
+    if isinstance(input, Expression):
+        expression = input
+    else:
+        expression = compile(input, logger=parser_logger)
+
+    key = None
+    if result_cache.maxsize > 0:
+        key = _result_key(expression, vars)
+
+    if key is not None:
+        cached = result_cache.get(key)
+        if cached is not None:
+            value, strvalue, inexact = cached
+            parser_logger.clear()
+            _context = getcontext()
+            _context.clear_flags()
+            _context.flags[decimal.Inexact] = inexact
+            return Number(
+                value, expression.span, strvalue, input=expression.input
+            )
 
-    _result = chain.result()[0]
+    res = expression.evaluate_num(
+        logger=parser_logger, register=register, vars=vars, engine=engine
+    )
 
-    _context = getcontext()
-    if _context.flags[decimal.Inexact]:
-        _result.value = _result.value.quantize(
-            Decimal("1.0000000000"), rounding=ROUND_HALF_UP
-        )
-    else:
-        _result.value = 0 + _result.value.normalize()
+    if key is not None:
+        l_inexact = getcontext().flags[decimal.Inexact]
+        result_cache.put(key, (res.value, res.strvalue, l_inexact))
 
-    return _result
+    return res
 
 
-def check_calc(input: str) -> bool:
-    setcontext(
-        Context(
-            prec=30,
-            rounding=ROUND_05UP,
-            flags=[decimal.Inexact, decimal.Rounded],
-            traps=[decimal.DivisionByZero],
-        )
-    )
+def check_calc(
+    input: str, *, vars: Variables | None = None, evaluate: bool = True
+) -> bool:
+    """True if `input` calculates, see `check` when `evaluate` is False"""
+
+    if not evaluate:
+        return check(input, vars=vars) is not None
+
     try:
-        _ = calculate_num(input)
+        with localcontext(_context()):
+            _ = calculate_num(input, vars=vars)
     except:
         return False
     else:
         return True
 
 
-def calculate(
+def check(
     input: str,
     *,
     logger: ParserLogger | None = None,
     register: Register | None = None,
-) -> Decimal | None:
+    vars: Variables | None = None,
+) -> Expression | None:
+    """parse and validate `input` without evaluating it, see
+    Expression.validate
+
+    return:
+        the Expression, to pass to `calculate`, None if it is not valid
+    """
 
-    setcontext(
-        Context(
-            prec=30,
-            rounding=ROUND_05UP,
-            flags=[decimal.Inexact, decimal.Rounded],
-            traps=[decimal.DivisionByZero],
+    parser_logger = logger if logger is not None else ParserLogger()
+    try:
+        return compile(input, logger=parser_logger).validate(
+            logger=parser_logger, register=register, vars=vars
         )
-    )
+    except ValueError:
+        _last.logger = parser_logger
+        return None
+
+
+def check_many(
+    inputs: Iterable[str],
+    *,
+    register: Register | None = None,
+    vars: Variables | None = None,
+) -> list[Expression | None]:
+    """`check` each of `inputs`
+
+    Made for large sets of formulas: parse_cache is left alone, and repeated
+    inputs are parsed once.
+
+    return:
+        an Expression or None for each input, in order
+    """
+
+    l_done: dict[str, Expression | None] = {}
+    res: list[Expression | None] = []
+    for input in inputs:
+        if input not in l_done:
+            parser_logger = ParserLogger()
+            try:
+                expression = Expression(
+                    input, parse(input, log=parser_logger)
+                )
+                l_done[input] = expression.validate(
+                    logger=parser_logger, register=register, vars=vars
+                )
+            except ValueError:
+                l_done[input] = None
+        res.append(l_done[input])
+
+    return res
 
-    res = calculate_num(input, logger=logger, register=register)
+
+def calculate(
+    input: str | Expression,
+    *,
+    logger: ParserLogger | None = None,
+    register: Register | None = None,
+    vars: Variables | None = None,
+    engine: str = "chain",
+    numeric: str = "decimal",
+    prec: int | None = None,
+    places: int | None = None,
+) -> Decimal | None:
+    """value of `input`
+
+    prec, places:
+        digits of the calculation (PREC) and decimal places of an inexact
+        result (ROUND_PLACE), prec follows places when it is not given.
+        Either one given calculates in the one pass of `pratt`, and `engine`
+        and `numeric` are not used. Numbers are read as 0 from MIN or less
+        at PREC digits, down to 10 ** (1 - prec) at more.
+    """
+
+    if prec is not None or places is not None:
+        l_places = ROUND_PLACE if places is None else places
+        # as many integer digits as the defaults leave
+        l_prec = PREC - ROUND_PLACE + l_places if prec is None else prec
+        if l_places >= l_prec:
+            raise ValueError(f"places {l_places} not below prec {l_prec}")
+        with localcontext(_context(l_prec)):
+            res = _precise(
+                input,
+                l_places,
+                logger=logger,
+                register=register,
+                vars=vars,
+            )
+        return res if res is None else res.value
+
+    with localcontext(_context()):
+        res = calculate_num(
+            input,
+            logger=logger,
+            register=register,
+            vars=vars,
+            engine=engine,
+            numeric=numeric,
+        )
     return res if res is None else res.value
 
 
+def _precise(
+    input: str | Expression,
+    places: int,
+    *,
+    logger: ParserLogger | None = None,
+    register: Register | None = None,
+    vars: Variables | None = None,
+) -> Number:
+    """`calculate` in the current context, in one pass"""
+
+    parser_logger = logger if logger is not None else ParserLogger()
+    _last.logger = parser_logger
+    l_input = input.input if isinstance(input, Expression) else input
+    # MIN is 10 ** (1 - PREC), smaller numbers count at more digits
+    l_tiny = MIN.scaleb(min(0, PREC - getcontext().prec))
+
+    getcontext().clear_flags()
+    parser_logger.clear()
+    try:
+        res = fused(l_input, register=register, variables=vars, tiny=l_tiny)
+    except Exception:
+        # Chain, for the error and its message, and for input nested too
+        # deep for the recursion of the pass
+        getcontext().clear_flags()
+        res = compile(l_input, logger=parser_logger)._reduce(
+            register, vars, parser_logger, l_tiny
+        )
+    return _rounded(res, places)
+
+
 def error_message(raw_input: str):
-    return parser_logger.message(raw_input)
+    """message of the last calculation that failed in this thread, "" if
+    there is none"""
+
+    l_logger = getattr(_last, "logger", None)
+    if l_logger is None:
+        return ""
+    return l_logger.message(raw_input)
 
 
 if __name__ == "__main__":
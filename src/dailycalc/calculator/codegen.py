@@ -0,0 +1,348 @@
+"""Python code generation for compiled expressions
+
+A lowered Program is translated into the `ast` of one straight-line Python
+function, one statement per instruction, in the same order as the VM runs
+them. Operators and functions become the calls OPER_DICT makes: `+`, `-`,
+`*`, `/` and `^` are the Python operators OPER_DICT maps them to, `sqrt`,
+`ln`, `exp` and `log` call the OPER_DICT function without checking the
+argument, and the rest calls it through the checks.
+
+Only node types produced here are compiled, see `check`.
+"""
+
+import ast
+from decimal import Decimal, DivisionByZero, Inexact, getcontext
+from typing import Callable
+
+if not __package__:
+    from define import Number, Register, Variables
+    from parserlogger import ParserLogger
+    from operators import valid_parameters
+    from vm import Program, _arguments, _load, _numbers
+    from vm import LOAD_REG, LOAD_LIST, LOAD_VAR, FAIL, ADD, SUB, MUL, DIV
+    from vm import POW, CALL, CALL_LIST, INEXACT
+else:
+    from .define import Number, Register, Variables
+    from .parserlogger import ParserLogger
+    from .operators import valid_parameters
+    from .vm import Program, _arguments, _load, _numbers
+    from .vm import LOAD_REG, LOAD_LIST, LOAD_VAR, FAIL, ADD, SUB, MUL, DIV
+    from .vm import POW, CALL, CALL_LIST, INEXACT
+
+__all__ = ["generate", "check", "call", "Function"]
+
+
+Function = Callable[
+    [Register | None, Variables | None, ParserLogger], tuple[Decimal, str]
+]
+"""Type alias: generated function (register, variables, logger)"""
+
+
+ONE_NUMBER = {"sqrt", "ln", "exp", "log"}
+"""functions of one number, called without checking it"""
+
+BINARY = {
+    ADD: ast.Add,
+    SUB: ast.Sub,
+    MUL: ast.Mult,
+    DIV: ast.Div,
+    POW: ast.Pow,
+}
+"""instructions of the Python operator OPER_DICT maps them to"""
+
+BUILTINS = {"sum", "max", "min", "abs"}
+"""functions that call the builtin of the same name"""
+
+ALLOWED_NODES = (
+    ast.Module,
+    ast.FunctionDef,
+    ast.arguments,
+    ast.arg,
+    ast.Assign,
+    ast.Return,
+    ast.Expr,
+    ast.Try,
+    ast.ExceptHandler,
+    ast.Call,
+    ast.Starred,
+    ast.Tuple,
+    ast.Name,
+    ast.Constant,
+    ast.BinOp,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.Load,
+    ast.Store,
+)
+"""node types `generate` produces"""
+
+PARAMS = ("register", "variables", "logger")
+
+
+def _name(id: str) -> ast.Name:
+    return ast.Name(id=id, ctx=ast.Load())
+
+
+def _assign(id: str | list[str], value: ast.expr) -> ast.Assign:
+    l_ids = [id] if isinstance(id, str) else id
+    l_targets = [ast.Name(id=i, ctx=ast.Store()) for i in l_ids]
+    target = (
+        l_targets[0]
+        if len(l_targets) == 1
+        else ast.Tuple(elts=l_targets, ctx=ast.Store())
+    )
+    return ast.Assign(targets=[target], value=value)
+
+
+def _call(func: str | ast.expr, *args: ast.expr) -> ast.Call:
+    l_func = _name(func) if isinstance(func, str) else func
+    return ast.Call(func=l_func, args=list(args), keywords=[])
+
+
+def _tuple(*elts: ast.expr) -> ast.Tuple:
+    return ast.Tuple(elts=list(elts), ctx=ast.Load())
+
+
+def _int(value: int) -> ast.Constant:
+    return ast.Constant(value=value)
+
+
+def _zero_division(pc: int, value: ast.expr, target: str) -> ast.Try:
+    """target = value, with the Chain error on DivisionByZero"""
+
+    return ast.Try(
+        body=[_assign(target, value)],
+        handlers=[
+            ast.ExceptHandler(
+                type=_name("DivisionByZero"),
+                name=None,
+                body=[ast.Expr(_call("Z", _int(pc), _name("logger")))],
+            )
+        ],
+        orelse=[],
+        finalbody=[],
+    )
+
+
+def check(tree: ast.AST, names: set[str]):
+    """raise ValueError unless `tree` is made of generated nodes only
+
+    Args:
+        tree:  module to check
+        names: global names the module may read
+    """
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ValueError(f"unexpected node: {type(node).__name__}")
+
+        match node:
+            case ast.Name(id=id) if not (
+                id in names
+                or id in PARAMS
+                or id == "fmt"
+                or (id[:1] == "s" and id[1:].isdigit())
+            ):
+                raise ValueError(f"unexpected name: {id}")
+
+            case ast.Constant(value=value) if type(value) not in {int, str}:
+                raise ValueError(f"unexpected constant: {value!r}")
+
+
+def generate(program: Program) -> Function:
+    """compile `program` into a Python function
+
+    return:
+        function(register, variables, logger) -> (value, format string)
+    """
+
+    code = program.code
+    l_globals: dict[str, object] = {
+        "__builtins__": {},
+        "getcontext": getcontext,
+        "DivisionByZero": DivisionByZero,
+        "sum": sum,
+        "max": max,
+        "min": min,
+        "abs": abs,
+    }
+
+    # helpers, reached only on loads, register lists and errors
+    def L(pc: int, register, variables, logger):
+        return _load(
+            program, pc, register=register, variables=variables, logger=logger
+        )
+
+    def F(pc: int, logger: ParserLogger):
+        _error, l_at, l_to = program.errors[code[pc + 1]]
+        if l_at is not None:
+            logger.add(_error, at=l_at, to=l_to, forced=True)
+        raise ValueError(_error)
+
+    def Z(pc: int, logger: ParserLogger):
+        l_at, l_to = program.debug[pc]
+        _error = "cannot divide by Zero"
+        logger.add(_error, at=l_at, to=l_to, forced=True)
+        raise ValueError(_error)
+
+    def A(pc: int, values: tuple, logger: ParserLogger) -> list:
+        fn = program.funcs[code[pc + 2]]
+        return _arguments(fn, list(values), program.debug[pc], logger)
+
+    def CLF(pc: int, values: tuple, logger: ParserLogger) -> tuple:
+        fn = program.funcs[code[pc + 2]]
+        l_nums = _numbers(list(values), program.debug[pc])
+        l_values = valid_parameters(fn, l_nums, logger=logger)
+        return (
+            fn.func(*l_values),
+            fn.ffunc(*l_values) if fn.ffunc is not None else "",
+        )
+
+    def CL(pc: int, values: tuple, logger: ParserLogger) -> Decimal:
+        return CLF(pc, values, logger)[0]
+
+    def I(flag: int):
+        getcontext().flags[Inexact] = bool(flag)
+
+    l_globals.update(L=L, F=F, Z=Z, A=A, CL=CL, CLF=CLF, I=I)
+
+    def _slot(slot: int) -> ast.Name:
+        if program.slots[slot] is not None:
+            l_globals[f"k{slot}"] = program.slots[slot]
+            return _name(f"k{slot}")
+        return _name(f"s{slot}")
+
+    body: list[ast.stmt] = [
+        _assign("fmt", ast.Constant(value="")),
+    ]
+
+    pc = 0
+    while pc < len(code):
+        op = code[pc]
+
+        if op in (LOAD_REG, LOAD_LIST, LOAD_VAR):
+            body.append(
+                _assign(
+                    f"s{code[pc + 1]}",
+                    _call("L", _int(pc), *[_name(p) for p in PARAMS]),
+                )
+            )
+            pc += 4
+
+        elif op == FAIL:
+            # lowering stops at a FAIL, there is no result after it
+            body.append(ast.Expr(_call("F", _int(pc), _name("logger"))))
+            break
+
+        elif op == INEXACT:
+            body.append(ast.Expr(_call("I", _int(code[pc + 1]))))
+            pc += 2
+
+        elif op in BINARY:
+            l_value = ast.BinOp(
+                left=_slot(code[pc + 2]),
+                op=BINARY[op](),
+                right=_slot(code[pc + 3]),
+            )
+            if op in (DIV, POW):
+                body.append(_zero_division(pc, l_value, f"s{code[pc + 1]}"))
+            else:
+                body.append(_assign(f"s{code[pc + 1]}", l_value))
+            pc += 4
+
+        else:  # CALL, CALL_LIST
+            dst = code[pc + 1]
+            fn = program.funcs[code[pc + 2]]
+            argc = code[pc + 3]
+            l_args = [_slot(k) for k in code[pc + 4 : pc + 4 + argc]]
+            l_fmt = program.fmt and dst == program.result
+
+            if op == CALL_LIST:
+                l_value = _call(
+                    "CLF" if l_fmt else "CL",
+                    _int(pc),
+                    _tuple(*l_args),
+                    _name("logger"),
+                )
+                l_ret = [f"s{dst}", "fmt"] if l_fmt else f"s{dst}"
+                body.append(_assign(l_ret, l_value))
+
+            elif fn.operator in BUILTINS and (
+                not fn.sig or len(fn.sig) == argc
+            ):
+                l_value = (
+                    _call(fn.operator, *l_args)
+                    if fn.sig
+                    else _call(fn.operator, _tuple(*l_args))
+                )
+                body.append(_assign(f"s{dst}", l_value))
+
+            elif fn.operator in ONE_NUMBER and len(fn.sig) == argc:
+                l_globals[f"f{code[pc + 2]}"] = fn.func
+                l_value = _call(f"f{code[pc + 2]}", *l_args)
+                body.append(_assign(f"s{dst}", l_value))
+
+            else:
+                l_index = code[pc + 2]
+                l_globals[f"f{l_index}"] = fn.func
+                l_values = ast.Starred(value=_name(f"s{dst}"), ctx=ast.Load())
+                l_checked = _call(
+                    "A", _int(pc), _tuple(*l_args), _name("logger")
+                )
+                body.append(_assign(f"s{dst}", l_checked))
+                if l_fmt and fn.ffunc is not None:
+                    l_globals[f"ff{l_index}"] = fn.ffunc
+                    body.append(
+                        _assign("fmt", _call(f"ff{l_index}", l_values))
+                    )
+                body.append(
+                    _assign(f"s{dst}", _call(f"f{l_index}", l_values))
+                )
+
+            pc += 4 + argc
+
+    else:
+        l_result = _tuple(_slot(program.result), _name("fmt"))
+        body.append(ast.Return(value=l_result))
+
+    tree = ast.Module(
+        body=[
+            ast.FunctionDef(
+                name="evaluate",
+                args=ast.arguments(
+                    posonlyargs=[],
+                    args=[ast.arg(arg=p) for p in PARAMS],
+                    kwonlyargs=[],
+                    kw_defaults=[],
+                    defaults=[],
+                ),
+                body=body,
+                decorator_list=[],
+                returns=None,
+            )
+        ],
+        type_ignores=[],
+    )
+    ast.fix_missing_locations(tree)
+
+    check(tree, set(l_globals))
+
+    exec(compile(tree, "<dailycalc>", "exec"), l_globals)
+    return l_globals["evaluate"]  # type: ignore
+
+
+def call(
+    function: Function,
+    program: Program,
+    *,
+    register: Register | None = None,
+    variables: Variables | None = None,
+    logger: ParserLogger,
+) -> Number:
+    """run a generated function in the current decimal context"""
+
+    value, fmt = function(register, variables, logger)
+    return Number(value, program.span, fmt, input=program.input)
@@ -2,7 +2,8 @@ import abc
 from enum import Enum
 from dataclasses import dataclass, field
 from decimal import Decimal
-from typing import Callable, Self, Generic, TypeVar
+from typing import Callable, Iterable, Mapping, Sequence, Self
+from typing import Generic, TypeVar
 
 
 __all__ = [
@@ -11,9 +12,13 @@ __all__ = [
     "WordType",
     "Word",
     "WordList",
+    "span",
+    "source",
     "Number",
     "Operator",
+    "OperatorNode",
     "Register",
+    "Variables",
     "Anything"
 ]
 
@@ -34,6 +39,8 @@ class WordType(Enum):
     RIGHTPAREN = "')'"
     REGISTER = "Register"
     REGISTERLIST = "RegisterList"
+    VARIABLE = "Variable"
+    UNKNOWN = "Unknown"
 
     # virtual words
     PLACEHOLDER = "P"
@@ -46,37 +53,130 @@ class WordType(Enum):
         return self == WordType.PLACEHOLDER or self == WordType.TRAILINGCOMMA
 
 
-@dataclass
-class Word:
-    """Class: Word"""
-
-    word_str: str
-    """raw string"""
-    value_str: str
-    """value string"""
-    type: WordType
-    """type"""
-    offset: int = 0
-    """postion in raw input"""
+class Word(object):
+    """Class: Word
+
+    Words from `Word.at` keep a reference to the input, their text is sliced
+    from it when it is first read.
+    """
+
+    __slots__ = ("_text", "_value", "type", "offset", "_length")
+
+    def __init__(
+        self, word_str: str, value_str: str, type: WordType, offset: int = 0
+    ):
+        self._text = word_str
+        """the word, or the whole input it is a slice of"""
+        self._value = value_str if value_str != word_str else None
+        """value string, None if it is the raw string"""
+        self.type = type
+        """type"""
+        self.offset = offset
+        """postion in raw input"""
+        self._length = len(word_str)
+        """length of the raw string, a small int rather than the end"""
+
+    @classmethod
+    def at(
+        cls,
+        input: str,
+        offset: int,
+        end: int,
+        type: WordType,
+        value_str: str | None = None,
+    ) -> Self:
+        """word of `input[offset:end]`, without copying it"""
+
+        word = cls.__new__(cls)
+        word._text = input
+        word._value = value_str
+        word.type = type
+        word.offset = offset
+        word._length = end - offset
+        return word
 
     @classmethod
     def placeholder(cls) -> Self:
-        """get placeholder instance"""
-        return cls("PH", "PH", WordType.PLACEHOLDER)
+        """get placeholder instance, shared"""
+        return _PLACEHOLDER  # type: ignore
 
     @property
     def end(self) -> int:
-        return self.offset + len(self.word_str)
+        return self.offset + self._length
+
+    @property
+    def word_str(self) -> str:
+        """raw string, sliced from the input when it is first read"""
+        l_text = self._text
+        if len(l_text) != self._length:
+            l_start = self.offset
+            l_text = self._text = l_text[l_start : l_start + self._length]
+        return l_text
+
+    @property
+    def value_str(self) -> str:
+        """value string"""
+        if self._value is not None:
+            return self._value
+        l_text = self._text
+        if len(l_text) != self._length:
+            return self.word_str
+        return l_text
 
     @property
     def isvirtual(self) -> bool:
         return self.type.isvirtual
 
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Word):
+            return NotImplemented
+        return (
+            self.type == other.type
+            and self.offset == other.offset
+            and self.word_str == other.word_str
+            and self.value_str == other.value_str
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Word(word_str={self.word_str!r}, value_str={self.value_str!r},"
+            f" type={self.type!r}, offset={self.offset!r})"
+        )
+
+
+_PLACEHOLDER = Word("PH", "PH", WordType.PLACEHOLDER)
+
 
 WordList = list[Word]
 """Type alias: list[Word]"""
 
 
+def span(*parts: tuple[int, int] | Word | None) -> tuple[int, int] | None:
+    """smallest span covering `parts`, None if all are None"""
+
+    l_start = l_end = None
+    for part in parts:
+        if part is None:
+            continue
+        if isinstance(part, Word):
+            part = (part.offset, part.end)
+        if l_start is None or part[0] < l_start:
+            l_start = part[0]
+        if l_end is None or part[1] > l_end:
+            l_end = part[1]
+    return None if l_start is None else (l_start, l_end)  # type: ignore
+
+
+def source(words: Sequence[Word]) -> str:
+    """raw input rebuilt from `words`, spaces where the input had anything
+    else"""
+
+    l_chars = [" "] * (words[-1].end if words else 0)
+    for word in words:
+        l_chars[word.offset : word.end] = word.word_str
+    return "".join(l_chars)
+
+
 class Pt(Enum):
     """Enum: Parameter Type"""
 
@@ -84,36 +184,60 @@ class Pt(Enum):
     Int = 2
 
 
-@dataclass
+@dataclass(frozen=True)
 class Operator:
-    """Class: Operator"""
+    """Class: Operator, shared definition"""
 
     w: int
-    """weight"""
+    """base weight"""
     operator: str
     """operator name"""
     func: Callable | None
     """function"""
-    sig: list[Pt] = field(default_factory=list)
+    sig: tuple[Pt, ...] = ()
     """signature"""
     ffunc: Callable | None = None
     """format_func"""
-    words: list[Word] = field(default_factory=list)
-    """words"""
+    afunc: Callable[[Iterable[Decimal]], Decimal] | None = None
+    """aggregate_func: variadic `func` on an iterable, arguments streamed"""
 
     @property
     def pc(self) -> int:
         return len(self.sig)
 
 
+class OperatorNode:
+    """Class: one occurrence of an Operator in the input"""
+
+    __slots__ = ("op", "w", "words")
+
+    op: Operator
+    """definition"""
+    w: int
+    """effective weight"""
+    words: list[Word]
+    """words"""
+
+    def __init__(self, op: Operator, w: int, words: list[Word]):
+        self.op = op
+        self.w = w
+        self.words = words
+
+    def __repr__(self) -> str:
+        return f"OperatorNode({self.op.operator!r}, w={self.w})"
+
+
 @dataclass
 class Number:
     """Class: Number"""
 
     value: Decimal
-    words: list[Word] = field(default_factory=list)
+    span: tuple[int, int] | None = None
+    """(start, end) of the source in `input`, None for placeholders"""
     strvalue: str = ""
     is_placeholder: bool = False
+    input: str = field(default="", repr=False)
+    """raw input, shared by all numbers of a calculation"""
 
     @classmethod
     def placeholder(cls) -> Self:
@@ -122,15 +246,28 @@ class Number:
         return:
             new expression func
         """
-        return cls(Decimal(0), [], "", True)
+        return cls(Decimal(0), None, "", True)
 
     @property
     def isplaceholder(self) -> bool:
         return self.is_placeholder
-    
+
+    @property
+    def offset(self) -> int:
+        """start of the source in the raw input"""
+        return self.span[0] if self.span is not None else 0
+
+    @property
+    def end(self) -> int:
+        """end of the source in the raw input"""
+        return self.span[1] if self.span is not None else 0
+
     @property
     def source_str(self) -> str:
-        return "".join([w.word_str for w in self.words])
+        if self.span is None:
+            return ""
+        start, end = self.span
+        return "".join(self.input[start:end].split())
 
     def __str__(self) -> str:
         if (
@@ -158,6 +295,10 @@ class Register(abc.ABC, Generic[T]):
         pass
 
 
+Variables = Mapping[str, Decimal | int | float | str]
+"""Type alias: variable bindings, name -> value"""
+
+
 FUNC_SET = {"sum", "max", "min", "abs", "round", "hex", "oct", "log", "ln", "exp", "sqrt"}
 
 
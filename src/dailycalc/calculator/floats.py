@@ -0,0 +1,499 @@
+"""binary float evaluation, checked against the Decimal result
+
+`evaluate` runs the one pass of `pratt` on floats and `math`. A value is
+(float, bound, places):
+
+- bound: how far the float may be from the value Decimal computes, float
+  rounding and the rounding of the Decimal context both counted
+- places: decimal places of the Decimal value, None when it is rounded
+
+calculate_num prints 10 places when the Inexact flag is set, every digit
+otherwise. The float result is kept only when both are settled:
+
+- Inexact: each operation that may round in the decimal context is known
+  to be exact or inexact (from the exact digits of its operands), else the
+  flag is not known
+- inexact result: no rounding boundary of the 10th place within the bound
+- exact result: the bound is small enough to name the decimal digits
+
+Anything else raises, overflow and cancellation included (the bound grows
+past what is asked), and the caller evaluates with Decimal.
+
+Floats only win where Decimal is slow, on ln, log and exp: `pays` tells
+the caller whether to try them at all.
+"""
+
+import math
+import re
+from decimal import ROUND_FLOOR, Decimal, Inexact, getcontext
+
+if not __package__:
+    from define import Operator, Pt, Register, Variables, Number, Word
+    from operators import MIN, OPER_DICT
+    from pratt import FIRST, _Pass
+else:
+    from .define import Operator, Pt, Register, Variables, Number, Word
+    from .operators import MIN, OPER_DICT
+    from .pratt import FIRST, _Pass
+
+__all__ = ["evaluate", "pays"]
+
+
+Value = tuple[float, float, int | None]
+"""(float, bound of its distance to the Decimal value, decimal places)"""
+
+U = 2.0**-53
+"""relative rounding of a float operation"""
+UM = 2.0**-51
+"""relative error of a `math` function, a few units in the last place"""
+REL = 1e-6
+"""largest relative bound taken through pow, first order terms only"""
+
+
+_TINY = 1e-290
+_HUGE = 1e290
+_MIN_BAND = (float(MIN) * (1 - 1e-9), float(MIN) * (1 + 1e-9))
+"""literals in this band are compared to MIN as Decimals"""
+
+_ZERO: Value = (0.0, 0.0, 0)
+
+_PAYS = re.compile(r"\b(?:ln|log|exp)\s*\(")
+
+
+def _shape(text: str) -> tuple[int, int]:
+    """(decimal places, significant digits) of a number string"""
+
+    l_mantissa, _, l_exp = text.lower().partition("e")
+    l_int, _, l_frac = l_mantissa.lstrip("+-").partition(".")
+    l_digits = (l_int + l_frac).strip("0")
+    return max(0, len(l_frac) - int(l_exp or 0)), len(l_digits)
+
+
+def _exact(value: Value) -> int | None:
+    """the Decimal value times 10 ** places, None if not known exactly"""
+
+    f, e, s = value
+    if s is None or s > 22:
+        return None
+    l_scale = 10.0**s
+    x = f * l_scale
+    if abs(x) >= 2.0**50 or e * l_scale >= 0.25:
+        return None
+    return round(x)
+
+
+def _fits(m: int, prec: int) -> bool:
+    """`m` has at most `prec` significant digits"""
+
+    m = abs(m)
+    if m < 10**prec:
+        return True
+    while m % 10 == 0:
+        m //= 10
+    return m < 10**prec
+
+
+def _integer(value: Value) -> int:
+    """integer argument, as valid_parameters takes it"""
+
+    m = _exact(value)
+    if m is None:
+        raise ValueError("not known exactly")
+    q, r = divmod(m, 10 ** value[2])  # type: ignore
+    if r:
+        raise ValueError("this param must be Integer")
+    return q
+
+
+class _FloatPass(_Pass):
+    """one pass on floats"""
+
+    __slots__ = ("_prec", "_delta")
+
+    def __init__(
+        self,
+        input: str,
+        register: Register | None,
+        variables: Variables | None,
+    ):
+        super().__init__(input, register, variables)
+        l_context = getcontext()
+        self._prec = l_context.prec
+        self._delta = 10.0 ** (1 - l_context.prec)
+        """relative rounding of the decimal context"""
+
+    def result(self, value: Value, inexact: bool) -> Decimal:
+        """a Decimal calculate_num rounds to its result"""
+
+        f, e, s = value
+        if not (math.isfinite(f) and math.isfinite(e)):
+            raise ValueError("out of float range")
+
+        if inexact:
+            # quantized to 10 places, the same when no boundary is in reach
+            y = f * 1e10
+            w = e * 1e10 + abs(y) * 4 * U
+            if abs(y) + w >= 2.0**50 or abs(f) + e >= 10.0 ** (
+                self._prec - 11
+            ):
+                raise ValueError("too many digits")
+            if y - w <= 0 <= y + w:
+                raise ValueError("sign not known")
+            if math.floor(abs(y) - w + 0.5) != math.floor(abs(y) + w + 0.5):
+                raise ValueError("rounding not known")
+            return Decimal(f)
+
+        m = _exact(value)
+        if m is None:
+            raise ValueError("not known exactly")
+        if m == 0 and getcontext().rounding == ROUND_FLOOR:
+            raise ValueError("sign of zero not known")
+        return Decimal(m).scaleb(-s)  # type: ignore
+
+    # values
+
+    def _number(self, word: Word) -> Value:  # type: ignore[override]
+        text = word.value_str
+        f = float(text)
+        s, l_digits = _shape(text)
+        if l_digits > self._prec:
+            # rounded to the context by abs(), before any operation
+            self._sets(FIRST)
+
+        a = abs(f)
+        if a <= _MIN_BAND[0] or (
+            a <= _MIN_BAND[1] and abs(Decimal(text)) <= MIN
+        ):
+            return _ZERO
+        if not a < _HUGE:
+            raise ValueError("out of float range")
+        return (f, a * U, s)
+
+    def _decimal(self, value: Decimal) -> Value:
+        """a Decimal read from a register or a variable"""
+
+        if not value.is_finite():
+            raise ValueError("not finite")
+        f = float(value)
+        a = abs(f)
+        if not (_TINY < a < _HUGE or f == 0.0):
+            raise ValueError("out of float range")
+        return (f, a * U, _shape(str(value))[0])
+
+    def _read(self, word: Word) -> Value:  # type: ignore[override]
+        return self._decimal(super()._read(word))
+
+    def _variable(self, word: Word) -> Value:  # type: ignore[override]
+        return self._decimal(super()._variable(word))
+
+    def _list(self, word: Word) -> list[Value]:  # type: ignore[override]
+        return [self._decimal(v) for v in super()._list(word)]
+
+    def _apply(  # type: ignore[override]
+        self, op: Operator, w: int, at: int, left: Value, right: Value
+    ) -> Value:
+        fa, ea, sa = left
+        fb, eb, sb = right
+        name = op.operator
+        exact: bool | None = None
+        s: int | None = None
+        l_prec = self._prec
+
+        if name == "+" or name == "-":
+            f = fa + fb if name == "+" else fa - fb
+            e = ea + eb + abs(f) * U
+            if sa is not None and sb is not None:
+                s = max(sa, sb)
+                ma, mb = _exact(left), _exact(right)
+                if ma is not None and mb is not None:
+                    mb = mb if name == "+" else -mb
+                    m = ma * 10 ** (s - sa) + mb * 10 ** (s - sb)
+                    exact = _fits(m, l_prec)
+                elif (abs(f) + e) * 10.0**s < 0.5 * 10.0**l_prec:
+                    exact = True
+
+        elif name == "*":
+            f = fa * fb
+            e = abs(fa) * eb + abs(fb) * ea + ea * eb + abs(f) * U
+            if sa is not None and sb is not None:
+                s = sa + sb
+                ma, mb = _exact(left), _exact(right)
+                if ma is not None and mb is not None:
+                    exact = _fits(ma * mb, l_prec)
+                elif (abs(f) + e) * 10.0**s < 0.5 * 10.0**l_prec:
+                    exact = True
+
+        elif name == "/":
+            if not abs(fb) > 2 * eb:
+                raise ValueError("divisor not known to be nonzero")
+            f = fa / fb
+            e = 2 * (ea + abs(f) * eb) / abs(fb) + abs(f) * U
+            ma, mb = _exact(left), _exact(right)
+            if ma is not None and mb is not None:
+                exact, s = self._quotient(
+                    ma * 10**sb, mb * 10**sa, l_prec  # type: ignore
+                )
+
+        else:  # "^"
+            n = None
+            mb = _exact(right)
+            if mb is not None and mb % 10**sb == 0:  # type: ignore
+                n = mb // 10**sb  # type: ignore
+
+            if n is not None and n > 0:
+                f = fa**n
+                e = n * (abs(fa) + ea) ** (n - 1) * ea + abs(f) * UM
+                ma = _exact(left)
+                if ma is not None and n <= 64:
+                    s = sa * n  # type: ignore
+                    exact = _fits(ma**n, l_prec)
+            elif n is not None and abs(fa) > 2 * ea:
+                l_rel = -n * ea / abs(fa)
+                if l_rel > REL:
+                    raise ValueError("power not known")
+                f = fa**n
+                e = abs(f) * (2 * l_rel + UM)
+                if n == 0:
+                    exact, s = True, 0
+            elif n is None and fa > 2 * ea:
+                f = fa**fb
+                l_rel = abs(fb) * ea / fa + abs(math.log(fa)) * eb
+                if l_rel > REL:
+                    raise ValueError("power not known")
+                e = abs(f) * (2 * l_rel + UM)
+            else:
+                raise ValueError("power not known")
+
+        if exact is not True:
+            s = None
+            e += (abs(f) + e) * self._delta
+        self._event(exact, w, at)
+
+        l_lost = f == 0.0 and fa != 0.0 and fb != 0.0 and name in "*/^"
+        if l_lost or not (_TINY < abs(f) < _HUGE or f == 0.0):
+            raise ValueError("out of float range")
+        return (f, e, s)
+
+    def _quotient(
+        self, n: int, d: int, prec: int
+    ) -> tuple[bool, int | None]:
+        """(exact, places) of the Decimal quotient n / d"""
+
+        g = math.gcd(n, d)
+        n, d = n // g, d // g
+        x, k2, k5 = abs(d), 0, 0
+        while x % 2 == 0:
+            x, k2 = x // 2, k2 + 1
+        while x % 5 == 0:
+            x, k5 = x // 5, k5 + 1
+        if x != 1:
+            return False, None  # not a finite decimal
+
+        k = max(k2, k5)
+        m = n * (10**k // d)
+        return (True, k) if _fits(m, prec) else (False, None)
+
+    def _function(  # type: ignore[override]
+        self, op: Operator, w: int, at: int, l_args: list[Value]
+    ) -> tuple[Value, str]:
+        name = op.operator
+
+        if op.afunc is not None:  # variadic
+            if name == "sum":
+                return self._total(w, at, l_args), ""
+            return self._pick(name, l_args), ""
+
+        if len(l_args) != len(op.sig):
+            raise ValueError(f"func {name}: parameters")
+
+        if name == "round":
+            return self._round(w, at, l_args[0], _integer(l_args[1])), ""
+
+        if op.sig[0] == Pt.Int:  # hex, oct
+            k = _integer(l_args[0])
+            f = float(k)
+            return (f, abs(f) * U, 0), op.ffunc(k)  # type: ignore
+
+        value = l_args[0]
+        fa, ea, sa = value
+        ma = _exact(value)
+        exact: bool | None = None
+        s: int | None = None
+
+        if name == "abs":
+            f, e = abs(fa), ea
+            if ma is not None:
+                exact, s = _fits(ma, self._prec), sa
+            elif sa is not None and (
+                (abs(f) + e) * 10.0**sa < 0.5 * 10.0**self._prec
+            ):
+                exact, s = True, sa
+
+        elif name == "sqrt":
+            if ma == 0:
+                return _ZERO, ""
+            if not fa - ea > 0:
+                raise ValueError("sqrt not known")
+            f = math.sqrt(fa)
+            e = ea / math.sqrt(fa - ea) + f * UM
+            if ma is not None:
+                l_places = sa + sa % 2  # type: ignore
+                n = ma * 10 ** (l_places - sa)  # type: ignore
+                r = math.isqrt(n)
+                exact = r * r == n and _fits(r, self._prec)
+                s = l_places // 2
+
+        elif name == "ln" or name == "log":
+            if not fa - ea > 0:
+                raise ValueError(f"{name} not known")
+            if ma is not None and str(ma).rstrip("0") == "1":
+                # a power of ten, exact for log, and for ln of 1
+                k = len(str(ma)) - 1 - sa  # type: ignore
+                if name == "log":
+                    return (float(k), 0.0, 0), ""
+                if k == 0:
+                    return _ZERO, ""
+            if name == "ln":
+                f = math.log(fa)
+                e = ea / (fa - ea) + abs(f) * UM
+                if ma is not None or abs(fa - 1) > ea:
+                    exact = False
+            else:
+                f = math.log10(fa)
+                e = ea / ((fa - ea) * math.log(10)) + abs(f) * UM
+                if ma is not None:
+                    exact = False
+
+        elif name == "exp":
+            if ma == 0:
+                exact, s = True, 0
+            elif ma is not None or abs(fa) > ea:
+                exact = False
+            f = math.exp(fa)
+            if f == 0.0:
+                raise ValueError("out of float range")
+            e = f * ea * math.exp(ea) + f * UM
+
+        else:
+            raise ValueError(f"func {name}: not known")
+
+        if exact is not True:
+            s = None
+            e += (abs(f) + e) * self._delta
+        self._event(exact, w, at)
+
+        if not (_TINY < abs(f) < _HUGE or f == 0.0):
+            raise ValueError("out of float range")
+        return (f, e, s), ""
+
+    def _total(self, w: int, at: int, l_args: list[Value]) -> Value:
+        """sum(), added one by one in the decimal context"""
+
+        f = math.fsum(v[0] for v in l_args)
+        l_size = sum(abs(v[0]) + v[1] for v in l_args)
+        e = sum(v[1] for v in l_args) + len(l_args) * l_size * U
+
+        exact: bool | None = None
+        s: int | None = None
+        l_places = [v[2] for v in l_args]
+        if None not in l_places:
+            s = max(l_places)  # type: ignore
+            l_digits = [_exact(v) for v in l_args]
+            if None not in l_digits:
+                l_total = sum(
+                    abs(m) * 10 ** (s - v[2])  # type: ignore
+                    for m, v in zip(l_digits, l_args)
+                )
+                exact = l_total < 10**self._prec or None
+            elif l_size * 10.0**s < 0.5 * 10.0**self._prec:
+                exact = True
+
+        if exact is not True:
+            s = None
+            e += len(l_args) * l_size * self._delta
+        self._event(exact, w, at)
+        return (f, e, s)
+
+    def _pick(self, name: str, l_args: list[Value]) -> Value:
+        """max() or min(), the pick must not depend on the bounds"""
+
+        if name == "max":
+            res = max(l_args, key=lambda v: v[0])
+        else:
+            res = min(l_args, key=lambda v: v[0])
+
+        m = _exact(res)
+        for v in l_args:
+            if v is res or abs(v[0] - res[0]) > v[1] + res[1]:
+                continue
+            # too close to tell apart, unless they are the same number
+            mv = _exact(v)
+            if m is None or mv is None:
+                raise ValueError(f"{name} not known")
+            s = max(v[2], res[2])  # type: ignore
+            if mv * 10 ** (s - v[2]) != m * 10 ** (s - res[2]):  # type: ignore
+                raise ValueError(f"{name} not known")
+        return res
+
+    def _round(self, w: int, at: int, value: Value, n: int) -> Value:
+        """round(value, n), half up, clears Inexact"""
+
+        fa, ea, sa = value
+        if not -20 <= n <= 20 or (abs(fa) + ea) * 10.0**n >= 0.1 * (
+            10.0**self._prec
+        ):
+            raise ValueError("round not known")
+
+        ma = _exact(value)
+        if ma is not None:
+            if n >= sa:  # type: ignore
+                m = ma * 10 ** (n - sa)  # type: ignore
+            else:
+                d = 10 ** (sa - n)  # type: ignore
+                q, r = divmod(abs(ma), d)
+                if 2 * r >= d:
+                    q += 1
+                m = q if ma >= 0 else -q
+        else:
+            y = fa * 10.0**n
+            l_reach = ea * 10.0**n + abs(y) * 4 * U
+            if abs(y) + l_reach >= 2.0**50 or y - l_reach <= 0 <= y + l_reach:
+                raise ValueError("round not known")
+            q = math.floor(abs(y) - l_reach + 0.5)
+            if q != math.floor(abs(y) + l_reach + 0.5):
+                raise ValueError("round not known")
+            m = q if y > 0 else -q
+
+        if n < 0:
+            m, n = m * 10**-n, 0
+        self._clears(self._place(w, at))
+
+        f = m / 10.0**n
+        return (f, abs(f) * 2 * U, n)
+
+
+def pays(input: str) -> bool:
+    """`input` calls ln, log or exp, where floats are faster than Decimal"""
+
+    return _PAYS.search(input) is not None
+
+
+def evaluate(
+    input: str,
+    *,
+    register: Register | None = None,
+    variables: Variables | None = None,
+) -> Number:
+    """evaluate `input` on floats, in the current decimal context
+
+    The value is the one calculate_num rounds to the same result as with
+    Decimal, and the Inexact flag is set the same. Raises when that is not
+    certain, or on any error.
+    """
+
+    p = _FloatPass(input, register, variables)
+    value, fmt, l_span = p.run()
+    l_inexact = p.inexact()
+    res = Number(p.result(value, l_inexact), l_span, fmt, input=input)
+    p._flags[Inexact] = l_inexact
+    return res
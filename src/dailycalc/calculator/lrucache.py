@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, NamedTuple, TypeVar
+
+__all__ = ["LRUCache", "CacheInfo"]
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class CacheInfo(NamedTuple):
+    """cache statistics, same fields as functools.lru_cache"""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache(Generic[K, V]):
+    """bounded least-recently-used cache
+
+    maxsize 0 disables the cache: nothing is stored and every lookup misses.
+    Safe to share between threads.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
+        self._maxsize = 0
+        self.hits = 0
+        self.misses = 0
+        self.resize(maxsize)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    def get(self, key: K) -> V | None:
+        """value of `key` or None, counts a hit or a miss"""
+
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V):
+        """store `value`, evicting the least recently used entries"""
+
+        with self._lock:
+            if self._maxsize <= 0:
+                return
+
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        """remove `key`, returns its value or None"""
+
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def prune(self, match: Callable[[K], bool]) -> int:
+        """remove the keys `match` accepts, returns how many"""
+
+        with self._lock:
+            l_keys = [key for key in self._data if match(key)]
+            for key in l_keys:
+                del self._data[key]
+            return len(l_keys)
+
+    def resize(self, maxsize: int):
+        """change the size bound, evicting entries that no longer fit"""
+
+        if maxsize < 0:
+            raise ValueError(f"maxsize must be >= 0, got {maxsize}")
+
+        with self._lock:
+            self._maxsize = maxsize
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """drop all entries and reset statistics"""
+
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, self._maxsize, len(self._data)
+            )
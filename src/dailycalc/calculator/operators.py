@@ -0,0 +1,275 @@
+import operator
+import decimal
+from decimal import ROUND_HALF_UP, Context, Decimal, getcontext, localcontext
+from typing import Callable, Iterator, Sequence
+
+if not __package__:
+    from define import FUNC_SET, Operator, OperatorNode, Number, Pt
+    from parserlogger import ParserLogger
+    from lrucache import LRUCache
+else:
+    from .define import FUNC_SET, Operator, OperatorNode, Number, Pt
+    from .parserlogger import ParserLogger
+    from .lrucache import LRUCache
+
+__all__ = [
+    "MIN",
+    "OPER_DICT",
+    "function_cache",
+    "ABYSS",
+    "ARG_SET",
+    "valid_parameters",
+    "reduction_order",
+]
+
+
+MIN = Decimal("1e-29")
+
+
+def _round(n1: Decimal, n2: Decimal):
+    with localcontext(rounding=ROUND_HALF_UP):
+        _res = round(n1, n2)  # type: ignore
+    getcontext().flags[decimal.Inexact] = False
+    return _res
+
+
+FUNCTION_CACHE_SIZE: int = 0
+"""default size of `function_cache`, 0 is off"""
+
+function_cache = LRUCache[tuple, tuple[Decimal, tuple]](FUNCTION_CACHE_SIZE)
+"""results of sqrt, ln, exp and log with the signals they raised, keyed by
+function, argument and the context settings results depend on"""
+
+
+_SIGNALS = tuple(Context().flags)
+"""all decimal signals"""
+
+
+def _memoized(
+    name: str, method: Callable[[Context, Decimal], Decimal]
+) -> Callable[[Decimal], Decimal]:
+    """`method` of the current context, through `function_cache` when it is
+    on: a hit raises the same signals as the call, Inexact included"""
+
+    def func(x: Decimal) -> Decimal:
+        _context = getcontext()
+        if function_cache.maxsize == 0:
+            return method(_context, x)
+
+        # str: 2 and 2.0, 0 and -0 are equal Decimals, not equal arguments
+        key = (
+            name,
+            str(x),
+            _context.prec,
+            _context.rounding,
+            _context.Emax,
+            _context.Emin,
+            _context.clamp,
+        )
+        cached = function_cache.get(key)
+        if cached is not None:
+            value, l_signals = cached
+            l_traps, l_flags = _context.traps, _context.flags
+            for s in l_signals:
+                if l_traps[s]:
+                    break  # the call raises
+                l_flags[s] = True
+            else:
+                return value
+
+        l_flags = _context.flags
+        l_saved = l_flags.copy()
+        _context.clear_flags()
+        try:
+            value = method(_context, x)
+            l_signals = tuple([s for s in _SIGNALS if l_flags[s]])
+        finally:
+            for s, on in l_saved.items():
+                if on:
+                    l_flags[s] = True
+        function_cache.put(key, (value, l_signals))
+        return value
+
+    return func
+
+
+OPER_DICT = {
+    "+": Operator(10, "+", operator.add),
+    "-": Operator(10, "-", operator.sub),
+    "*": Operator(20, "*", operator.mul),
+    "/": Operator(20, "/", operator.truediv),
+    "^": Operator(30, "^", operator.pow),
+    "(": Operator(100, "(", lambda _, b: b),
+    ")": Operator(-100, ")", lambda a, _: a),
+    ",": Operator(0, ",", None),
+    # func's weight is same with '('
+    "sum": Operator(
+        w=100, operator="sum", func=lambda *args: sum(args), afunc=sum
+    ),
+    "max": Operator(
+        w=100, operator="max", func=lambda *args: max(args), afunc=max
+    ),
+    "min": Operator(
+        w=100, operator="min", func=lambda *args: min(args), afunc=min
+    ),
+    "abs": Operator(w=100, operator="abs", func=abs, sig=(Pt.Num,)),
+    "log": Operator(
+        w=100,
+        operator="log",
+        func=_memoized("log", Context.log10),
+        sig=(Pt.Num,),
+    ),
+    "ln": Operator(
+        w=100, operator="ln", func=_memoized("ln", Context.ln), sig=(Pt.Num,)
+    ),
+    "exp": Operator(
+        w=100,
+        operator="exp",
+        func=_memoized("exp", Context.exp),
+        sig=(Pt.Num,),
+    ),
+    "sqrt": Operator(
+        w=100,
+        operator="sqrt",
+        func=_memoized("sqrt", Context.sqrt),
+        sig=(Pt.Num,),
+    ),
+    "round": Operator(
+        w=100, operator="round", func=_round, sig=(Pt.Num, Pt.Int)
+    ),
+    "hex": Operator(
+        w=100,
+        operator="hex",
+        func=lambda a, *_: Decimal(a),
+        sig=(Pt.Int,),
+        ffunc=hex,
+    ),
+    "oct": Operator(
+        w=100,
+        operator="oct",
+        func=lambda a, *_: Decimal(a),
+        sig=(Pt.Int,),
+        ffunc=oct,
+    ),
+}
+
+ABYSS = OperatorNode(Operator(-10000, "", None), -10000, [])
+
+ARG_SET = {",", "(", ")"}
+"""operators collected as arguments by the function before them"""
+
+
+def valid_parameters(
+    op: Operator, nums: list[Number], *, logger: ParserLogger
+) -> list[Decimal | int]:
+    """get valid parameters:
+    if parameters not match signature raise ValueError
+    """
+
+    # check count of parameters
+    l_len = len(op.sig)
+
+    if l_len == 0:
+        return [n.value for n in nums]
+
+    if l_len > 0 and len(nums) != l_len:
+        _error = f"func {op.operator}: expecting { l_len } parameters got { len(nums) }"
+
+        if l_len > len(nums):
+            l_at = nums[-1].end
+            l_to = 0
+        else:
+            l_at = nums[l_len].offset
+            l_to = nums[-1].end
+
+        logger.add(_error, at=l_at, to=l_to, forced=True)
+        raise ValueError(_error)
+
+    # check and convert parameters type
+    res: list[Decimal | int] = []
+
+    for l_type, l_num in zip(op.sig, nums):
+        if l_type == Pt.Num:
+            res.append(l_num.value)
+
+        if l_type == Pt.Int:
+            l_int_value = round(l_num.value)
+            if l_num.value != l_int_value:
+                _error = f"this param must be Integer, got {l_num.value}"
+                logger.add(
+                    _error,
+                    at=l_num.offset,
+                    to=l_num.end,
+                    forced=True,
+                )
+                raise ValueError(_error)
+            res.append(int(l_int_value))
+
+    return res
+
+
+def reduction_order(
+    nodes: Sequence[OperatorNode],
+) -> Iterator[tuple[int, int, list[int]]]:
+    """order in which a chain of operators is reduced
+
+    Operator i sits between operand slots i and i + 1. Operators are visited
+    once, by weight from high to low and from left to right within a weight,
+    which is the order a max-weight scan picks them in. Reducing operator i
+    drops the operand slot on its right and stores the result in slot `at`,
+    the one right after the previous operator still in the chain.
+
+    yield:
+        (i, at, args): operator i, result slot, operand slots on the right
+        of i (for a function, followed by the slots of the ',', '(' and ')'
+        it collects).
+    """
+
+    count = len(nodes)
+
+    l_prev = list(range(-1, count - 1))
+    l_next = list(range(1, count + 1))
+    l_alive = [True] * count
+
+    def _unlink(i: int) -> int:
+        l_alive[i] = False
+        p, q = l_prev[i], l_next[i]
+        if p >= 0:
+            l_next[p] = q
+        if q < count:
+            l_prev[q] = p
+        return q
+
+    buckets: dict[int, list[int]] = {}
+    for i, node in enumerate(nodes):
+        buckets.setdefault(node.w, []).append(i)
+
+    for w in sorted(buckets, reverse=True):
+        for i in buckets[w]:
+            if not l_alive[i]:
+                continue
+
+            node = nodes[i]
+            l_at = l_prev[i] + 1
+
+            if node.op.operator == ",":
+                raise ValueError("not valid")
+
+            elif node.op.operator in FUNC_SET:  # functions
+                l_args = [i + 1]
+
+                # get parameters
+                j = _unlink(i)
+                while (
+                    j < count
+                    and nodes[j].op.operator in ARG_SET
+                    and nodes[j].w == w
+                ):
+                    l_args.append(j + 1)
+                    j = _unlink(j)
+
+                yield i, l_at, l_args
+
+            else:  # binary operators
+                _unlink(i)
+                yield i, l_at, [i + 1]
@@ -0,0 +1,279 @@
+"""constant folding and common subexpression elimination for Programs
+
+`optimize` rewrites a lowered Program for one decimal context:
+
+- instructions whose operands are all literals are run at compile time and
+  their results become constant slots
+- a pure instruction that repeats an earlier one (same operation on the same
+  operands) is dropped and its slot reads the earlier result
+
+The result of an evaluation is quantized when the Inexact flag is set at the
+end, and round() clears that flag, so both rewrites keep the flag effects:
+
+- a folded instruction that sets or clears Inexact leaves an INEXACT
+  instruction at its place, unless the flag is known to be in that state
+- round() is never deduplicated, and running it (or clearing the flag) ends
+  the reuse of the results computed before it, which may have set the flag
+
+Instructions that raise at compile time are kept, so errors and their
+positions are the same, and nothing after the first of them is folded: the
+run stops there. Results of folding depend on the context, the
+Program records it with `context_key`.
+"""
+
+import decimal
+from decimal import Context, Decimal, localcontext
+from typing import Callable, Hashable
+
+if not __package__:
+    from parserlogger import ParserLogger
+    from operators import OPER_DICT
+    from vm import Program, _arguments
+    from vm import LOAD_REG, LOAD_LIST, LOAD_VAR, FAIL, ADD, SUB, MUL, DIV
+    from vm import POW, CALL, CALL_LIST, INEXACT
+else:
+    from .parserlogger import ParserLogger
+    from .operators import OPER_DICT
+    from .vm import Program, _arguments
+    from .vm import LOAD_REG, LOAD_LIST, LOAD_VAR, FAIL, ADD, SUB, MUL, DIV
+    from .vm import POW, CALL, CALL_LIST, INEXACT
+
+__all__ = ["optimize", "context_key"]
+
+
+CLEARS_INEXACT = {"round"}
+"""functions that clear the Inexact flag"""
+
+_QUIET = (decimal.Inexact, decimal.Rounded)
+"""signals folding may raise"""
+
+_FUNCS = {
+    ADD: OPER_DICT["+"].func,
+    SUB: OPER_DICT["-"].func,
+    MUL: OPER_DICT["*"].func,
+    DIV: OPER_DICT["/"].func,
+    POW: OPER_DICT["^"].func,
+}
+
+
+def context_key(context: Context) -> tuple:
+    """settings of `context` that folded results depend on
+
+    Traps other than Inexact and Rounded are left out: folding stops at any
+    other signal, see `_fold`.
+    """
+
+    return (
+        context.prec,
+        context.rounding,
+        context.Emin,
+        context.Emax,
+        context.clamp,
+        context.traps[decimal.Inexact],
+        context.traps[decimal.Rounded],
+    )
+
+
+def _fold(
+    fn: Callable[[], Decimal], context: Context, clears: bool
+) -> tuple[Decimal, bool | None] | None:
+    """(value, Inexact after it or None if untouched)
+
+    None if `fn` signals anything but Inexact and Rounded, it is left for
+    the run time. Raises what `fn` raises. `fn` runs again only when it
+    `clears` Inexact, to see whether it does.
+    """
+
+    with localcontext(context) as l_context:
+        l_context.clear_flags()
+        value = fn()
+        if any(
+            on and s not in _QUIET for s, on in l_context.flags.items()
+        ):
+            return None
+        l_sets = l_context.flags[decimal.Inexact]
+
+        l_clears = False
+        if clears:
+            l_context.flags[decimal.Inexact] = True
+            fn()
+            l_clears = not l_context.flags[decimal.Inexact]
+
+    if l_clears:
+        return value, False
+    return value, True if l_sets else None
+
+
+def optimize(program: Program, context: Context) -> Program:
+    """fold constants and drop repeated subexpressions of `program`
+
+    Folding runs in a copy of `context`. The flags are assumed clear when the
+    Program starts, as evaluate_num does.
+
+    return:
+        new Program, `removed` counts the instructions taken out
+    """
+
+    code = program.code
+    res = Program(program.span, program.input)
+    res.context = context_key(context)
+
+    consts: dict[str, int] = {}
+    values: dict[int, Decimal] = {}
+    """constant value of old slots"""
+    remap: dict[int, int] = {}
+    """new slot of old runtime slots"""
+    seen: dict[Hashable, int] = {}
+    """new slot by instruction key, for reuse"""
+
+    state: bool | None = False
+    """Inexact at this point of the new program, None if unknown"""
+    want: bool | None = None
+    """Inexact left by folded instructions, not emitted yet"""
+    failing = False
+    """an instruction raised when folded, nothing after it is folded"""
+
+    def _const(value: Decimal) -> int:
+        key = str(value)
+        if key not in consts:
+            consts[key] = res._slot(value)
+        return consts[key]
+
+    def _operand(slot: int) -> int:
+        if slot in values:
+            return _const(values[slot])
+        return remap[slot]
+
+    def _flush():
+        nonlocal state, want
+        if want is not None and want != state:
+            res._emit(INEXACT, int(want))
+            state = want
+            if not want:
+                _forget()
+        want = None
+
+    def _forget():
+        """results computed so far may have set Inexact, stop reusing them"""
+        for key in list(seen):
+            if key[0] not in (LOAD_REG, LOAD_LIST, LOAD_VAR):
+                del seen[key]
+
+    for i, value in enumerate(program.slots):
+        if value is not None:
+            values[i] = value
+
+    pc = 0
+    while pc < len(code):
+        op = code[pc]
+
+        if op in (LOAD_REG, LOAD_LIST, LOAD_VAR):
+            dst, name = code[pc + 1], program.names[code[pc + 2]]
+            key = (op, name)
+            if key in seen:
+                remap[dst] = seen[key]
+                res.removed += 1
+            else:
+                slot = res._slot()
+                l_pc = res._emit(op, slot, res._name(name), 0)
+                res.debug[l_pc] = program.debug[pc]
+                remap[dst] = seen[key] = slot
+            pc += 4
+            continue
+
+        if op == FAIL:
+            _flush()
+            res.errors.append(program.errors[code[pc + 1]])
+            res._emit(FAIL, len(res.errors) - 1)
+            return res
+
+        if op == INEXACT:
+            want = bool(code[pc + 1])
+            pc += 2
+            continue
+
+        dst = code[pc + 1]
+        if op in (CALL, CALL_LIST):
+            fn = program.funcs[code[pc + 2]]
+            argc = code[pc + 3]
+            l_args = list(code[pc + 4 : pc + 4 + argc])
+            size = 4 + argc
+        else:
+            fn = None
+            l_args = [code[pc + 2], code[pc + 3]]
+            size = 4
+
+        l_folded = None
+        if (
+            not failing
+            and op != CALL_LIST
+            and all(a in values for a in l_args)
+            and not (fn is not None and fn.ffunc and dst == program.result)
+        ):
+            l_values = [values[a] for a in l_args]
+            l_clears = fn is not None and fn.operator in CLEARS_INEXACT
+            if fn is None:
+                l_func = _FUNCS[op]
+                l_fn: Callable[[], Decimal] = lambda: l_func(*l_values)
+            else:
+                l_debug = program.debug[pc]
+
+                def _call(fn=fn, l_values=l_values, l_debug=l_debug):
+                    l_params = l_values
+                    if fn.sig:
+                        l_params = _arguments(
+                            fn, l_values, l_debug, ParserLogger()
+                        )
+                    return fn.func(*l_params)
+
+                l_fn = _call
+
+            try:
+                l_folded = _fold(l_fn, context, l_clears)
+            except (ArithmeticError, ValueError, TypeError):
+                # the run stops here, what follows is never computed
+                failing = True
+
+        if l_folded is not None:
+            values[dst], l_effect = l_folded
+            if l_effect is not None:
+                want = l_effect
+            if l_effect is False:
+                _forget()
+            res.removed += 1
+            pc += size
+            continue
+
+        l_operands = [_operand(a) for a in l_args]
+        l_clears = fn is not None and fn.operator in CLEARS_INEXACT
+        key = (op, fn.operator if fn else None, *l_operands)
+        if not l_clears and key in seen:
+            remap[dst] = seen[key]
+            res.removed += 1
+            pc += size
+            continue
+
+        _flush()
+        slot = res._slot()
+        if fn is None:
+            l_pc = res._emit(op, slot, *l_operands)
+        else:
+            res.funcs.append(fn)
+            l_pc = res._emit(op, slot, len(res.funcs) - 1, argc, *l_operands)
+        res.debug[l_pc] = program.debug[pc]
+        remap[dst] = slot
+
+        if l_clears:
+            state = False
+            _forget()
+        else:
+            seen[key] = slot
+            if state is False:
+                state = None
+        pc += size
+
+    _flush()
+
+    res.result = _operand(program.result)
+    res.fmt = program.fmt
+    return res
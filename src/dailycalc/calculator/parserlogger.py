@@ -37,16 +37,33 @@ class ParserLogger(dict[int, tuple[str, WordType, int]]):
         i = max(list(self.keys()))
         return i, self[i][0], self[i][2]
 
-    def message(self, s: str) -> str:
+    def message(self, s: str, at: int | None = None) -> str:
+        """message of the entry at `at`, the last one by default"""
+
+        l_pos = self.get()[0] if at is None else at
+        l_m1 = "  Input: " + s
+        return "\n".join([l_m1, *self._lines(s, l_pos)])
+
+    def messages(self, s: str) -> str:
+        """message of all entries, in input order"""
+
+        l_lines = ["  Input: " + s]
+        for at in sorted(self):
+            l_lines += self._lines(s, at)
+        return "\n".join(l_lines)
+
+    def _lines(self, s: str, at: int) -> list[str]:
+        """marker and error lines of the entry at `at`"""
+
         l_buffer = list("-" * (len(s) + 4))
-        l_pos, l_log, l_to = self.get()
+        l_log, _, l_to = self[at]
+        l_pos = at
 
         if l_to > l_pos:
             l_buffer = l_buffer[:l_pos] + ["^"] * (l_to - l_pos) + l_buffer[l_to:]
         else:
             l_buffer[l_pos] = "^"
 
-        l_m1 = "  Input: " + s
         l_m2 = "         " + "".join(l_buffer)
         l_m3 = "  Error: " + l_log
-        return "\n".join([l_m1, l_m2, l_m3])
+        return [l_m2, l_m3]
@@ -0,0 +1,329 @@
+"""fused parse and evaluate in one pass
+
+`evaluate` reads the words of the input one at a time and computes while it
+parses, by precedence climbing on the weights of OPER_DICT: no word list, no
+Chain, no Program. It takes the grammar of `parse`.
+
+Operations run in the order of the input, Chain runs them by weight. Values
+do not depend on the order, the Inexact flag does (round() clears it). Each
+operation that sets Inexact, and each round(), is placed where Chain would
+run it, and the flag is left as the last of them left it.
+
+Errors are not reported here: anything that goes wrong raises, the caller
+evaluates the input again with Chain for the error and its position.
+"""
+
+import decimal
+from decimal import Decimal, getcontext
+
+if not __package__:
+    from define import Number, Operator, Pt, Register, Variables
+    from define import Word, WordType
+    from operators import MIN, OPER_DICT
+    from optimizer import CLEARS_INEXACT
+    from words import scan
+else:
+    from .define import Number, Operator, Pt, Register, Variables
+    from .define import Word, WordType
+    from .operators import MIN, OPER_DICT
+    from .optimizer import CLEARS_INEXACT
+    from .words import scan
+
+__all__ = ["evaluate"]
+
+
+PAREN = OPER_DICT["("].w
+"""weight added inside parentheses, as Chain does"""
+
+FIRST = float("-inf")
+"""place of what Chain does before reducing: reading the numbers"""
+
+_ZERO = Decimal(0)
+
+
+class _Pass(object):
+    """state of one evaluation: the current word and the Inexact events"""
+
+    __slots__ = (
+        "_input",
+        "_words",
+        "word",
+        "_register",
+        "_variables",
+        "_flags",
+        "_width",
+        "_set",
+        "_clear",
+        "_maybe",
+        "_tiny",
+    )
+
+    def __init__(
+        self,
+        input: str,
+        register: Register | None,
+        variables: Variables | None,
+        tiny: Decimal = MIN,
+    ):
+        self._input = input
+        self._words = scan(input)
+        self.word: Word | None = next(self._words, None)
+        self._register = register
+        self._variables = variables
+        self._flags = getcontext().flags
+        self._width = len(input) + 1
+        self._set: float | None = None
+        """place of the last operation that set Inexact"""
+        self._clear: int | None = None
+        """place of the last round()"""
+        self._maybe: float | None = None
+        """place of the last operation that may have set Inexact"""
+        self._tiny = tiny
+        """numbers of this size or less are read as 0"""
+
+    def inexact(self) -> bool:
+        """Inexact after the last operation, in Chain's order, raise if it
+        is not known"""
+
+        if self._set is not None and (
+            self._clear is None or self._set > self._clear
+        ):
+            return True
+        if self._maybe is not None and (
+            self._clear is None or self._maybe > self._clear
+        ):
+            raise ValueError("Inexact not known")
+        return False
+
+    def _place(self, w: int, at: int) -> int:
+        """place of an operation in Chain's order: by weight from high to
+        low, then by offset"""
+        return at - w * self._width
+
+    def _sets(self, place: float):
+        """the operation at `place` set Inexact, reset it for the next one"""
+        if self._set is None or place > self._set:
+            self._set = place
+        self._flags[decimal.Inexact] = False
+
+    def _clears(self, place: float):
+        """the operation at `place` cleared Inexact"""
+        if self._clear is None or place > self._clear:
+            self._clear = place
+
+    def _event(self, exact: bool | None, w: int, at: int):
+        """the operation of weight `w` at `at` is exact, inexact or either,
+        for values computed otherwise than in the context"""
+
+        if exact is None:
+            l_place = self._place(w, at)
+            if self._maybe is None or l_place > self._maybe:
+                self._maybe = l_place
+        elif not exact:
+            self._sets(self._place(w, at))
+
+    def _next(self) -> Word:
+        """the current word, and move to the next one"""
+        word = self.word
+        if word is None:
+            raise ValueError("not valid")
+        self.word = next(self._words, None)
+        return word
+
+    def _expect(self, type: WordType) -> Word:
+        if self.word is None or self.word.type != type:
+            raise ValueError("not valid")
+        return self._next()
+
+    def expr(self, base: int, least: int = 0) -> tuple[Decimal, str]:
+        """expr = term [ operator term ]*, operators of weight `least` and
+        up
+
+        return:
+            (value, format string of a function call, "" otherwise)
+        """
+
+        value, fmt = self.term(base)
+        while (word := self.word) is not None and word.type == (
+            WordType.OPERATOR
+        ):
+            op = OPER_DICT[word.value_str]
+            if op.w < least:
+                break
+
+            self.word = next(self._words, None)
+            right, _ = self.expr(base, op.w + 1)
+            value = self._apply(op, op.w + base, word.offset, value, right)
+            fmt = ""
+
+        return value, fmt
+
+    def term(self, base: int) -> tuple[Decimal, str]:
+        word = self._next()
+
+        match word.type:
+            case WordType.NUM:
+                value = self._number(word)
+            case WordType.REGISTER:
+                value = self._read(word)
+            case WordType.VARIABLE:
+                value = self._variable(word)
+            case WordType.LEFTPAREN:
+                value, _ = self.expr(base + PAREN)
+                self._expect(WordType.RIGHTPAREN)
+            case WordType.FUNCNAME:
+                return self._call(word, base)
+            case _:
+                raise ValueError("not valid")
+
+        return value, ""
+
+    def run(self) -> tuple[Decimal, str, tuple[int, int]]:
+        """(value, format string, span) of the whole input"""
+
+        if self.word is None:
+            raise ValueError("not valid")
+        l_start = self.word.offset
+
+        value, fmt = self.expr(0)
+        if self.word is not None:
+            raise ValueError("not valid")
+
+        # the words run to the end of the input but its trailing spaces
+        return value, fmt, (l_start, len(self._input.rstrip()))
+
+    # values, overridden for other numbers than Decimal
+
+    def _number(self, word: Word) -> Decimal:
+        value = Decimal(word.value_str)
+        if abs(value) <= self._tiny:
+            value = _ZERO
+        if self._flags[decimal.Inexact]:
+            # rounded to the context by abs(), before any operation
+            self._sets(FIRST)
+        return value
+
+    def _read(self, word: Word) -> Decimal:
+        """value of register `word`"""
+
+        if self._register is None:
+            raise ValueError("unknown register")
+        key = word.value_str.removeprefix("@")
+        return self._register.read(key).value.value
+
+    def _variable(self, word: Word) -> Decimal:
+        """value bound to variable `word`, converted as by Chain"""
+
+        value = self._variables[word.value_str]  # type: ignore
+        num = Decimal(str(value)) if isinstance(value, float) else value
+        num = Decimal(num)
+        if not num.is_finite():
+            raise ValueError(f"invalid value of {word.value_str}")
+        return num
+
+    def _list(self, word: Word) -> list[Decimal]:
+        """values of register list `word`"""
+
+        if self._register is None:
+            raise ValueError("unknown register")
+        l_from, l_to = word.value_str.removeprefix("@").split("_")[:2]
+        return [
+            r.value.value for r in self._register.read_list((l_from, l_to))
+        ]
+
+    def _call(self, name: Word, base: int) -> tuple[Decimal, str]:
+        """fn( argument [ , argument ]* [,] ), `name` already read"""
+
+        op = OPER_DICT[name.value_str]
+        self._expect(WordType.LEFTPAREN)
+
+        l_args: list[Decimal] = []
+        while True:
+            word = self.word
+            if word is not None and word.type == WordType.REGISTERLIST:
+                self._next()
+                l_args.extend(self._list(word))
+            else:
+                l_args.append(self.expr(base + PAREN)[0])
+
+            l_sep = self._next().type
+            if l_sep == WordType.RIGHTPAREN:
+                break
+            if l_sep != WordType.COMMA:
+                raise ValueError("not valid")
+            if self.word is not None and self.word.type == (
+                WordType.RIGHTPAREN
+            ):
+                self._next()  # trailing comma
+                break
+
+        return self._function(op, op.w + base, name.offset, l_args)
+
+    def _apply(
+        self, op: Operator, w: int, at: int, left: Decimal, right: Decimal
+    ) -> Decimal:
+        """binary operator `op` of weight `w` at offset `at`"""
+
+        value = op.func(left, right)  # type: ignore
+        if self._flags[decimal.Inexact]:
+            self._sets(self._place(w, at))
+        return value
+
+    def _function(
+        self, op: Operator, w: int, at: int, l_args: list[Decimal]
+    ) -> tuple[Decimal, str]:
+        """function `op` of weight `w` at offset `at`
+
+        return:
+            (value, format string)
+        """
+
+        if op.afunc is not None:  # variadic
+            res = op.afunc(l_args)
+            fmt = ""
+        else:
+            if op.sig and len(l_args) != len(op.sig):
+                raise ValueError(f"func {op.operator}: parameters")
+
+            l_values: list = []
+            for l_type, value in zip(op.sig, l_args):
+                if l_type == Pt.Int:
+                    l_int_value = round(value)
+                    if value != l_int_value:
+                        raise ValueError("this param must be Integer")
+                    l_values.append(int(l_int_value))
+                else:
+                    l_values.append(value)
+
+            res = op.func(*l_values)  # type: ignore
+            fmt = op.ffunc(*l_values) if op.ffunc else ""
+
+        if op.operator in CLEARS_INEXACT:
+            self._clears(self._place(w, at))
+        elif self._flags[decimal.Inexact]:
+            self._sets(self._place(w, at))
+        self._flags[decimal.Inexact] = False
+
+        return res, fmt
+
+
+def evaluate(
+    input: str,
+    *,
+    register: Register | None = None,
+    variables: Variables | None = None,
+    tiny: Decimal = MIN,
+) -> Number:
+    """parse and evaluate `input` in one pass, in the current decimal context
+
+    Same value, format string and Inexact flag as Chain. Raises on any
+    error, without a message to show: see the module docstring.
+
+    tiny:
+        numbers of this size or less are read as 0, as Chain does
+    """
+
+    p = _Pass(input, register, variables, tiny)
+    value, fmt, l_span = p.run()
+    p._flags[decimal.Inexact] = p.inexact()
+    return Number(value, l_span, fmt, input=input)
@@ -1,16 +1,40 @@
+import ast
 import unittest
 import decimal
+from concurrent.futures import ThreadPoolExecutor
 
 if not __package__:
-    from words import number, parse
-    from calculator import calculate
+    from words import ParseState, number, parse, tokenize, lint, lint_message
+    from codegen import check as check_ast
+    from optimizer import optimize
+    from floats import evaluate as on_floats, pays as floats_pay
+    from adaptive import evaluate as adaptive, pays as adaptive_pays
+    from calculator import calculate, calculate_num, Chain, OPER_DICT
+    from calculator import compile, parse_cache, result_cache, invalidate
+    from calculator import Expression
+    from calculator import function_cache
+    from calculator import error_message, ENGINES, check, check_many
+    from calculator import check_calc
+    from parserlogger import ParserLogger
+    from define import Word, WordType
 else:
-    from .words import number, parse
-    from .calculator import calculate
+    from .words import ParseState, number, parse, tokenize, lint, lint_message
+    from .codegen import check as check_ast
+    from .optimizer import optimize
+    from .floats import evaluate as on_floats, pays as floats_pay
+    from .adaptive import evaluate as adaptive, pays as adaptive_pays
+    from .calculator import calculate, calculate_num, Chain, OPER_DICT
+    from .calculator import compile, parse_cache, result_cache, invalidate
+    from .calculator import Expression
+    from .calculator import function_cache
+    from .calculator import error_message, ENGINES, check, check_many
+    from .calculator import check_calc
+    from .parserlogger import ParserLogger
+    from .define import Word, WordType
 
 
 def _number(s: str):
-    res, _ = number(s)
+    res, _ = number(ParseState(s), 0)
     return res
 
 
@@ -29,7 +53,17 @@ def _calculate(s: str):
         return None
 
 
+GENERATE_AFTER = Expression.GENERATE_AFTER
+
+
 class Testing(unittest.TestCase):
+    def setUp(self):
+        # engine="codegen" runs the generated function from the start
+        Expression.GENERATE_AFTER = 0
+
+    def tearDown(self):
+        Expression.GENERATE_AFTER = GENERATE_AFTER
+
     def test_number(self):
         self.assertTrue(_number("  123  "), msg="should be Number")
         self.assertTrue(_number("  123.0  "), msg="should be Number")
@@ -126,7 +160,8 @@ class Testing(unittest.TestCase):
             msg="should be Expression",
         )
 
-        self.assertFalse(_parse(" a "), msg="should NOT be Expression")
+        self.assertFalse(_parse(" a b "), msg="should NOT be Expression")
+        self.assertFalse(_parse(" sum "), msg="should NOT be Expression")
         self.assertFalse(_parse(" - 123 "), msg="should NOT be Expression")
         self.assertFalse(
             _parse(" - 123 * * 123 "), msg="should NOT be Expression"
@@ -149,6 +184,114 @@ class Testing(unittest.TestCase):
         )
         self.assertTrue(_parse(" ss(1,2)"), msg="should be Expression")
         self.assertFalse(_parse(" sum()"), msg="should NOT be Expression")
+        self.assertTrue(
+            _parse(" + ".join(f"(max({i}, 1))" for i in range(3000))),
+            msg="a chain of terms should not recurse",
+        )
+
+    def test_tokenize(self):
+        def _words(s: str) -> list[tuple[str, str]]:
+            return [(w.word_str, w.type.name) for w in tokenize(s)]
+
+        self.assertEqual(
+            _words("-1 - -2-3 * (+4)"),
+            [
+                ("-1", "NUM"),
+                ("-", "OPERATOR"),
+                ("-2", "NUM"),
+                ("-", "OPERATOR"),
+                ("3", "NUM"),
+                ("*", "OPERATOR"),
+                ("(", "LEFTPAREN"),
+                ("+4", "NUM"),
+                (")", "RIGHTPAREN"),
+            ],
+        )
+        self.assertEqual(
+            _words("sum(@@_a) + (@@_a) x y( abs é"),
+            [
+                ("sum", "FUNCNAME"),
+                ("(", "LEFTPAREN"),
+                ("@@_a", "REGISTERLIST"),
+                (")", "RIGHTPAREN"),
+                ("+", "OPERATOR"),
+                ("(", "LEFTPAREN"),
+                ("@@", "REGISTER"),
+                ("_a", "VARIABLE"),
+                (")", "RIGHTPAREN"),
+                ("x", "VARIABLE"),
+                ("y", "FUNCNAME"),
+                ("(", "LEFTPAREN"),
+                ("abs", "FUNCNAME"),
+                ("é", "UNKNOWN"),
+            ],
+        )
+        self.assertEqual(tokenize(" 0x1F ")[0].value_str, "31")
+        self.assertEqual(tokenize("  \t "), [])
+
+        # words are slots over the input, placeholders are shared
+        word = tokenize(" 1 + 0x1F")[2]
+        self.assertEqual(word, Word("0x1F", "31", WordType.NUM, 5))
+        self.assertEqual((word.word_str, word.end), ("0x1F", 9))
+        self.assertFalse(hasattr(word, "__dict__"))
+        self.assertIs(Word.placeholder(), Word.placeholder())
+
+    def test_parse_offsets(self):
+        s = "  sum( 0x1F, 2.5 ,\t@a_b ) * (x - 1e3)" * 20
+        s = s.replace(")  sum", ") + sum")
+        words = parse(s)
+        self.assertEqual(len(words), 20 * 15 - 1)
+        for word in words:
+            self.assertTrue(s.startswith(word.word_str, word.offset))
+
+        logger = ParserLogger()
+        parse(" 1 + (2 * 3)", log=logger)
+        self.assertEqual(logger, {}, msg="no diagnostics on success")
+        with self.assertRaises(ValueError):
+            parse(" 1 + (2 * ", log=logger)
+        self.assertEqual(logger.get()[0], 10)
+
+    def test_deep_nesting(self):
+        depth = 20000
+        s = "(" * depth + "1 + 1" + ")" * depth
+        self.assertEqual(len(parse(s)), 2 * depth + 3)
+        s = "sum(max(" * depth + "1" + ", 2)" * 2 * depth
+        for engine in ENGINES:
+            res = calculate(s, engine=engine)
+            self.assertEqual(str(res), str(2 * depth + 2), msg=engine)
+
+        for n in (10, depth):
+            s = "(" * n + "1 +" + ")" * n
+            logger = ParserLogger()
+            with self.assertRaises(ValueError):
+                parse(s, log=logger)
+            self.assertEqual(logger.get()[:2], (n + 3, "expecting Number"))
+
+    def test_lint(self):
+        s = " 1 + * 2 + (3 4) + sum(1,,2) + max("
+        self.assertEqual(
+            lint(s),
+            [
+                (5, 0, "expecting Number"),
+                (14, 0, "expecting ')'"),
+                (25, 0, "expecting Number"),
+                (35, 0, "expecting Number"),
+            ],
+        )
+        self.assertEqual(lint(" sum(@@_a, max(1, 2,), ) "), [])
+        self.assertEqual(lint_message(" 1 "), "")
+
+        message = lint_message(s)
+        self.assertEqual(message.count("Error: "), 4)
+        self.assertEqual(message.count("Input: "), 1)
+
+        # the first error is the one parse reports
+        for s in [" 1 2 ", " (1 ", " sum() ", " abs 1", " @a_b + é", ""]:
+            logger = ParserLogger()
+            with self.assertRaises(ValueError):
+                parse(s, log=logger)
+            at, to, message = lint(s)[0]
+            self.assertEqual((at, message, to), logger.get(), msg=s)
 
     def test_calculate(self):
         self.assertEqual(
@@ -222,7 +365,7 @@ class Testing(unittest.TestCase):
         )
         self.assertEqual(
             _calculate(" 2*25^(1/2)/2"),
-            "5",
+            "5.0000000000",
             msg="should be Equal",
         )
         self.assertEqual(
@@ -279,6 +422,561 @@ class Testing(unittest.TestCase):
         with self.assertRaises(ValueError):
             calculate("round(11,1.1)")
 
+    def test_reduce_all(self):
+        def _reduce(s: str, scan: bool):
+            logger = ParserLogger()
+            try:
+                chain = Chain(parse(s, log=logger), logger=logger)
+                if scan:
+                    while len(chain) != 0:
+                        i = max(range(len(chain)), key=lambda a: chain[a].w)
+                        chain.reduce_chain(i)
+                else:
+                    chain.reduce_all()
+            except ValueError:
+                return logger.get()
+            return str(chain.result()[0].value), chain.result()[0].source_str
+
+        for s in [
+            " 112.01-2.5 +(-2.56 * (31 +1.1) ) * 2.2 + 23.3 * 3.1 ",
+            " 2 + ( 2 * sum (1, max(2, (3)), sum(1,1+1+1), min((5), 6, 7, 8 ))) - 1",
+            " 2^3^2 - 8/4/2 ",
+            " sum(1) + (max(2, 3,)) * round(2.25, 1)",
+            " 1/0 + (2/0)",
+            " abs(1, 2) + round(1, 1.5)",
+            " sum(" + ", ".join(f"{i}.5" for i in range(500)) + ") ",
+            " max(1, min(" + ", ".join(map(str, range(500, 0, -1))) + "))",
+        ]:
+            self.assertEqual(_reduce(s, True), _reduce(s, False), msg=s)
+
+    def test_operator_nodes(self):
+        chain = Chain(parse("sum(1, 2 * (3 + 4))"), logger=ParserLogger())
+        for node in chain._operators:
+            self.assertIs(node.op, OPER_DICT[node.op.operator])
+
+        self.assertEqual(OPER_DICT["+"].w, 10)
+        self.assertEqual(OPER_DICT["("].w, 100)
+        self.assertEqual(
+            [n.w for n in chain._operators if n.op.operator == "+"], [210]
+        )
+
+    def test_compile(self):
+        l_maxsize = parse_cache.maxsize
+        parse_cache.clear()
+
+        expression = compile(" 2 * sqrt(2) ")
+        self.assertIs(compile(" 2 * sqrt(2) "), expression)
+        self.assertEqual(str(expression.evaluate()), "2.8284271247")
+        self.assertEqual(str(expression.evaluate()), "2.8284271247")
+        self.assertEqual(_calculate(" 2 * sqrt(2) "), "2.8284271247")
+        self.assertEqual(parse_cache.info().hits, 2)
+
+        with self.assertRaises(ValueError):
+            compile("2 *")
+        self.assertNotIn("2 *", parse_cache)
+
+        parse_cache.resize(2)
+        compile("1")
+        compile("2")
+        self.assertNotIn(" 2 * sqrt(2) ", parse_cache)
+        self.assertEqual(parse_cache.info().currsize, 2)
+
+        parse_cache.resize(0)
+        compile("3")
+        self.assertEqual(parse_cache.info().currsize, 0)
+
+        parse_cache.resize(l_maxsize)
+
+    def test_variables(self):
+        self.assertTrue(_parse(" a "), msg="should be Expression")
+        self.assertTrue(
+            _parse(" price * (1 + rate) "), msg="should be Expression"
+        )
+        self.assertIsNone(_calculate(" a "))
+
+        l_vars = {"price": 100, "rate": decimal.Decimal("0.07")}
+        self.assertEqual(
+            str(calculate("price * (1 + rate)", vars=l_vars)), "107"
+        )
+        self.assertEqual(
+            str(calculate("sqrt(x) + x", vars={"x": 2})), "3.4142135624"
+        )
+        self.assertEqual(str(calculate("x * 3", vars={"x": 0.1})), "0.3")
+
+        expression = compile(" price * (1 + rate) - price ")
+        self.assertEqual(expression.variables, ("price", "rate"))
+        self.assertEqual(
+            [
+                str(expression.evaluate(vars={"price": p, "rate": "0.5"}))
+                for p in range(3)
+            ],
+            ["0", "0.5", "1"],
+        )
+
+        with self.assertRaises(ValueError):
+            calculate("price * 2", vars={"rate": 1})
+
+        with self.assertRaises(ValueError):
+            calculate("price * 2", vars={"price": "abc"})
+
+    def test_check(self):
+        for s in [" sqrt(1, 2) ", " round(1) ", " ss(1) ", " 1 + ", " x + 1"]:
+            logger = ParserLogger()
+            self.assertIsNone(check(s), msg=s)
+            with self.assertRaises(ValueError):
+                calculate(s, logger=logger)
+            self.assertEqual(error_message(s), logger.message(s), msg=s)
+            self.assertFalse(check_calc(s, evaluate=False), msg=s)
+
+        # only evaluating finds errors of values
+        self.assertIsNotNone(check(" 1/0 + round(1, 0.5) "))
+        self.assertFalse(check_calc(" 1/0 + round(1, 0.5) "))
+
+        expression = check(" exp(x) ^ 2 ", vars={"x": 1})
+        self.assertIsNotNone(expression)
+        self.assertEqual(
+            str(calculate(expression, vars={"x": 1})),
+            str(calculate(" exp(x) ^ 2 ", vars={"x": 1})),
+        )
+
+        l_exprs = check_many(["1 + 2", "sum(", "1 + 2", "max(x)"])
+        self.assertEqual(
+            [e and e.input for e in l_exprs], ["1 + 2", None, "1 + 2", None]
+        )
+        self.assertIs(l_exprs[0], l_exprs[2])
+
+    def test_vm(self):
+        def _evaluate(s: str, engine: str):
+            logger = ParserLogger()
+            try:
+                res = compile(s).evaluate(
+                    logger=logger, vars={"x": 3}, engine=engine
+                )
+            except ValueError:
+                return logger.get()
+            return str(res)
+
+        for s in [
+            " 112.01-2.5 +(-2.56 * (31 +1.1) ) * 2.2 + 23.3 * 3.1 ",
+            " 2 + ( 2 * sum (1, max(2, (3)), sum(1,1+1+1), min((5), 6, 7, 8 ))) - 1",
+            " sqrt(2) - sqrt(2) + (round(1, 0)) ",
+            " round(1.15, 1) + sqrt(x) ",
+            " 1/0 + (2/0)",
+            " abs(1, 2) + round(1, 1.5)",
+            " round(2, 1.5) ",
+            " 2 ^ (1 / 0) ",
+            " hex(x) + y ",
+            " foo(1) + x ",
+        ]:
+            for engine in ("vm", "codegen"):
+                self.assertEqual(
+                    _evaluate(s, "chain"), _evaluate(s, engine), msg=s
+                )
+
+        self.assertEqual(
+            str(compile("hex(255)").evaluate_num(engine="vm")), "0xff"
+        )
+        with self.assertRaises(ValueError):
+            calculate("1", engine="abc")
+
+    def test_codegen(self):
+        # on the VM first, generated after GENERATE_AFTER evaluations
+        Expression.GENERATE_AFTER = 3
+        expr = compile(" x*3 + 1 ")
+        for i in range(4):
+            self.assertIsNone(expr._function)
+            res = expr.evaluate(vars={"x": i}, engine="codegen")
+            self.assertEqual(res, i * 3 + 1)
+        self.assertIsNotNone(expr._function)
+        Expression.GENERATE_AFTER = 0
+
+        self.assertEqual(
+            str(compile("hex(255)").evaluate_num(engine="codegen")), "0xff"
+        )
+        self.assertEqual(
+            calculate("sum(x, 2) * x", vars={"x": 2}, engine="codegen"), 8
+        )
+
+        for source in [
+            "def evaluate(register, variables, logger):\n    return s0[0]",
+            "def evaluate(register, variables, logger):\n    s0 = open(1)",
+            "def evaluate(register, variables, logger):\n    ctx.__class__",
+            "def evaluate(register, variables, logger):\n    s0 = 1.5",
+            "import os",
+        ]:
+            with self.assertRaises(ValueError, msg=source):
+                check_ast(ast.parse(source), {"MUL"})
+
+    def test_pratt(self):
+        def _calculate(s: str, engine: str):
+            logger = ParserLogger()
+            try:
+                res = calculate_num(
+                    s, logger=logger, vars={"x": 3}, engine=engine
+                )
+            except ValueError:
+                return logger.get()
+            return str(res), res.span
+
+        for s in [
+            " 112.01-2.5 +(-2.56 * (31 +1.1) ) * 2.2 + 23.3 * 3.1 ",
+            " 2 + ( 2 * sum (1, max(2, (3)), sum(1,1+1+1,), min(5, 6)) ) - 1",
+            " 2 ^ 3 ^ 2 - 8 / 4 / 2 ",
+            # Inexact left by what Chain reduces last
+            " round(1 / 3, 2) + 1 / 3 ",
+            " 1 / 3 + (round(2.55, 1)) ",
+            " sqrt(x) * round(sqrt(x), 1) ",
+            " 1.0000000000000000000000000000001 + round(1, 0) ",
+            " hex(255) ",
+            " (oct(8)) ",
+            " 1/0 + (2/0)",
+            " abs(1, 2) + round(1, 1.5)",
+            " sum(1, 2 3) ",
+            " hex(x) + y ",
+            " foo(1) + x ",
+            " 1 + ",
+        ]:
+            self.assertEqual(
+                _calculate(s, "chain"), _calculate(s, "pratt"), msg=s
+            )
+
+        self.assertEqual(
+            str(compile("oct(8)").evaluate_num(engine="pratt")), "0o10"
+        )
+        # too deep to recurse, Chain evaluates it
+        s = "(" * 5000 + "1" + ")" * 5000
+        self.assertEqual(calculate(s, engine="pratt"), 1)
+
+    def test_floats(self):
+        vars = {"x": "2.5", "y": 7, "t": 0.1}
+        for s in [
+            " sqrt(x) * ln(y) + exp(x / 10) ",
+            " round(sqrt(x * y), 4) + round(2.675, 2) ",
+            " 0.1 + 0.2 - t ",
+            " sum(x, y, t) * 1.13 ",
+            " log(1000) + ln(1) + sqrt(6.25) ",
+            " round(ln(y), 3) + sqrt(2) - sqrt(2) ",
+            " hex(round(x * 4, 0)) ",
+            " max(t, 0.1) + min(x, 2.5) ",
+            # fall back to Decimal
+            " 1 / 3 ",
+            " 123456789.123456789 * 1000001 ",
+            " 1e300 * 1e300 ",
+            " sqrt(2) ^ 2 - 2 ",
+            " 1 / (x - 2.5) ",
+            " round(1, 0.5) + hex(x) ",
+        ]:
+            logger = ParserLogger()
+            try:
+                expect = str(calculate_num(s, logger=logger, vars=vars))
+            except ValueError:
+                expect = logger.get()
+            try:
+                res = str(
+                    calculate_num(
+                        s, logger=logger, vars=vars, numeric="float"
+                    )
+                )
+            except ValueError:
+                res = logger.get()
+            self.assertEqual(expect, res, msg=s)
+
+        # kept on floats
+        with decimal.localcontext(decimal.Context(prec=30)):
+            for s in [" sqrt(x) * ln(y) ", " 0.1 + 0.2 ", " x * 4 "]:
+                self.assertTrue(on_floats(s, variables=vars), msg=s)
+        # tried only where they pay
+        self.assertTrue(floats_pay(" log (x) * 2 "))
+        self.assertFalse(floats_pay(" x * 1.13 + y / 3 "))
+        self.assertFalse(floats_pay(" explain(x) + lnx "))
+        with self.assertRaises(ValueError):
+            calculate("1", numeric="double")
+
+    def test_adaptive(self):
+        vars = {"x": "2.5", "y": "7.125", "z": "3.436893084437234186309"}
+        for s in [
+            " ln(exp(x)) ",
+            " ln(exp(ln(exp(y)))) + 1 ",
+            " exp(ln(y)) * 2 ",
+            " log(x * 1e3) + ln(y) - sqrt(2) ",
+            " round(ln(y), 3) + exp(x / 10) ",
+            " x ^ 0.5 + ln(1) + log(100) + exp(0) ",
+            " max(ln(x), ln(y)) - min(exp(1), 3) ",
+            " sum(ln(x), ln(y), -1) ",
+            " ln(z) ",
+            # in the context
+            " ln(3.436893084437234182872441141647475166539) ",
+            " x ^ 0.5 + y ^ 1.5 ",
+            " 1 / 3 ",
+            " ln(x - 2.5) ",
+            " hex(ln(x)) ",
+        ]:
+            logger = ParserLogger()
+            try:
+                expect = str(calculate_num(s, logger=logger, vars=vars))
+            except ValueError:
+                expect = logger.get()
+            try:
+                res = str(
+                    calculate_num(
+                        s, logger=logger, vars=vars, numeric="adaptive"
+                    )
+                )
+            except ValueError:
+                res = logger.get()
+            self.assertEqual(expect, res, msg=s)
+
+        with decimal.localcontext(decimal.Context(prec=30)):
+            # settled at 22 digits, not at 16
+            self.assertEqual(
+                str(adaptive(" ln(z) ", variables=vars).value), "1.2345678902"
+            )
+            with self.assertRaises(ValueError):
+                adaptive(" ln(3.43689308443723418287244114164748) ")
+
+        # tried only where they pay
+        self.assertTrue(adaptive_pays(" ln(x) - ln (y) "))
+        self.assertTrue(adaptive_pays(" ln(x) + ln(y) + ln(x * y) "))
+        self.assertFalse(adaptive_pays(" exp(ln (y)) "))
+        self.assertFalse(adaptive_pays(" ln(x) * 2 + 1 "))
+        self.assertFalse(adaptive_pays(" exp(x) * x ^ 0.5 "))
+
+    def test_precision(self):
+        c = decimal.Context(prec=200, rounding=decimal.ROUND_05UP)
+        half = decimal.Decimal("0.5")
+        for s, expect in [
+            (" sqrt(2) ", c.sqrt(2)),
+            (" 2 * ln(2) ", c.multiply(2, c.ln(2))),
+            (" 2 ^ 0.5 / 3 ", c.divide(c.power(2, half), 3)),
+        ]:
+            expect = expect.quantize(
+                decimal.Decimal("1e-190"),
+                rounding=decimal.ROUND_HALF_UP,
+                context=c,
+            )
+            self.assertEqual(calculate(s, prec=200, places=190), expect)
+
+        self.assertEqual(str(calculate(" 1 / 4 * 2 ", prec=200)), "0.5")
+        self.assertEqual(
+            str(calculate(" 1 / 7 ", places=20)), "0.14285714285714285714"
+        )
+        self.assertEqual(str(calculate(" 1 / 7 ")), "0.1428571429")
+        with self.assertRaises(ValueError):
+            calculate(" 1 ", prec=20, places=20)
+        with self.assertRaises(ValueError):
+            calculate(" sqrt(2 ", prec=100)
+        self.assertIn("expecting", error_message(" sqrt(2 "))
+
+        # too deep for the one pass, Chain in the same context
+        deep = "(" * 3000 + " 2 * (1 / 3) " + ")" * 3000
+        self.assertEqual(
+            str(calculate(deep, prec=50, places=40)), "0." + "6" * 39 + "7"
+        )
+        deep = "sqrt(" * 3000 + "2" + ")" * 3000
+        self.assertEqual(
+            str(calculate(deep, prec=50, places=20)), "1." + "0" * 20
+        )
+
+        # small numbers are read as 0 below the digits of the calculation
+        small = "1." + "0" * 49 + "1"
+        self.assertEqual(str(calculate(" 1e-50 + 1 ", prec=1010)), small)
+        deep = "(" * 3000 + " 1e-50 + 1 " + ")" * 3000
+        self.assertEqual(str(calculate(deep, prec=60)), small)
+        self.assertEqual(str(calculate(" 1e-40 + 1 ", prec=40)), "1")
+        self.assertEqual(str(calculate(" 1e-30 + 1 ")), "1")
+
+    def test_optimize(self):
+        program = optimize(
+            compile("sqrt(2)*x + sqrt(2)*x + (1 + 2) * 3").program,
+            decimal.Context(prec=30),
+        )
+        # two sqrt(2), 1 + 2 and * 3 folded, x and sqrt(2)*x repeated
+        self.assertEqual(program.removed, 6)
+        # round() clears Inexact, only the second load of x goes
+        with decimal.localcontext(decimal.Context(prec=30)):
+            self.assertEqual(
+                compile("round(x, 1) + round(x, 1)").optimized.removed, 1
+            )
+            # hex(1.5) fails at run time, ln(2) after it is not folded
+            self.assertEqual(
+                compile("sqrt(2) + hex(1.5) + ln(2)").optimized.removed, 1
+            )
+
+        for s in [
+            " sqrt(2) * x + sqrt(2) * x ",
+            " round(sqrt(2), 2) + x ",
+            " x + round(sqrt(2), 2) + sqrt(2) * 0 ",
+            " round(sqrt(x), 2) + sqrt(x) ",
+            " sqrt(x) + round(2.55, 1) ",
+            " sqrt(x) + round(2.55, 1) + sqrt(x) ",
+            " hex(255) ",
+            " 1 / 0 + x ",
+            " round(1.5, 0.5) + x ",
+            " sqrt(2) + hex(1.5) + ln(2) ",
+        ]:
+            for engine in ("vm", "codegen"):
+                try:
+                    expect = calculate(s, vars={"x": 2})
+                except ValueError:
+                    expect = None
+                try:
+                    res = calculate(s, vars={"x": 2}, engine=engine)
+                except ValueError:
+                    res = None
+                self.assertEqual(str(expect), str(res), msg=f"{s} {engine}")
+
+    def test_provenance(self):
+        s = " 2 * ( sum( 1, 2,) + x ) "
+        for engine in ("chain", "vm", "codegen"):
+            res = compile(s).evaluate_num(vars={"x": 1}, engine=engine)
+            self.assertEqual(res.span, (1, 24), msg=engine)
+            self.assertEqual(res.source_str, "2*(sum(1,2,)+x)", msg=engine)
+
+        # rebuilt from the words without the input
+        chain = Chain(parse(" 1 +( 2* 3)"), logger=ParserLogger())
+        chain.reduce_all()
+        self.assertEqual(chain.result()[0].source_str, "1+(2*3)")
+
+        logger = ParserLogger()
+        with self.assertRaises(ValueError):
+            calculate(" 1 + 2 / ( 3 - 3 ) ", logger=logger)
+        self.assertEqual(logger.get()[0], 9)
+        self.assertEqual(logger.get()[2], 18)
+
+    def test_result_cache(self):
+        result_cache.resize(16)
+        try:
+            invalidate()
+            self.assertEqual(calculate("1E3 * 1.13"), calculate(" 1e3*1.13 "))
+            self.assertEqual(result_cache.info()[:2], (1, 1))
+
+            # hit on another spelling, provenance from this input
+            res = compile("0X1F + 1").evaluate_num()
+            self.assertEqual(str(calculate_num(" 0x1f+1 ")), str(res))
+            self.assertEqual(calculate_num(" 0x1f+1 ").source_str, "0x1f+1")
+
+            # precision and rounding are part of the key
+            for rounding, expect in [
+                (decimal.ROUND_DOWN, "1.0000000000"),
+                (decimal.ROUND_UP, "1.0000000001"),
+            ]:
+                context = decimal.Context(prec=11, rounding=rounding)
+                with decimal.localcontext(context):
+                    res = calculate_num("1 + 0.00000000005")
+                self.assertEqual(str(res.value), expect)
+
+            # variables are part of the key
+            self.assertEqual(calculate("x * 2", vars={"x": 2}), 4)
+            self.assertEqual(calculate("x * 2", vars={"x": 3}), 6)
+
+            # registers bypass the cache, errors are not cached
+            l_info = result_cache.info()
+            with self.assertRaises(ValueError):
+                calculate("@a + 1")
+            with self.assertRaises(ValueError):
+                calculate("1 / 0")
+            with self.assertRaises(ValueError):
+                calculate("1 / 0")
+            self.assertEqual(result_cache.info().hits, l_info.hits)
+
+            self.assertEqual(invalidate("x*2"), 2)
+            self.assertGreater(invalidate(), 0)
+            self.assertEqual(len(result_cache), 0)
+        finally:
+            result_cache.resize(0)
+            result_cache.clear()
+
+    def test_function_cache(self):
+        inputs = [" sqrt(2) + ln(10) ", " sqrt(4.00) * 1 ", " exp(ln(2)) "]
+        expect = {s: str(calculate_num(s)) for s in inputs}
+        function_cache.resize(16)
+        try:
+            for engine in ("chain", "pratt", "codegen", "chain"):
+                for s in inputs:
+                    res = calculate_num(s, engine=engine)
+                    self.assertEqual(str(res), expect[s], msg=engine)
+            self.assertEqual(function_cache.info()[1:], (5, 16, 5))
+            self.assertEqual(function_cache.info().hits, 15)
+
+            # a hit sets Inexact, the result is rounded all the same
+            self.assertEqual(str(calculate_num(" sqrt(2) ")), "1.4142135624")
+            # 4 and 4.00 are not the same argument
+            self.assertEqual(str(calculate_num(" sqrt(4) * 1 ")), "2")
+
+            # precision is part of the key
+            with decimal.localcontext(decimal.Context(prec=12)):
+                self.assertEqual(
+                    str(OPER_DICT["sqrt"].func(decimal.Decimal(2))),
+                    "1.41421356237",
+                )
+        finally:
+            function_cache.resize(0)
+            function_cache.clear()
+
+    def test_caller_context(self):
+        context = decimal.getcontext()
+        saved = context.copy()
+        try:
+            context.prec = 5
+            context.clear_flags()
+            self.assertEqual(str(calculate("1/3")), "0.3333333333")
+            self.assertEqual(str(calculate("2*3.14159265")), "6.2831853")
+            self.assertEqual(str(calculate("2^0.5")), "1.4142135624")
+            self.assertEqual(context.prec, 5)
+            self.assertFalse(any(context.flags.values()))
+
+            # in the caller's context, inexact results are rounded too
+            decimal.setcontext(decimal.Context())
+            for s, expect in [
+                ("1/3", "0.3333333333"),
+                ("2^0.5", "1.4142135624"),
+                ("2*3.14159265", "6.2831853"),
+            ]:
+                self.assertEqual(str(calculate_num(s).value), expect)
+        finally:
+            decimal.setcontext(saved)
+
+    def test_threads(self):
+        inputs = []
+        for i in range(3000):
+            match i % 5:
+                case 0:
+                    inputs.append(f"{i} * 1.5 + sqrt({i}) / 7")
+                case 1:
+                    inputs.append(f"{i} + " * (i % 9 + 1))
+                case 2:
+                    inputs.append(f"sum({i}, 2" + ", 3" * (i % 4))
+                case 3:
+                    inputs.append(f"{i} / (x - x)")
+                case _:
+                    inputs.append("(" * (i % 6 + 1) + f"{i} * @x")
+
+        def _run(i: int) -> str:
+            s = inputs[i]
+            try:
+                return str(
+                    calculate(s, vars={"x": i}, engine=ENGINES[i % 4])
+                )
+            except ValueError as e:
+                return f"{e}\n{error_message(s)}"
+
+        expected = [_run(i) for i in range(len(inputs))]
+        self.assertEqual(len(set(expected)), len(inputs))
+
+        parse_cache.clear()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(_run, range(len(inputs))))
+        self.assertEqual(results, expected)
+
+        # the caller's decimal context is left alone
+        context = decimal.getcontext()
+        calculate("1 / 3")
+        self.assertIs(decimal.getcontext(), context)
+
+        # nothing failed yet in a new thread
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            self.assertEqual(pool.submit(error_message, " 1 + ").result(), "")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,610 @@
+"""flat instruction VM for compiled expressions
+
+An Expression is lowered once into a Program: an `array` of opcodes and
+operands, a slot table pre-filled with the literal constants, and debug info
+that is only read when an error is reported. Operations are emitted in the
+order `reduction_order` reduces the chain, so results, Inexact flags (which
+round() clears) and error positions are the same as with Chain; parentheses
+cost nothing at run time.
+"""
+
+import decimal
+from array import array
+from decimal import Decimal, getcontext
+from typing import Iterable, Iterator, Sequence
+
+if not __package__:
+    from define import FUNC_SET, Operator, OperatorNode, Number, Pt
+    from define import Word, WordType, Register, Variables, span, source
+    from parserlogger import ParserLogger
+    from operators import MIN, OPER_DICT, valid_parameters, reduction_order
+else:
+    from .define import FUNC_SET, Operator, OperatorNode, Number, Pt
+    from .define import Word, WordType, Register, Variables, span, source
+    from .parserlogger import ParserLogger
+    from .operators import MIN, OPER_DICT, valid_parameters, reduction_order
+
+__all__ = ["Program", "lower", "run", "validate"]
+
+
+### opcodes
+LOAD_REG = 0
+"""LOAD_REG dst name word: register value"""
+LOAD_LIST = 1
+"""LOAD_LIST dst name word: register list values"""
+LOAD_VAR = 2
+"""LOAD_VAR dst name word: variable value"""
+FAIL = 3
+"""FAIL error: raise a known error"""
+ADD = 4
+"""ADD dst a b"""
+SUB = 5
+"""SUB dst a b"""
+MUL = 6
+"""MUL dst a b"""
+DIV = 7
+"""DIV dst a b"""
+POW = 8
+"""POW dst a b"""
+CALL = 9
+"""CALL dst func argc arg1 ... argN"""
+CALL_LIST = 10
+"""CALL_LIST dst func argc arg1 ... argN: some args are register lists"""
+INEXACT = 11
+"""INEXACT flag: set (1) or clear (0) the Inexact flag, see optimizer"""
+
+OPNAMES = [
+    "LOAD_REG",
+    "LOAD_LIST",
+    "LOAD_VAR",
+    "FAIL",
+    "ADD",
+    "SUB",
+    "MUL",
+    "DIV",
+    "POW",
+    "CALL",
+    "CALL_LIST",
+    "INEXACT",
+]
+
+BINARY = {"+": ADD, "-": SUB, "*": MUL, "/": DIV, "^": POW}
+
+_ZERO = Decimal(0)
+
+
+Span = tuple[int, int] | None
+
+
+class _Sym(object):
+    """operand of the chain while lowering: a slot and its source span"""
+
+    __slots__ = ("slot", "span", "islist", "fmt")
+
+    def __init__(
+        self,
+        slot: int,
+        span: Span,
+        islist: bool = False,
+        fmt: bool = False,
+    ):
+        self.slot = slot
+        self.span = span
+        self.islist = islist
+        self.fmt = fmt
+
+
+class Program(object):
+    """lowered expression"""
+
+    __slots__ = (
+        "code",
+        "slots",
+        "names",
+        "funcs",
+        "errors",
+        "debug",
+        "result",
+        "fmt",
+        "span",
+        "input",
+        "removed",
+        "context",
+    )
+
+    def __init__(self, span: Span, input: str):
+        self.code = array("i")
+        """opcodes and operands"""
+        self.slots: list[Decimal | None] = []
+        """initial slot values, literals are filled in"""
+        self.names: list[str] = []
+        """register keys and variable names"""
+        self.funcs: list[Operator] = []
+        """functions called"""
+        self.errors: list[tuple[str, int | None, int]] = []
+        """(message, at, to) raised by FAIL, at is None for no position"""
+        self.debug: dict[int, tuple] = {}
+        """source of operands by pc, for error messages"""
+        self.result = 0
+        """result slot"""
+        self.fmt = False
+        """result is formatted by its function (hex, oct)"""
+        self.span = span
+        """provenance of the result"""
+        self.input = input
+        """raw input"""
+        self.removed = 0
+        """instructions taken out by the optimizer"""
+        self.context: tuple | None = None
+        """context_key of the context constants were folded in"""
+
+    def _slot(self, value: Decimal | None = None) -> int:
+        self.slots.append(value)
+        return len(self.slots) - 1
+
+    def _name(self, name: str) -> int:
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def _emit(self, *args: int) -> int:
+        pc = len(self.code)
+        self.code.extend(args)
+        return pc
+
+    def _fail(self, message: str, at: int | None, to: int = 0):
+        self.errors.append((message, at, to))
+        self._emit(FAIL, len(self.errors) - 1)
+
+    def dis(self) -> str:
+        """disassembly, one instruction per line"""
+
+        code = self.code
+        lines = []
+        pc = 0
+        while pc < len(code):
+            op = code[pc]
+            if op in (LOAD_REG, LOAD_LIST, LOAD_VAR):
+                args = f"s{code[pc + 1]} {self.names[code[pc + 2]]!r}"
+                size = 4
+            elif op == FAIL:
+                args = repr(self.errors[code[pc + 1]][0])
+                size = 2
+            elif op == INEXACT:
+                args = str(code[pc + 1])
+                size = 2
+            elif op in (CALL, CALL_LIST):
+                argc = code[pc + 3]
+                l_args = " ".join(f"s{k}" for k in code[pc + 4 : pc + 4 + argc])
+                args = (
+                    f"s{code[pc + 1]} "
+                    f"{self.funcs[code[pc + 2]].operator}({l_args})"
+                )
+                size = 4 + argc
+            else:
+                args = f"s{code[pc + 1]} s{code[pc + 2]} s{code[pc + 3]}"
+                size = 4
+            lines.append(f"{pc:>4} {OPNAMES[op]:<9} {args}")
+            pc += size
+
+        consts = ", ".join(
+            f"s{i}={v}" for i, v in enumerate(self.slots) if v is not None
+        )
+        lines.append(f"     RESULT    s{self.result}   [{consts}]")
+        if self.removed:
+            lines.append(f"     REMOVED   {self.removed}")
+        return "\n".join(lines)
+
+
+def lower(words: Sequence[Word], input: str | None = None) -> Program:
+    """lower parsed words into a Program
+
+    Build errors of Chain (unknown function, unbalanced parentheses) become
+    FAIL instructions at the same point, after the register and variable
+    loads that come before them.
+
+    Args:
+        words: parsed input
+        input: raw input the words come from, rebuilt from the words if None
+    """
+
+    program = Program(
+        span(words[0], words[-1]) if words else None,
+        input if input is not None else source(words),
+    )
+
+    nodes: list[OperatorNode] = []
+    nums: list[_Sym | None] = []
+    base = 0
+
+    for word in words:
+        match word.type:
+            case WordType.LEFTPAREN:
+                op = OPER_DICT[word.value_str]
+                nodes.append(OperatorNode(op, op.w + base, [word]))
+                nums.append(None)
+                base += op.w
+
+            case WordType.RIGHTPAREN:
+                op = OPER_DICT[word.value_str]
+                nodes.append(OperatorNode(op, base, [word]))
+                nums.append(None)
+                base += op.w
+
+            case WordType.FUNCNAME:
+                if word.value_str not in FUNC_SET:
+                    program._fail(
+                        f"unknown function: {word.word_str}",
+                        word.offset,
+                        word.end,
+                    )
+                    return program
+
+                op = OPER_DICT[word.value_str]
+                nodes.append(OperatorNode(op, op.w + base, [word]))
+                nums.append(None)
+
+            case WordType.OPERATOR | WordType.COMMA:
+                if word.value_str not in OPER_DICT:
+                    program._fail(
+                        f"unknown operator: {word.word_str}", word.offset
+                    )
+                    return program
+
+                op = OPER_DICT[word.value_str]
+                nodes.append(OperatorNode(op, op.w + base, [word]))
+
+            case WordType.NUM:
+                num = Decimal(word.value_str)
+                if abs(num) <= MIN:
+                    num = Decimal("0")
+                slot = program._slot(num)
+                nums.append(_Sym(slot, (word.offset, word.end)))
+
+            case (
+                WordType.REGISTER | WordType.REGISTERLIST | WordType.VARIABLE
+            ):
+                slot = program._slot()
+                name = program._name(word.value_str)
+                l_islist = word.type == WordType.REGISTERLIST
+                l_load = {
+                    WordType.REGISTER: LOAD_REG,
+                    WordType.REGISTERLIST: LOAD_LIST,
+                    WordType.VARIABLE: LOAD_VAR,
+                }[word.type]
+                pc = program._emit(l_load, slot, name, 0)
+                program.debug[pc] = (word,)
+                nums.append(
+                    _Sym(slot, (word.offset, word.end), islist=l_islist)
+                )
+
+            case _:
+                program._fail(f"unknown: {word.word_str}", word.offset)
+                return program
+
+    if base != 0:
+        program._fail("not valid", None)
+        return program
+
+    for i, l_at, l_args in reduction_order(nodes):
+        node = nodes[i]
+        op = node.op
+
+        if op.operator in FUNC_SET:  # functions
+            l_syms = [nums[k] for k in l_args]
+            l_params = [s for s in l_syms if s is not None]
+
+            l_span = span(
+                *node.words,
+                *[w for k in l_args[1:] for w in nodes[k - 1].words],
+                *[s.span for s in l_params],
+            )
+
+            slot = program._slot()
+            l_call = CALL_LIST if any(s.islist for s in l_params) else CALL
+            program.funcs.append(op)
+            pc = program._emit(
+                l_call,
+                slot,
+                len(program.funcs) - 1,
+                len(l_params),
+                *[s.slot for s in l_params],
+            )
+            program.debug[pc] = tuple((s.span, s.islist) for s in l_params)
+            nums[l_at] = _Sym(slot, l_span, fmt=op.ffunc is not None)
+
+        else:  # binary operators
+            l_left = nums[l_at]
+            l_right = nums[l_args[0]]
+
+            l_span = span(
+                l_left and l_left.span, *node.words, l_right and l_right.span
+            )
+
+            # placeholders of Chain are Number(0)
+            if op.operator == "(":
+                l_keep = l_right or _Sym(program._slot(_ZERO), None)
+                nums[l_at] = _Sym(l_keep.slot, l_span)
+
+            elif op.operator == ")":
+                l_keep = l_left or _Sym(program._slot(_ZERO), None)
+                nums[l_at] = _Sym(l_keep.slot, l_span)
+
+            else:
+                if l_left is None:
+                    l_left = _Sym(program._slot(_ZERO), None)
+                if l_right is None:
+                    l_right = _Sym(program._slot(_ZERO), None)
+
+                slot = program._slot()
+                pc = program._emit(
+                    BINARY[op.operator], slot, l_left.slot, l_right.slot
+                )
+                program.debug[pc] = l_right.span
+                nums[l_at] = _Sym(slot, l_span)
+
+    if nums[0] is None:
+        program._fail("not valid", None)
+        return program
+
+    program.result = nums[0].slot
+    program.fmt = nums[0].fmt
+
+    return program
+
+
+def _numbers(
+    values: list, debug: tuple[tuple[Span, bool], ...]
+) -> list[Number]:
+    """function arguments with their source spans, for valid_parameters"""
+
+    l_nums: list[Number] = []
+    for value, (l_span, islist) in zip(values, debug):
+        if islist:
+            l_nums.extend(Number(v, l_span) for v in value)
+        else:
+            l_nums.append(Number(value, l_span))
+    return l_nums
+
+
+def _flatten(
+    values: Iterable, debug: tuple[tuple[Span, bool], ...]
+) -> Iterator[Decimal]:
+    """function arguments with register lists spread"""
+
+    for value, (_, islist) in zip(values, debug):
+        if islist:
+            yield from value
+        else:
+            yield value
+
+
+def _load(
+    program: Program,
+    pc: int,
+    *,
+    register: Register | None,
+    variables: Variables | None,
+    logger: ParserLogger,
+):
+    """value of a LOAD_* instruction, with the errors of Chain"""
+
+    op = program.code[pc]
+    (word,) = program.debug[pc]
+
+    if op == LOAD_VAR:
+        if variables is None or word.value_str not in variables:
+            _error = f"unknown variable: {word.value_str}"
+            logger.add(_error, at=word.offset, to=word.end, forced=True)
+            raise ValueError(_error)
+
+        value = variables[word.value_str]
+        num = Decimal(str(value)) if isinstance(value, float) else value
+        try:
+            num = Decimal(num)
+        except (TypeError, ValueError, decimal.InvalidOperation):
+            num = Decimal("NaN")
+
+        if not num.is_finite():
+            _error = f"invalid value of {word.value_str}: {value!r}"
+            logger.add(_error, at=word.offset, to=word.end, forced=True)
+            raise ValueError(_error)
+
+        return num
+
+    if register is None:
+        _error = f"unknown register: {word.value_str}"
+        logger.add(_error, at=word.offset, forced=True)
+        raise ValueError(_error)
+
+    try:
+        if op == LOAD_REG:
+            res = register.read(word.value_str.removeprefix("@"))
+            return res.value.value
+
+        l_from, l_to = word.value_str.removeprefix("@").split("_")[:2]
+        return [r.value.value for r in register.read_list((l_from, l_to))]
+    except ValueError as e:
+        _error = f"{e}"
+        logger.add(_error, at=word.offset, to=word.end, forced=True)
+        raise ValueError(_error)
+
+
+def run(
+    program: Program,
+    *,
+    register: Register | None = None,
+    variables: Variables | None = None,
+    logger: ParserLogger,
+) -> Number:
+    """run `program` in the current decimal context"""
+
+    code = program.code
+    funcs = program.funcs
+    slots = program.slots.copy()
+    fmts: dict[int, str] = {}
+
+    add = OPER_DICT["+"].func
+    sub = OPER_DICT["-"].func
+    mul = OPER_DICT["*"].func
+    div = OPER_DICT["/"].func
+    power = OPER_DICT["^"].func
+
+    n = len(code)
+    pc = 0
+    try:
+        while pc < n:
+            op = code[pc]
+            if op == ADD:
+                slots[code[pc + 1]] = add(
+                    slots[code[pc + 2]], slots[code[pc + 3]]
+                )
+                pc += 4
+            elif op == MUL:
+                slots[code[pc + 1]] = mul(
+                    slots[code[pc + 2]], slots[code[pc + 3]]
+                )
+                pc += 4
+            elif op == SUB:
+                slots[code[pc + 1]] = sub(
+                    slots[code[pc + 2]], slots[code[pc + 3]]
+                )
+                pc += 4
+            elif op == DIV:
+                slots[code[pc + 1]] = div(
+                    slots[code[pc + 2]], slots[code[pc + 3]]
+                )
+                pc += 4
+            elif op == POW:
+                slots[code[pc + 1]] = power(
+                    slots[code[pc + 2]], slots[code[pc + 3]]
+                )
+                pc += 4
+            elif op == CALL or op == CALL_LIST:
+                fn = funcs[code[pc + 2]]
+                argc = code[pc + 3]
+                l_args = code[pc + 4 : pc + 4 + argc]
+                if fn.afunc is not None:  # variadic, arguments streamed
+                    l_stream = map(slots.__getitem__, l_args)
+                    if op == CALL_LIST:
+                        l_stream = _flatten(l_stream, program.debug[pc])
+                    slots[code[pc + 1]] = fn.afunc(l_stream)
+                else:
+                    l_values = [slots[k] for k in l_args]
+                    if op == CALL_LIST:
+                        l_values = _numbers(l_values, program.debug[pc])
+                        l_values = valid_parameters(
+                            fn, l_values, logger=logger
+                        )
+                    elif fn.sig:
+                        l_values = _arguments(
+                            fn, l_values, program.debug[pc], logger
+                        )
+                    slots[code[pc + 1]] = fn.func(*l_values)
+                    if fn.ffunc is not None:
+                        fmts[code[pc + 1]] = fn.ffunc(*l_values)
+                pc += 4 + argc
+            elif op == INEXACT:
+                getcontext().flags[decimal.Inexact] = bool(code[pc + 1])
+                pc += 2
+            elif op == FAIL:
+                _error, l_at, l_to = program.errors[code[pc + 1]]
+                if l_at is not None:
+                    logger.add(_error, at=l_at, to=l_to, forced=True)
+                raise ValueError(_error)
+            else:
+                slots[code[pc + 1]] = _load(
+                    program,
+                    pc,
+                    register=register,
+                    variables=variables,
+                    logger=logger,
+                )
+                pc += 4
+    except decimal.DivisionByZero:
+        if code[pc] not in BINARY.values():
+            raise
+        l_at, l_to = program.debug[pc]
+        _error = "cannot divide by Zero"
+        logger.add(_error, at=l_at, to=l_to, forced=True)
+        raise ValueError(_error)
+
+    l_fmt = fmts.get(program.result, "") if program.fmt else ""
+    return Number(
+        slots[program.result], program.span, l_fmt, input=program.input
+    )
+
+
+def _arguments(
+    fn: Operator,
+    values: list,
+    debug: tuple[tuple[Span, bool], ...],
+    logger: ParserLogger,
+) -> list:
+    """values converted to the signature of `fn`, see valid_parameters"""
+
+    if len(values) == len(fn.sig):
+        l_res = []
+        for l_type, value in zip(fn.sig, values):
+            if l_type == Pt.Int:
+                l_int_value = round(value)
+                if value != l_int_value:
+                    break
+                l_res.append(int(l_int_value))
+            else:
+                l_res.append(value)
+        else:
+            return l_res
+
+    # let valid_parameters raise the error
+    return valid_parameters(fn, _numbers(values, debug), logger=logger)
+
+
+def validate(
+    program: Program,
+    *,
+    register: Register | None = None,
+    variables: Variables | None = None,
+    logger: ParserLogger,
+):
+    """raise the errors `run` would, as far as they are known before computing
+
+    Build errors, registers and variables are loaded as in `run`, and the
+    number of arguments of each function is checked against its signature.
+    Errors of values (divide by zero, non integer arguments) are not looked
+    for, no operation is computed.
+    """
+
+    code = program.code
+    slots: list = program.slots.copy()
+
+    n = len(code)
+    pc = 0
+    while pc < n:
+        op = code[pc]
+        if op == CALL or op == CALL_LIST:
+            fn = program.funcs[code[pc + 2]]
+            argc = code[pc + 3]
+            if fn.sig and fn.afunc is None:
+                l_values = [slots[k] for k in code[pc + 4 : pc + 4 + argc]]
+                l_nums = _numbers(l_values, program.debug[pc])
+                if len(l_nums) != len(fn.sig):
+                    valid_parameters(fn, l_nums, logger=logger)
+            pc += 4 + argc
+        elif op == FAIL:
+            _error, l_at, l_to = program.errors[code[pc + 1]]
+            if l_at is not None:
+                logger.add(_error, at=l_at, to=l_to, forced=True)
+            raise ValueError(_error)
+        elif op == INEXACT:
+            pc += 2
+        elif op in (LOAD_REG, LOAD_LIST, LOAD_VAR):
+            slots[code[pc + 1]] = _load(
+                program,
+                pc,
+                register=register,
+                variables=variables,
+                logger=logger,
+            )
+            pc += 4
+        else:
+            pc += 4
@@ -1,5 +1,5 @@
 import re
-from typing import Callable
+from typing import Callable, Iterator
 
 if not __package__:
     from define import FUNC_SET, OPERATOR_SET, Word, WordType, WordList
@@ -10,22 +10,65 @@ else:
     from .parserlogger import ParserLogger
     from .debug import word_debug, debug_is_on, open_debug
 
-__all__ = ["parse", "number", "ParserLogger", "format", "Word", "WordList"]
+__all__ = [
+    "parse",
+    "lint",
+    "lint_message",
+    "number",
+    "variable",
+    "ParserLogger",
+    "format",
+    "Word",
+    "WordList",
+]
 
 
-ExprFunc = Callable[[str], tuple[WordList, str]]
-"""Type alias: Expression Function"""
+ExprFunc = Callable[["ParseState", int], tuple[WordList, int]]
+"""Type alias: Expression Function, (state, word index) -> (words, index)"""
 
 
 ### constants
 FMT = "{3} {1!r} \t: {2}"
 # RE_NO = re.compile(r"[-+]?[0-9]+(,[0-9]{3})*(\.[0-9]+)?([Ee][-+]?[0-9]+)?")
-RE_NO = re.compile(r"[-+]?[0-9]+(\.[0-9]+)?([Ee][-+]?[0-9]+)?\b")
-RE_HEX_NO = re.compile(r"0[Xx][0-9a-fA-F]+\b")
-RE_OCT_NO = re.compile(r"0[Oo][0-7]+\b")
-RE_REGISTER = re.compile(r"(@@)|(@[a-z0-9]+)\b")
-RE_FN = re.compile(r"([\w]+)\s*")
-RE_FN2 = re.compile(r"([\w]+)\s*\(")
+RE_TOKEN = re.compile(
+    r"""\s*(?:
+    (?P<REGISTERLIST>(?:@@|@[a-z0-9]+)_(?:@|[a-z0-9]+)\b)
+    | (?P<REGISTER>@@|@[a-z0-9]+\b)
+    | (?P<HEX>0[Xx][0-9a-fA-F]+\b)
+    | (?P<OCT>0[Oo][0-7]+\b)
+    | (?P<NUM>[0-9]+(?:\.[0-9]+)?(?:[Ee][-+]?[0-9]+)?\b)
+    | (?P<NAME>\w+)
+    | (?P<OPERATOR>"""
+    + "|".join(re.escape(op) for op in sorted(OPERATOR_SET, key=len)[::-1])
+    + r""")
+    | (?P<NOTATION>[(),])
+    | (?P<UNKNOWN>\S)
+    )""",
+    re.X,
+)
+"""one word at a time, in the order the parsers used to try them
+
+A number has no sign here, `tokenize` adds it where an operand is expected.
+"""
+RE_VARIABLE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+RE_CALL = re.compile(r"\s*\(")
+SIGNS = {"+", "-"}
+ENDS_OPERAND = {
+    WordType.NUM,
+    WordType.REGISTER,
+    WordType.VARIABLE,
+    WordType.RIGHTPAREN,
+}
+"""an operator is expected after these words"""
+NOTATIONS = {
+    "(": WordType.LEFTPAREN,
+    ")": WordType.RIGHTPAREN,
+    ",": WordType.COMMA,
+}
+
+
+RECURSION_DEPTH = 64
+"""inputs with more '(' are parsed on an explicit stack, see `_run`"""
 
 
 ### init
@@ -34,32 +77,157 @@ if __name__ == "__main__":
     pass
 
 
-parser_logger: ParserLogger
-"""logger"""
+def tokenize(s: str) -> WordList:
+    """scan `s` into words in one pass
+
+    Words the grammar cannot take (unknown characters, names that are
+    neither a variable nor a function) are kept as WordType.UNKNOWN, so
+    parsing stops at the same offset as on the characters.
+    """
+
+    return list(scan(s))
+
+
+def scan(s: str) -> Iterator[Word]:
+    """words of `s` one at a time, the same ones `tokenize` returns
+
+    A word is given out once the next one is read, a sign may still
+    join the number after it.
+    """
+
+    l_calls: list[bool] = []
+    """open parentheses, True for the ones of a function call"""
+
+    prev: Word | None = None
+    """the last word, not given out yet"""
+    l_before = None
+    """type of the word before `prev`"""
+
+    pos = 0
+    while (result := RE_TOKEN.match(s, pos)) is not None:
+        kind = result.lastgroup
+        at, end = result.span(kind)  # type: ignore
+        pos = result.end()
+
+        match kind:
+            case "NUM":
+                if (
+                    prev is not None
+                    and prev.end == at
+                    and prev.word_str in SIGNS
+                    and l_before not in ENDS_OPERAND
+                ):
+                    # "-1" after an operator, "(", "," or at the start
+                    at = prev.offset
+                    prev = None
+                word = Word.at(s, at, end, WordType.NUM)
+            case "HEX":
+                l_value = str(int(s[at:end], 16))
+                word = Word.at(s, at, end, WordType.NUM, l_value)
+            case "OCT":
+                l_value = str(int(s[at:end], 8))
+                word = Word.at(s, at, end, WordType.NUM, l_value)
+            case "REGISTERLIST":
+                l_argument = (
+                    prev is not None
+                    and prev.type in (WordType.LEFTPAREN, WordType.COMMA)
+                    and l_calls
+                    and l_calls[-1]
+                )
+                if not l_argument and s.startswith("@@", at):
+                    # a register list is only read as an argument
+                    pos = at + 2
+                    word = Word.at(s, at, pos, WordType.REGISTER)
+                else:
+                    word = Word.at(s, at, end, WordType.REGISTERLIST)
+            case "REGISTER" | "OPERATOR":
+                word = Word.at(s, at, end, WordType[kind])
+            case "NAME":
+                text = s[at:end]
+                if text in FUNC_SET or RE_CALL.match(s, pos):
+                    l_type = WordType.FUNCNAME
+                elif RE_VARIABLE.fullmatch(text):
+                    l_type = WordType.VARIABLE
+                else:
+                    l_type = WordType.UNKNOWN
+                word = Word.at(s, at, end, l_type)
+            case "NOTATION":
+                text = s[at]
+                word = Word.at(s, at, end, NOTATIONS[text])
+                if text == "(":
+                    l_calls.append(
+                        prev is not None and prev.type == WordType.FUNCNAME
+                    )
+                elif text == ")" and l_calls:
+                    l_calls.pop()
+            case _:
+                word = Word.at(s, at, end, WordType.UNKNOWN)
+
+        if prev is not None:
+            yield prev
+            l_before = prev.type
+        prev = word
+
+    if prev is not None:
+        yield prev
 
-parser_offset: int
-"""offset of input string during parsing"""
 
-word_list: WordList
-"""word list"""
+class ParseState(object):
+    """state of one parse, passed to every parser"""
 
+    __slots__ = ("input", "words", "logger", "word_list")
 
-def _expect(type: WordType, *, at: int, forced: bool = False):
+    def __init__(
+        self, s: str, log: ParserLogger | None = None, *, quiet=False
+    ):
+        self.input = s
+        """input string"""
+        self.words = tokenize(s)
+        """all words of the input, the parsers read them by index"""
+        self.logger: ParserLogger | None = None
+        """logger, None when `quiet`: no diagnostics are kept"""
+        if not quiet:
+            self.logger = log if log is not None else ParserLogger()
+        self.word_list: WordList = []
+        """words taken so far"""
+
+    def at(self, i: int) -> int:
+        """offset of word `i` in the input, its length past the last word"""
+
+        return self.words[i].offset if i < len(self.words) else len(
+            self.input
+        )
+
+    def word(self, i: int) -> Word | None:
+        return self.words[i] if i < len(self.words) else None
+
+
+def _expect(
+    p: ParseState, type: WordType, *, at: int, forced: bool = False
+):
     """Expecting word type
 
     Args:
+        p:      parse state
         at:     position in raw input
         type:   word type
         forced: higher priority (default False)
     Returns:
         None
     """
-    global parser_logger, word_list
+    if p.logger is None:
+        return
 
     def _left_type(type: WordType) -> str:
         l_type = (
             "operand"
-            if type in {WordType.NUM, WordType.REGISTER, WordType.RIGHTPAREN}
+            if type
+            in (
+                WordType.NUM,
+                WordType.REGISTER,
+                WordType.VARIABLE,
+                WordType.RIGHTPAREN,
+            )
             else "operator"
         )
         return l_type
@@ -67,7 +235,7 @@ def _expect(type: WordType, *, at: int, forced: bool = False):
     def _right_type(type: WordType) -> str:
         l_type: str = (
             "operand"
-            if type in {WordType.NUM, WordType.REGISTER}
+            if type in (WordType.NUM, WordType.REGISTER, WordType.VARIABLE)
             else "operator"
         )
         return l_type
@@ -75,26 +243,26 @@ def _expect(type: WordType, *, at: int, forced: bool = False):
     l_text = f"expecting {type.value}"
     l_type = type
 
-    if at not in parser_logger or not parser_logger[at]:
-        parser_logger[at] = (l_text, l_type, 0)
+    if at not in p.logger or not p.logger[at]:
+        p.logger[at] = (l_text, l_type, 0)
         return
 
-    if len(word_list) > 1:
-        prev_word = word_list[-1]
+    if len(p.word_list) > 1:
+        prev_word = p.word_list[-1]
         prev_type = _left_type(prev_word.type)
     else:
         prev_type = _left_type(WordType.PLACEHOLDER)
 
     curr_type = _right_type(l_type)
-    old_type = _right_type(parser_logger[at][1])
+    old_type = _right_type(p.logger[at][1])
 
     if old_type == curr_type:
         if forced:
-            parser_logger[at] = (l_text, l_type, 0)
+            p.logger[at] = (l_text, l_type, 0)
         return
 
     if prev_type != curr_type:
-        parser_logger[at] = (l_text, l_type, 0)
+        p.logger[at] = (l_text, l_type, 0)
         return
 
 
@@ -107,21 +275,18 @@ def _all(*fns: ExprFunc) -> ExprFunc:
         new expression func
     """
 
-    def _inner(s: str) -> tuple[WordList, str]:
-        global parser_offset, word_list
-        l_offset = parser_offset
-        l_word_count = len(word_list)
+    def _inner(p: ParseState, pos: int) -> tuple[WordList, int]:
+        l_word_count = len(p.word_list)
 
-        res, stream = [], s
+        res, l_pos = [], pos
         for fn in fns:
-            res_tmp, stream = fn(stream)
+            res_tmp, l_pos = fn(p, l_pos)
             if not res_tmp:
-                parser_offset = l_offset
-                word_list = word_list[:l_word_count]
-                return [], s
+                del p.word_list[l_word_count:]
+                return [], pos
             res += res_tmp
 
-        return res, stream
+        return res, l_pos
 
     return _inner
 
@@ -135,22 +300,17 @@ def _any(*fns: ExprFunc) -> ExprFunc:
         new expression func
     """
 
-    def _inner(s: str) -> tuple[WordList, str]:
-        global parser_offset, word_list
-        l_offset = parser_offset
-        l_word_count = len(word_list)
+    def _inner(p: ParseState, pos: int) -> tuple[WordList, int]:
+        l_word_count = len(p.word_list)
 
-        res, stream = [], s
         for fn in fns:
-            res, stream = fn(stream)
+            res, l_pos = fn(p, pos)
             if res:
-                return res, stream
+                return res, l_pos
 
-            parser_offset = l_offset
-            word_list = word_list[:l_word_count]
-            res, stream = [], s
+            del p.word_list[l_word_count:]
 
-        return res, stream
+        return [], pos
 
     return _inner
 
@@ -164,26 +324,21 @@ def _do(*fns: ExprFunc) -> ExprFunc:
         new expression func
     """
 
-    def _inner(s: str) -> tuple[WordList, str]:
-        global parser_offset, word_list
-        l_offset = parser_offset
-        l_word_count = len(word_list)
+    def _inner(p: ParseState, pos: int) -> tuple[WordList, int]:
+        l_word_count = len(p.word_list)
 
-        res, stream = [], s
+        res = []
         for fn in fns:
-            _stream = stream
-            res_tmp, stream = fn(stream)
+            res_tmp, l_pos = fn(p, pos)
             if not res_tmp:
-                stream = _stream
-                parser_offset = l_offset
-                word_list = word_list[:l_word_count]
+                del p.word_list[l_word_count:]
                 break
 
-            l_offset = parser_offset
-            l_word_count = len(word_list)
+            pos = l_pos
+            l_word_count = len(p.word_list)
             res += res_tmp
 
-        return res, stream
+        return res, pos
 
     return _inner
 
@@ -198,145 +353,89 @@ def _repeat(fn: ExprFunc, *, at_least_once=False) -> ExprFunc:
         new expression func
     """
 
-    def _inner(s: str) -> tuple[WordList, str]:
-        global parser_offset, word_list
-        l_offset = parser_offset
-        l_word_count = len(word_list)
-
-        res, stream = [], s
-
-        _stream = stream
+    def _inner(p: ParseState, pos: int) -> tuple[WordList, int]:
+        l_word_count = len(p.word_list)
 
-        res_tmp, stream = fn(stream)
+        res = []
+        res_tmp, l_pos = fn(p, pos)
         while res_tmp:
-            l_offset = parser_offset
-            l_word_count = len(word_list)
-            _stream = stream
+            pos = l_pos
+            l_word_count = len(p.word_list)
 
             res += res_tmp
-            res_tmp, stream = fn(stream)
-
-        stream = _stream
-
-        parser_offset = l_offset
-        word_list = word_list[:l_word_count]
+            res_tmp, l_pos = fn(p, pos)
 
-        if not res:
-            res, stream = [], s
+        del p.word_list[l_word_count:]
 
         if not res and not at_least_once:
-            res, stream = [Word.placeholder()], s
+            res = [Word.placeholder()]
 
-        return res, stream
+        return res, pos
 
     return _inner
 
 
-def space(s: str) -> tuple[WordList, str]:
-    global parser_offset
-    l_offset = parser_offset
-
-    for i, c in enumerate(s):
-        if not c.isspace():
-            return [], s[i:]
-        parser_offset += 1
-    return [], ""
-
-
 @word_debug(FMT)
-def number(s: str) -> tuple[WordList, str]:
-    global _error_message, parser_offset, word_list
-
-    res, stream = space(s)
-    l_offset = parser_offset
-
-    l_type = WordType.NUM
-
-    match list(stream[:2].lower()):
-        case ["0", "x"]:
-            result = RE_HEX_NO.match(stream)
-            if result is not None:
-                num_str = str(int(result.group(), 16))
-                word = Word(result.group(), num_str, l_type, l_offset)
-
-        case ["0", "o"]:
-            result = RE_OCT_NO.match(stream)
-            if result is not None:
-                num_str = str(int(result.group(), 8))
-                word = Word(result.group(), num_str, l_type, l_offset)
-
-        case ["@", _]:
-            result = RE_REGISTER.match(stream)
+def number(p: ParseState, pos: int) -> tuple[WordList, int]:
+    word = p.word(pos)
+    if word is not None and word.type in (WordType.NUM, WordType.REGISTER):
+        p.word_list.append(word)
+        return [word], pos + 1
+
+    if p.logger is not None:
+        at = p.at(pos)
+        l_type = WordType.NUM
+        if p.input.startswith("@", at) and at + 1 < len(p.input):
             l_type = WordType.REGISTER
-            if result is not None:
-                num_str = result.group()
-                word = Word(result.group(), num_str, l_type, l_offset)
+        _expect(p, l_type, at=at)
+    return [], pos
 
-        case _:
-            result = RE_NO.match(stream)
-            if result is not None:
-                num_str = result.group()
-                word = Word(result.group(), num_str, l_type, l_offset)
 
-    if result is None:
-        parser_offset = l_offset
-        _expect(l_type, at=parser_offset)
-        return res, stream
+def _take(type: WordType) -> ExprFunc:
+    """expression = one word of `type`"""
 
-    # num_str = result.group()
-    word_list.append(word)
+    def _inner(p: ParseState, pos: int) -> tuple[WordList, int]:
+        word = p.word(pos)
+        if word is None or word.type != type:
+            return [], pos
 
-    span = result.span()
-    parser_offset += span[1]
-    return [word], stream[span[1] :]
+        p.word_list.append(word)
+        return [word], pos + 1
 
+    return _inner
 
-@word_debug(FMT)
-def register_list(s: str) -> tuple[WordList, str]:
-    global _error_message, parser_offset, word_list
 
-    res, stream = space(s)
-    l_offset = parser_offset
+_variable = _take(WordType.VARIABLE)
+_register_list = _take(WordType.REGISTERLIST)
+_fn_name = _take(WordType.FUNCNAME)
 
-    l_type = WordType.REGISTERLIST
 
-    RE_REGISTERLIST = re.compile(r"((@@)|(@[a-z0-9]+))\_((@)|([a-z0-9]+))\b")
-    result = RE_REGISTERLIST.match(stream)
+@word_debug(FMT)
+def variable(p: ParseState, pos: int) -> tuple[WordList, int]:
+    return _variable(p, pos)
 
-    if result is None:
-        parser_offset = l_offset
-        return res, stream
 
-    num_str = result.group()
-    word = Word(result.group(), num_str, l_type, l_offset)
-    word_list.append(word)
+@word_debug(FMT)
+def operand(p: ParseState, pos: int) -> tuple[WordList, int]:
+    """operand = number | variable"""
 
-    span = result.span()
-    parser_offset += span[1]
-    return [word], stream[span[1] :]
+    return _operand(p, pos)
 
 
 @word_debug(FMT)
-def operator(s: str) -> tuple[WordList, str]:
-    global parser_offset, word_list
-
-    res, stream = space(s)
-    l_offset = parser_offset
+def register_list(p: ParseState, pos: int) -> tuple[WordList, int]:
+    return _register_list(p, pos)
 
-    for token in OPERATOR_SET:
-        if stream.startswith(token):
-            stream = stream[len(token) :]
-            word = Word(token, token, WordType.OPERATOR, l_offset)
-            word_list.append(word)
-            res.append(word)
 
-            parser_offset += len(token)
-            break
-    else:
-        parser_offset = l_offset
-        _expect(WordType.OPERATOR, at=parser_offset)
+@word_debug(FMT)
+def operator(p: ParseState, pos: int) -> tuple[WordList, int]:
+    word = p.word(pos)
+    if word is None or word.type != WordType.OPERATOR:
+        _expect(p, WordType.OPERATOR, at=p.at(pos))
+        return [], pos
 
-    return res, stream
+    p.word_list.append(word)
+    return [word], pos + 1
 
 
 def _notation(
@@ -346,142 +445,257 @@ def _notation(
     drop=False,
     forced=False,
 ) -> ExprFunc:
-    def _inner(s: str) -> tuple[WordList, str]:
-        global parser_offset, word_list
-
-        res, stream = space(s)
-        l_offset = parser_offset
+    l_type = NOTATIONS[note.strip()]
+    """words of `note` have this type"""
 
-        l_note = note.strip()
+    def _inner(p: ParseState, pos: int) -> tuple[WordList, int]:
+        word = p.word(pos)
+        if word is None or word.type != l_type:
+            _expect(p, type, at=p.at(pos), forced=forced)
+            return [], pos
 
-        if stream.startswith(l_note):
-            parser_offset += len(l_note)
-            if drop:
-                res.append(Word.placeholder())
-                pass
-            else:
-                word = Word(note, note, type, l_offset)
-                word_list.append(word)
-                res.append(word)
-
-            stream = stream[len(l_note) :]
+        if drop:
+            word = Word.placeholder()
         else:
-            parser_offset = l_offset
-            _expect(type, at=parser_offset, forced=forced)
+            if word.type != type:
+                word = Word.at(p.input, word.offset, word.end, type)
+            p.word_list.append(word)
 
-        return res, stream
+        return [word], pos + 1
 
     return _inner
 
 
 @word_debug(FMT)
-def fn_name(s: str) -> tuple[WordList, str]:
-    global parser_offset
-
-    res, stream = space(s)
-    l_offset = parser_offset
-
-    result = RE_FN.match(stream)
-    if result is None:
-        parser_offset = l_offset
-        return res, stream
-
-    func_name = result.groups()[0]
-    if not func_name in FUNC_SET:
+def fn_name(p: ParseState, pos: int) -> tuple[WordList, int]:
+    return _fn_name(p, pos)
 
-        result2 = RE_FN2.match(stream)
-        if result2 is None:
-            parser_offset = l_offset
-            return res, stream
-        # else:
-        result = result2
-        func_name = result.groups()[0]
 
-    word = Word(func_name, func_name, WordType.FUNCNAME, l_offset)
-    word_list.append(word)
-    parser_offset += len(func_name)
-
-    return [word], stream[len(func_name) :]
+_left_paren = _notation("(", WordType.LEFTPAREN)
+_right_paren = _notation(")", WordType.RIGHTPAREN, forced=True)
+_comma = _notation(",", WordType.COMMA)
+_trailing_comma = _notation(",", WordType.TRAILINGCOMMA)
 
 
 @word_debug(FMT)
-def left_paren(s: str) -> tuple[WordList, str]:
-    words, stream = _notation("(", WordType.LEFTPAREN)(s)
-    return words, stream
+def left_paren(p: ParseState, pos: int) -> tuple[WordList, int]:
+    return _left_paren(p, pos)
 
 
 @word_debug(FMT)
-def right_paren(s: str) -> tuple[WordList, str]:
-    words, stream = _notation(")", WordType.RIGHTPAREN, forced=True)(s)
-    return words, stream
+def right_paren(p: ParseState, pos: int) -> tuple[WordList, int]:
+    return _right_paren(p, pos)
 
 
 @word_debug(FMT)
-def comma(s: str) -> tuple[WordList, str]:
-    words, stream = _notation(",", WordType.COMMA)(s)
-    return words, stream
+def comma(p: ParseState, pos: int) -> tuple[WordList, int]:
+    return _comma(p, pos)
 
 
 @word_debug(FMT)
-def trailing_comma(s: str) -> tuple[WordList, str]:
-    words, stream = _notation(",", WordType.TRAILINGCOMMA)(s)
-    return words, stream
+def trailing_comma(p: ParseState, pos: int) -> tuple[WordList, int]:
+    return _trailing_comma(p, pos)
 
 
 @word_debug(FMT, is_expr=True)
-def e_2(s: str) -> tuple[WordList, str]:
-    """expression = number [ operator number ]*"""
+def e_2(p: ParseState, pos: int) -> tuple[WordList, int]:
+    """expression = operand [ operator operand ]*"""
 
-    return _do(number, _repeat(_all(operator, number)))(s)
+    return _e_2(p, pos)
 
 
 @word_debug(FMT, is_expr=True)
-def e_1(s: str) -> tuple[WordList, str]:
+def e_1(p: ParseState, pos: int) -> tuple[WordList, int]:
     """expression = '(' expression ')'"""
 
-    return _all(left_paren, expr, right_paren)(s)
+    return _e_1(p, pos)
 
 
 @word_debug(FMT, is_expr=True)
-def e_fn(s: str) -> tuple[WordList, str]:
+def e_fn(p: ParseState, pos: int) -> tuple[WordList, int]:
     """expression = fn( expression1 [ , expression2 ]* [,]  )"""
 
-    return _all(
+    return _e_fn(p, pos)
+
+
+@word_debug(FMT, is_expr=True)
+def term(p: ParseState, pos: int) -> tuple[WordList, int]:
+    """term = _e2 | _e1 | _efn"""
+    # _e2 is not necessary, can be replaced by number
+    return _term(p, pos)
+
+
+@word_debug(FMT, is_expr=True)
+def expr(p: ParseState, pos: int) -> tuple[WordList, int]:
+    """expression = term [ operator term ]*
+
+    Same as term [ operator expression ]*, as a loop: a chain of terms does
+    not recurse, and each word is added to the result once.
+    """
+    return _expr(p, pos)
+
+
+# the grammar, built once
+_operand = _any(number, variable)
+_e_2 = _do(operand, _repeat(_all(operator, operand)))
+_e_1 = _all(left_paren, expr, right_paren)
+_e_fn = _all(
+    fn_name,
+    left_paren,
+    _do(
+        _any(register_list, expr),
+        _repeat(_all(comma, _any(register_list, expr))),
+        trailing_comma,
+    ),
+    right_paren,
+)
+_term = _any(e_2, e_1, e_fn)
+_expr = _do(term, _repeat(_all(operator, term)))
+
+
+### explicit stack
+#
+# The grammar above as data, run by `_run` with a list for a stack instead of
+# Python calls, so nesting depth is bounded by memory only. A node is a
+# terminal parser, EXPR, or (kind, *children) for the combinator of that
+# kind. It makes the same parser calls in the same order, so words and
+# ParserLogger entries are the same.
+
+_ALL, _ANY, _DO, _REPEAT = range(4)
+
+EXPR = "expr"
+"""node of the expression rule, the only one nodes refer back to"""
+
+_OPERAND_NODE = (_ANY, number, variable)
+_ARGUMENT_NODE = (_ANY, register_list, EXPR)
+_TERM_NODE = (
+    _ANY,
+    (_DO, _OPERAND_NODE, (_REPEAT, (_ALL, operator, _OPERAND_NODE))),
+    (_ALL, left_paren, EXPR, right_paren),
+    (
+        _ALL,
         fn_name,
         left_paren,
-        _do(
-            _any(register_list, expr),
-            _repeat(_all(comma, _any(register_list, expr))),
+        (
+            _DO,
+            _ARGUMENT_NODE,
+            (_REPEAT, (_ALL, comma, _ARGUMENT_NODE)),
             trailing_comma,
         ),
         right_paren,
-    )(s)
+    ),
+)
+"""term = e_2 | e_1 | e_fn"""
+_EXPR_NODE = (_DO, _TERM_NODE, (_REPEAT, (_ALL, operator, _TERM_NODE)))
+"""expr = term [ operator term ]*"""
 
 
-@word_debug(FMT, is_expr=True)
-def expr(s: str) -> tuple[WordList, str]:
-    """expression =  _e2 | _e1 [ operator expression ]*"""
-    # _e2 is not necessary, can be replaced by number
-    return _do(_any(e_2, e_1, e_fn), _repeat(_all(operator, expr)))(s)
+def _run(p: ParseState, pos: int) -> tuple[bool, int]:
+    """expr at word `pos` without recursion
+
+    return:
+        (success, index after the words taken)
+    """
+
+    word_list = p.word_list
+    stack: list[list] = []
+    """frames: [node, entry index, child, saved word count, index]"""
+    result: tuple[bool, int] | None = None
+    node, l_pos = EXPR, pos
+
+    while True:
+        # enter `node` at `l_pos`, terminals return at once
+        if result is None:
+            if node is EXPR:
+                node = _EXPR_NODE
+            if callable(node):
+                res, l_end = node(p, l_pos)
+                result = (bool(res), l_end)
+            else:
+                stack.append([node, l_pos, 1, len(word_list), l_pos])
+                node = node[1]
+                continue
+
+        if not stack:
+            return result
+
+        frame = stack[-1]
+        f_node, f_pos, i, count, cur = frame
+        ok, l_end = result
+        kind = f_node[0]
+        result = None
+
+        if kind == _ALL:
+            if not ok:
+                del word_list[count:]
+                result = (False, f_pos)
+            elif i + 1 == len(f_node):
+                result = (True, l_end)
+            else:
+                frame[2], frame[4] = i + 1, l_end
+                node, l_pos = f_node[i + 1], l_end
+        elif kind == _ANY:
+            if ok:
+                result = (True, l_end)
+            else:
+                del word_list[count:]
+                if i + 1 == len(f_node):
+                    result = (False, f_pos)
+                else:
+                    frame[2] = i + 1
+                    node, l_pos = f_node[i + 1], f_pos
+        elif kind == _DO:
+            if not ok:
+                del word_list[count:]
+                result = (i > 1, cur)
+            elif i + 1 == len(f_node):
+                result = (True, l_end)
+            else:
+                frame[2:] = i + 1, len(word_list), l_end
+                node, l_pos = f_node[i + 1], l_end
+        else:  # _REPEAT
+            if ok:
+                frame[3:] = len(word_list), l_end
+                node, l_pos = f_node[1], l_end
+            else:
+                del word_list[count:]
+                result = (True, cur)
+
+        if result is not None:
+            stack.pop()
+
+
+def _parse(p: ParseState) -> tuple[WordList, int]:
+    """expr over all of `p`, words without the virtual ones"""
+
+    if p.input.count("(") > RECURSION_DEPTH and not debug_is_on():
+        ok, pos = _run(p, 0)
+        return [w for w in p.word_list if not w.isvirtual] if ok else [], pos
+
+    words, pos = expr(p, 0)
+    return [word for word in words if word and not word.isvirtual], pos
 
 
 def parse(s: str, *, log: ParserLogger | None = None) -> WordList:
-    global parser_offset, parser_logger, word_list
+    """words of the expression `s`
 
-    parser_offset = 0
-    parser_logger = log if log is not None else ParserLogger()
+    The first pass keeps no diagnostics. Only when it fails is the input
+    parsed again with a logger, the messages in `log` are then the same.
+    """
 
-    word_list = []
+    p = ParseState(s, log, quiet=not debug_is_on())
+    words, pos = _parse(p)
 
-    words, stream = expr(s)
-    words = [word for word in words if word and not word.isvirtual]
+    if p.logger is None and (not words or pos < len(p.words)):
+        p.logger = log if log is not None else ParserLogger()
+        p.word_list = []
+        words, pos = _parse(p)
 
-    _, stream = space(stream)
     if not words:
         raise ValueError("unvalid expression")
 
-    if stream and len(stream) > 0:
-        raise ValueError(f'can\'t understand "{ stream }"')
+    if pos < len(p.words):
+        raise ValueError(f'can\'t understand "{ s[p.at(pos):] }"')
 
     if debug_is_on():
         print("success!")
@@ -489,6 +703,128 @@ def parse(s: str, *, log: ParserLogger | None = None) -> WordList:
     return words
 
 
+### error recovery
+_OPERAND, _ARGUMENT, _NEXT_ARGUMENT, _OPERATOR, _LIST, _CALL = range(6)
+"""what `lint` expects next: a term, the first argument of a call, an
+argument after a comma (or ')'), an operator, ',' or ')' after a register
+list, '(' after a function name"""
+
+_STARTS_TERM = {
+    WordType.NUM,
+    WordType.REGISTER,
+    WordType.VARIABLE,
+    WordType.FUNCNAME,
+    WordType.LEFTPAREN,
+}
+_SYNC = {WordType.OPERATOR, WordType.COMMA, WordType.RIGHTPAREN}
+"""words checking goes on at after an error"""
+
+
+def lint(s: str) -> list[tuple[int, int, str]]:
+    """all syntax errors of `s` in one pass
+
+    Words are checked in order against the grammar of `expr`. After an error
+    the words up to the next comma, ')' or operator are skipped, and checking
+    goes on from there as if an operand had been read.
+
+    return:
+        (at, to, message) of each error, in input order, empty if `s` parses
+    """
+
+    words = tokenize(s)
+    errors: list[tuple[int, int, str]] = []
+    calls: list[bool] = []
+    """open parentheses, True for function calls"""
+    state = _OPERAND
+    skipping = False
+
+    def _error(message: str, at: int):
+        """one error per offset, the first one found"""
+        if not errors or errors[-1][0] != at:
+            errors.append((at, 0, message))
+
+    i = 0
+    while i < len(words):
+        word = words[i]
+        type = word.type
+        if skipping:
+            if type not in _SYNC:
+                i += 1
+                continue
+            skipping, state = False, _OPERATOR
+
+        l_error: WordType | None = None
+        if state == _CALL:
+            if type == WordType.LEFTPAREN:
+                calls.append(True)
+                state = _ARGUMENT
+            else:
+                l_error = WordType.LEFTPAREN
+
+        elif state == _OPERATOR or state == _LIST:
+            if type == WordType.OPERATOR and state == _OPERATOR:
+                state = _OPERAND
+            elif type == WordType.COMMA and calls and calls[-1]:
+                state = _NEXT_ARGUMENT
+            elif type == WordType.RIGHTPAREN and calls:
+                calls.pop()
+                state = _OPERATOR
+            elif calls or state == _LIST:
+                l_error = WordType.RIGHTPAREN
+            else:
+                l_error = WordType.OPERATOR
+
+        elif type == WordType.REGISTERLIST and state != _OPERAND:
+            state = _LIST
+        elif type == WordType.RIGHTPAREN and state == _NEXT_ARGUMENT:
+            calls.pop()
+            state = _OPERATOR
+        elif type in (WordType.NUM, WordType.REGISTER, WordType.VARIABLE):
+            state = _OPERATOR
+        elif type == WordType.FUNCNAME:
+            state = _CALL
+        elif type == WordType.LEFTPAREN:
+            calls.append(False)
+            state = _OPERAND
+        else:
+            l_error = WordType.NUM
+            if s.startswith("@", word.offset) and word.offset + 1 < len(s):
+                l_error = WordType.REGISTER
+
+        if l_error is not None:
+            _error(f"expecting {l_error.value}", word.offset)
+            skipping = True
+            # a comma, ')' or operator is checked again, after the operand
+            if type in _SYNC and state != _OPERATOR:
+                continue
+        i += 1
+
+    if skipping:
+        state = _OPERATOR
+    if state == _OPERATOR and not calls:
+        return errors
+
+    if state == _OPERATOR or state == _LIST:
+        _error(f"expecting {WordType.RIGHTPAREN.value}", len(s))
+    elif state == _CALL:
+        _error(f"expecting {WordType.LEFTPAREN.value}", len(s))
+    else:
+        _error(f"expecting {WordType.NUM.value}", len(s))
+    return errors
+
+
+def lint_message(
+    s: str, errors: list[tuple[int, int, str]] | None = None
+) -> str:
+    """ParserLogger messages of `errors`, `lint(s)` by default, "" if there
+    are none"""
+
+    logger = ParserLogger()
+    for at, to, message in lint(s) if errors is None else errors:
+        logger.add(message, at=at, to=to)
+    return logger.messages(s) if logger else ""
+
+
 def format(s: str) -> str:
     str_list = parse(s)
     # print(str_list)
@@ -506,10 +842,11 @@ def format2(s: str):
 
     buffer = list("-" * (len(s) + 5))
 
+    logger = ParserLogger()
     try:
-        word_list = parse(s)
+        word_list = parse(s, log=logger)
     except ValueError as e:
-        pos, log, _ = parser_logger.get()
+        pos, log, _ = logger.get()
         buffer[pos] = "^"
         print("".join(buffer))
         print(log)
@@ -529,6 +866,8 @@ def format2(s: str):
                 buffer[word.offset] = "P"
             case WordType.REGISTER:
                 buffer[word.offset] = "@"
+            case WordType.VARIABLE:
+                buffer[word.offset] = "V"
             case _:
                 buffer[word.offset] = "^"
 